@@ -176,7 +176,7 @@ def compare_variants(output_1, output_2, ylim_costs=(0,5000000000), ylim_interve
 
 def save_tables_to_excel(tbl_dicts, excel_file):
     
-    tables = ['interventions','returnees','hhs','costs','costs_units','costs_discounted', 'social_assistence_breakdown']
+    tables = ['interventions','returnees','hhs','apartments_assigned','apartments_available','cohorts','costs','costs_units','costs_discounted', 'social_assistence_breakdown']
 
     with pd.ExcelWriter(excel_file) as writer:  
         for table in tables:
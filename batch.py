@@ -0,0 +1,159 @@
+import pandas as pd
+import numpy as np
+
+from dimensions import DEFAULT
+from scenario import Scenario
+import engine
+import costing
+
+
+def to_scenarios(scenarios) -> tuple:
+    '''
+    Builds (validated) `Scenario` objects - `scenarios` is either a dict {scenario_id: scenario} or a list of scenarios
+    (scenario ids are then positions in the list), each given as `Scenario` or as a dict of `simulate_social_housing` parameters.
+
+    Returns scenario ids and list of `Scenario` objects.
+    '''
+    if isinstance(scenarios, dict):
+        ids, scenarios = list(scenarios.keys()), list(scenarios.values())
+    else:
+        ids, scenarios = list(range(len(scenarios))), list(scenarios)
+
+    return ids, [scenario if isinstance(scenario, Scenario) else Scenario.from_dict(scenario) for scenario in scenarios]
+
+
+def stack_scenarios(scenarios: list) -> tuple:
+    '''
+    Stacks compiled `Scenario` objects along a leading scenario axis.
+
+    Returns simulated years, dict of stacked arrays accepted by `engine.run_arrays` (with the shared `dimensions`) and dict of stacked cost parameters accepted by `costing.run_arrays`.
+    '''
+    years = scenarios[0].years
+    if any(not np.array_equal(scenario.years, years) for scenario in scenarios):
+        raise Exception('All scenarios must simulate the same years...')
+    dimensions = scenarios[0].dimensions
+    if any(scenario.dimensions != dimensions for scenario in scenarios):
+        raise Exception('All scenarios must share the same risk groups, intervention types, risk transitions and apartment priorities...')
+
+    arrays = engine.stack_arrays([scenario.arrays for scenario in scenarios])
+    arrays['dimensions'] = dimensions
+    cost_arrays = {key: np.stack([scenario.cost_arrays[key] for scenario in scenarios]) for key in scenarios[0].cost_arrays}
+    return years, arrays, cost_arrays
+
+
+def run_stacked(years: np.ndarray, arrays: dict, cost_arrays: dict, cohort_length: int = None, start_year: int = 0, checkpoint: dict = None, jit: bool = None, cohorts: bool = True, hold_states: bool = False) -> dict:
+    '''
+    Simulates interventions and costs of stacked scenario arrays (see `stack_scenarios` and `Scenario.expand`)
+    - returns dict of unlabelled arrays with a leading scenario axis.
+
+    `cohort_length` sets the length of the age axis of `cohorts` (the longest `years_of_support` by default).
+    With `start_year` > 0 the years before it are taken from results `checkpoint` of a previous run (see `engine.run_arrays`).
+    `jit` selects the compiled year loop and `hold_states` the treatment of years before any intervention can end (see `engine.run_arrays`).
+    With `cohorts=False` the age structure of cohorts is not built and `cohorts` is left out of the results - for callers that reduce
+    the results to metrics (such results cannot serve as a `checkpoint`).
+    '''
+    arrays = dict(arrays)
+    dimensions = arrays.pop('dimensions', DEFAULT)
+    interventions, hhs, returnees, apartments_assigned, cohorts_by_age, returnees_known = engine.run_arrays(
+        n_years=len(years), cohort_length=cohort_length, start_year=start_year, checkpoint=checkpoint, dimensions=dimensions, jit=jit,
+        age_structure=cohorts, hold_states=hold_states, **arrays
+    )
+    returnees[~returnees_known] = np.nan
+
+    results = {
+        'interventions': interventions,
+        'hhs': hhs,
+        'returnees': returnees,
+        'apartments_assigned': apartments_assigned,
+        'apartments_available': arrays['apartments'] - apartments_assigned,
+    }
+    if cohorts:
+        results['cohorts'] = cohorts_by_age
+    results.update(costing.run_arrays(interventions, hhs, dimensions=dimensions, **cost_arrays))
+    return results
+
+
+def run_scenarios(scenarios: list, cohort_length: int = None) -> dict:
+    '''
+    Simulates compiled `Scenario` objects (supply, interventions and costs) - returns dict of unlabelled arrays with a leading scenario axis.
+
+    `cohort_length` sets the length of the age axis of `cohorts` (the longest `years_of_support` by default).
+    '''
+    return run_stacked(*stack_scenarios(scenarios), cohort_length=cohort_length)
+
+
+def resume_scenario(scenario: Scenario, base: Scenario, base_results: dict) -> tuple:
+    '''
+    Simulates `scenario` as an edit of scenario `base` with results `base_results` (of `run_scenarios([base])`) - the years before
+    the first year in which the scenarios differ are reused (see `engine.first_difference`), only the rest of the horizon is simulated again.
+    Costs are recalculated for the whole horizon.
+
+    Returns results (as `run_scenarios`) and the first re-simulated year (position).
+    '''
+    comparable = np.array_equal(scenario.years, base.years) and scenario.dimensions == base.dimensions
+    start_year = engine.first_difference(scenario.arrays, base.arrays) if comparable else 0
+    if start_year == 0:
+        return run_scenarios([scenario]), 0
+
+    years, arrays, cost_arrays = stack_scenarios([scenario])
+    start_year = min(start_year, len(years))
+    return run_stacked(years, arrays, cost_arrays, cohort_length=base_results['cohorts'].shape[2], start_year=start_year, checkpoint=base_results), start_year
+
+
+def label_results(results: dict, ids: list, years: np.ndarray, base_year: int, titles: list, dimensions=DEFAULT) -> dict:
+    '''
+    Converts arrays of `run_scenarios` (simulated with categories of `dimensions`) into labelled tables indexed by (scenario, rok).
+
+    With `ids=None` the results of a single scenario are labelled exactly as `simulate_social_housing` outputs (indexed by `rok` only).
+    '''
+    rok = pd.Index(years + base_year, name='rok')
+    ages = pd.RangeIndex(results['cohorts'].shape[2], name='cohort_age')
+    if ids is None:
+        index = rok
+        cohorts_index = pd.MultiIndex.from_product([rok, ages])
+        scenarios = None
+    else:
+        index = pd.MultiIndex.from_product([ids, rok], names=('scenario', 'rok'))
+        cohorts_index = pd.MultiIndex.from_product([ids, rok, ages], names=('scenario', 'rok', 'cohort_age'))
+        scenarios = pd.Index(ids, name='scenario')
+
+    types, risks = dimensions.intervention_types, dimensions.hh_risks
+    outputs = {
+        'interventions': engine.to_frame(results['interventions'], index, types, 'intervention_type', risks),
+        'hhs': engine.to_frame(results['hhs'], index, dimensions.hh_statuses, 'hh_status', risks),
+        'returnees': engine.to_frame(results['returnees'], index, types, 'intervention_type', risks),
+        'apartments_assigned': pd.DataFrame(results['apartments_assigned'].reshape(len(index), -1), index=index, columns=engine.APARTMENT_TYPES),
+        'apartments_available': pd.DataFrame(results['apartments_available'].reshape(len(index), -1), index=index, columns=engine.APARTMENT_TYPES),
+        'cohorts': engine.to_frame(results['cohorts'], cohorts_index, types, 'intervention_type', risks),
+    }
+    outputs.update(costing.to_frames(results, index=index, scenarios=scenarios))
+    outputs['title'] = titles[0] if ids is None else pd.Series(titles, index=scenarios, name='title')
+    return outputs
+
+
+def simulate_social_housing_batch(scenarios, base_year=None) -> dict:
+    '''
+    Batched counterpart of `simulate_social_housing` - all scenarios are simulated in a single pass of the year loop.
+
+    `scenarios` is either a dict {scenario_id: scenario} or a list of scenarios (see `to_scenarios`), all scenarios must share `years`.
+    Outputs are labelled from `base_year` (`base_year` of the scenarios by default).
+
+    Returns the same tables as `simulate_social_housing`, each with an additional `scenario` level in the index (scenario, rok),
+    `npv` with total discounted costs per scenario and cost line, and `title` as a Series of scenario titles.
+    '''
+    ids, scenarios = to_scenarios(scenarios)
+    return label_results(
+        run_scenarios(scenarios),
+        ids=ids,
+        years=scenarios[0].years,
+        base_year=base_year if base_year is not None else scenarios[0].base_year,
+        titles=[scenario.title for scenario in scenarios],
+        dimensions=scenarios[0].dimensions
+    )
+
+
+def simulate_scenario(scenario: Scenario) -> dict:
+    '''
+    Simulates one compiled `Scenario` - returns the same tables as `simulate_social_housing` (computed by the array engine) and its `npv`.
+    '''
+    return label_results(run_scenarios([scenario]), ids=None, years=scenario.years, base_year=scenario.base_year, titles=[scenario.title], dimensions=scenario.dimensions)
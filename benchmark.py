@@ -0,0 +1,383 @@
+'''
+Benchmark suite of the model - times every stage and records the wall time and the peak of allocated memory into a history file
+(one JSON line per measurement, with the commit it was measured on), so that any two commits can be compared:
+
+    python benchmark.py run --years 15 50 200 --variants 1 10 100
+    python benchmark.py run --stages simulate_numpy batch --repeat 5
+    python benchmark.py compare 2370a65 HEAD
+
+Stages of the reference (pandas) model are measured on a single variant - `determine_hhs_queue`, `fill_share_interventions`
+and `fill_apartment_interventions` are the totals of all their calls during one `generate_interventions` run.
+Stages that process many variants at once (array engine, batch, export, plots) are measured for every number of variants.
+'''
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import main
+import kernel
+from constants import HH_RISKS, APARTMENT_PRIORITIES
+from spec import load_spec
+
+HISTORY = 'benchmark_history.jsonl'
+SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'varianty.json')
+VARIANT = '1A: Mix opatření'
+
+
+class Skip(Exception):
+    '''
+    The stage cannot be measured in this environment or for these parameters (recorded with the reason).
+    '''
+
+
+def with_risks(parameters: dict, risks: int) -> dict:
+    '''
+    Parameters with `risks` household risk groups - groups beyond `low` and `high` are copies of `high` sharing its inflow,
+    low risk households move to each of them as they move to `high`, and they get apartments after the built-in groups.
+    '''
+    if risks < 2:
+        raise Skip('the model needs at least the low and high risk groups')
+    extra = [f'risk_{pos}' for pos in range(3, risks + 1)]
+    if not extra:
+        return parameters
+    groups = ['high'] + extra
+
+    def copy_rows(table):
+        return pd.concat([table, pd.DataFrame([table.loc['high']] * len(extra), index=extra)])
+
+    hhs_inflow = copy_rows(parameters['hhs_inflow'])
+    hhs_inflow.loc[groups] = hhs_inflow.loc[groups] / len(groups)
+    mop_housing_share = parameters['mop_housing_share'].copy()
+    mop_housing_share[extra] = np.repeat(mop_housing_share[['high']].to_numpy(), len(extra), axis=1)
+    share = parameters['low_to_high_risk_share'] / len(groups)
+    return {
+        **parameters,
+        'relapse_rates': copy_rows(parameters['relapse_rates']),
+        'intervention_shares': copy_rows(parameters['intervention_shares']),
+        'hhs_inflow': hhs_inflow,
+        'mop_housing_share': mop_housing_share,
+        'low_to_high_risk_share': share,
+        'risk_transitions': {('low', group): share for group in extra},
+        'apartment_priorities': APARTMENT_PRIORITIES + [(apartment_type, group) for group in extra for apartment_type in ['municipal', 'guaranteed']],
+    }
+
+
+def make_variants(years: int, variants: int, risks: int) -> list:
+    '''
+    `variants` sets of parameters of `simulate_social_housing` simulated for `years` years - the variants of `varianty.json`
+    with different numbers of guaranteed apartments, with `risks` household risk groups (see `with_risks`).
+    '''
+    base = with_risks(load_spec(SPEC)[VARIANT], risks)
+    return [
+        {**base, 'years': np.arange(years), 'title': f'{VARIANT} ({pos})', 'guaranteed_yearly_apartments': base['guaranteed_yearly_apartments'] * (1 + pos / variants)}
+        for pos in range(variants)
+    ]
+
+
+def _stage_calls(parameters: dict, stages: list, measure) -> dict:
+    '''
+    Runs the reference `generate_interventions` with functions `stages` of `main` wrapped by `measure(name, function, args, kwargs)`.
+    '''
+    original = {stage: getattr(main, stage) for stage in stages}
+    try:
+        for stage, function in original.items():
+            setattr(main, stage, lambda *args, _stage=stage, _function=function, **kwargs: measure(_stage, _function, args, kwargs))
+        main.simulate_social_housing(**parameters, engine='pandas')
+    finally:
+        for stage, function in original.items():
+            setattr(main, stage, function)
+
+
+def _inner_stage(stage: str):
+    '''
+    Benchmark of a function called inside the year loop - total time of its calls and the largest peak of one call.
+    '''
+    def benchmark(variants, trace):
+        totals = {'seconds': 0., 'peak': 0}
+
+        def measure(name, function, args, kwargs):
+            if trace:
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            totals['seconds'] += time.perf_counter() - start
+            if trace:
+                totals['peak'] = max(totals['peak'], tracemalloc.get_traced_memory()[1] - current)
+            return result
+
+        _stage_calls(variants[0], [stage], measure)
+        return totals
+    return benchmark
+
+
+def _timed(function):
+    '''
+    Benchmark of `function(variants)` as a whole.
+    '''
+    def benchmark(variants, trace):
+        if trace:
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        function(variants)
+        seconds = time.perf_counter() - start
+        return {'seconds': seconds, 'peak': tracemalloc.get_traced_memory()[1] - current if trace else 0}
+    return benchmark
+
+
+def _supply(variants):
+    p = variants[0]
+    main.simulate_apartment_stock(
+        guaranteed_yearly_apartments=p['guaranteed_yearly_apartments'],
+        municipal_apartments_today=p['municipal_apartments_today'],
+        municipal_yearly_new_apartments=p['municipal_yearly_new_apartments'],
+        municipal_existing_availability_rate=p['municipal_existing_availability_rate'],
+        municipal_new_availability_rate=p['municipal_new_availability_rate'],
+        startup_coefficients=p['startup_coefficients'][['guaranteed', 'municipal']],
+        years=p['years'],
+    )
+
+
+def _calculate_costs(variants):
+    p = variants[0]
+    outputs = _reference_outputs(p)
+    main.calculate_costs(
+        interventions=outputs['interventions'],
+        hhs=outputs['hhs'],
+        years_of_support=p['years_of_support'],
+        social_assistences=p['social_assistences'],
+        intervention_costs=p['intervention_costs'],
+        discount_rate=p['discount_rate'],
+        mop_housing_share=p['mop_housing_share'],
+    )
+
+
+_REFERENCE = {}
+
+
+def _reference_outputs(parameters: dict) -> dict:
+    # Interventions of the reference model (indexed by year from 0) - input of `calculate_costs`, computed once per scenario
+    from scenario import Scenario
+    key = Scenario.from_dict(parameters).key
+    if key not in _REFERENCE:
+        outputs = main.simulate_social_housing(**parameters, engine='numpy', base_year=0)
+        _REFERENCE[key] = {table: outputs[table].rename_axis(None) for table in ['interventions', 'hhs']}
+    return _REFERENCE[key]
+
+
+def _simulate(engine: str):
+    def run(variants):
+        for parameters in variants:
+            main.simulate_social_housing(**parameters, engine=engine)
+    return run
+
+
+def _batch(variants):
+    from batch import simulate_social_housing_batch
+    from scenario import Scenario
+    simulate_social_housing_batch({p['title']: Scenario.from_dict(p) for p in variants})
+
+
+def _outputs(variants) -> list:
+    return [main.simulate_social_housing(**parameters, engine='numpy') for parameters in variants]
+
+
+def _with_outputs(function):
+    # Exports and plots are measured without the simulation of their inputs
+    def benchmark(variants, trace):
+        outputs = _outputs(variants)
+        return _timed(lambda _: function(outputs))(variants, trace)
+    return benchmark
+
+
+def _analysis():
+    try:
+        import analysis
+    except ImportError as error:
+        raise Skip(f'analysis cannot be imported ({error})')
+    return analysis
+
+
+def _plot(name: str):
+    def run(outputs):
+        analysis = _analysis()
+        from matplotlib import pyplot as plt
+        getattr(analysis, name)(outputs)
+        plt.close('all')
+    return run
+
+
+def _save_tables_to_excel(outputs):
+    import tempfile
+    analysis = _analysis()
+    with tempfile.TemporaryDirectory() as root:
+        analysis.save_tables_to_excel(outputs, os.path.join(root, 'vysledky.xlsx'))
+
+
+def _export_parquet(outputs):
+    import tempfile
+    from export import DatasetWriter, _arrow
+    try:
+        _arrow()
+    except Exception as error:
+        raise Skip(str(error))
+    with tempfile.TemporaryDirectory() as root:
+        writer = DatasetWriter(root)
+        for pos, o in enumerate(outputs):
+            writer.write(str(pos), o)
+
+
+# Stage: (benchmark, whether it is measured for every number of variants)
+STAGES = {
+    'simulate_apartment_stock': (_timed(_supply), False),
+    'determine_hhs_queue': (_inner_stage('determine_hhs_queue'), False),
+    'fill_share_interventions': (_inner_stage('fill_share_interventions'), False),
+    'fill_apartment_interventions': (_inner_stage('fill_apartment_interventions'), False),
+    'calculate_costs': (_timed(_calculate_costs), False),
+    'simulate_pandas': (_timed(_simulate('pandas')), False),
+    'simulate_numpy': (_timed(_simulate('numpy')), True),
+    'batch': (_timed(_batch), True),
+    'plot_costs_summary': (_with_outputs(_plot('plot_costs_summary')), True),
+    'plot_hhs_in_emergency': (_with_outputs(_plot('plot_hhs_in_emergency')), True),
+    'save_tables_to_excel': (_with_outputs(_save_tables_to_excel), True),
+    'export_parquet': (_with_outputs(_export_parquet), True),
+}
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(['git', *args], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    '''
+    Commit (with `dirty` for uncommitted changes) and versions the measurements were taken with.
+    '''
+    status = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': _git('rev-parse', 'HEAD'),
+        'dirty': bool(status) if status is not None else None,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'numba': kernel.numba.__version__ if kernel.AVAILABLE else None,
+        'machine': platform.node(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+def measure(stage: str, years: int, variants: int, risks: int, repeat: int = 3) -> dict:
+    '''
+    Measures `stage` - the best and median wall time of `repeat` runs (after one warm-up run)
+    and the peak of memory allocated by the stage (tracemalloc, in a separate run).
+    '''
+    benchmark, _ = STAGES[stage]
+    record = {'stage': stage, 'years': years, 'variants': variants, 'risks': risks}
+    try:
+        inputs = make_variants(years, variants, risks)
+        benchmark(inputs, False)
+        seconds = [benchmark(inputs, False)['seconds'] for _ in range(repeat)]
+        tracemalloc.start()
+        try:
+            peak = benchmark(inputs, True)['peak']
+        finally:
+            tracemalloc.stop()
+    except Skip as reason:
+        return {**record, 'skipped': str(reason)}
+    return {**record, 'seconds': min(seconds), 'median_seconds': float(np.median(seconds)), 'repeat': repeat, 'peak_bytes': int(peak)}
+
+
+def run(stages: list, years: list, variants: list, risks: list, repeat: int = 3, history: str = HISTORY, report=print) -> list:
+    '''
+    Measures all combinations of `stages`, horizons `years`, numbers of `variants` and of household `risks` groups
+    and appends them to the `history` file.
+    '''
+    env = environment()
+    timestamp = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    records = []
+    for stage in stages:
+        _, scales = STAGES[stage]
+        for n_years in years:
+            for n_variants in (variants if scales else [1]):
+                for n_risks in risks:
+                    record = {**measure(stage, n_years, n_variants, n_risks, repeat), **env, 'timestamp': timestamp}
+                    records.append(record)
+                    if 'skipped' in record:
+                        report(f'{stage:30} years={n_years:<4} variants={n_variants:<5} risks={n_risks:<2} skipped: {record["skipped"]}')
+                    else:
+                        report(f'{stage:30} years={n_years:<4} variants={n_variants:<5} risks={n_risks:<2} {record["seconds"] * 1000:10.2f} ms {record["peak_bytes"] / 2 ** 20:9.2f} MiB')
+                    with open(history, 'a', encoding='utf-8') as file:
+                        file.write(json.dumps(record) + '\n')
+    return records
+
+
+def load_history(history: str = HISTORY) -> pd.DataFrame:
+    '''
+    All measurements of the `history` file.
+    '''
+    with open(history, encoding='utf-8') as file:
+        return pd.DataFrame([json.loads(line) for line in file if line.strip()])
+
+
+def compare(base: str, other: str, history: str = HISTORY) -> pd.DataFrame:
+    '''
+    Compares the latest measurements of two commits (revisions understood by git, e.g. `HEAD~3`, or commit hash prefixes) -
+    wall time and memory peak of both and their ratios (other / base) for every measured case.
+    '''
+    measurements = load_history(history)
+    measurements = measurements[measurements['skipped'].isna()] if 'skipped' in measurements else measurements
+    keys = ['stage', 'years', 'variants', 'risks']
+
+    def latest(revision):
+        commit = _git('rev-parse', revision) or revision
+        selected = measurements[measurements['commit'].fillna('').str.startswith(commit)]
+        if selected.empty:
+            raise Exception(f'No measurements of `{revision}` in {history}...')
+        return selected.sort_values('timestamp').groupby(keys).last()[['seconds', 'peak_bytes']]
+
+    table = latest(base).join(latest(other), lsuffix='_base', rsuffix='_other', how='inner')
+    table['time_ratio'] = table['seconds_other'] / table['seconds_base']
+    table['memory_ratio'] = table['peak_bytes_other'] / table['peak_bytes_base']
+    return table
+
+
+def cli(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog='benchmark.py', description='Benchmark modelu nákladovosti systému sociálního bydlení')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='measure stages and append the results to the history')
+    run_parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    run_parser.add_argument('--years', nargs='+', type=int, default=[15, 50, 200])
+    run_parser.add_argument('--variants', nargs='+', type=int, default=[1, 10, 100])
+    run_parser.add_argument('--risks', nargs='+', type=int, default=[len(HH_RISKS)])
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--history', default=HISTORY)
+
+    compare_parser = commands.add_parser('compare', help='compare measurements of two commits')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('other')
+    compare_parser.add_argument('--history', default=HISTORY)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run(args.stages, args.years, args.variants, args.risks, args.repeat, args.history)
+    else:
+        with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.max_columns', None):
+            print(compare(args.base, args.other, args.history))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
@@ -0,0 +1,231 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+import pandas as pd
+import numpy as np
+
+from main import simulate_social_housing
+from scenario import Scenario
+from batch import simulate_scenario
+from substeps import steps_per_year
+
+
+def simulation_key(parameters: dict) -> str:
+    '''
+    Key of a simulation with parameters of `simulate_social_housing` - `Scenario.key` of the compiled parameters, which changes whenever
+    any number the model simulates changes. `title`, `engine` (both engines give the same outputs) and `profile` are not a part of the key,
+    sub-annual `steps` are.
+    '''
+    steps = steps_per_year(parameters.get('steps', 'year'))
+    if steps == 1:
+        return Scenario.from_dict(parameters).key
+
+    # Startup coefficients within years only apply to the sub-annual simulation, they are hashed with the number of steps
+    startup = parameters['startup_coefficients']
+    scenario = Scenario.from_dict({**parameters, 'startup_coefficients': startup[startup.index % 1 == 0]})
+    digest = hashlib.sha1(f'{scenario.key}:{steps}:'.encode())
+    digest.update(startup.to_csv().encode())
+    return digest.hexdigest()
+
+
+def copy_outputs(outputs: dict) -> dict:
+    '''
+    Copy of outputs whose tables can be modified without changing `outputs`.
+    '''
+    return {name: value.copy() if isinstance(value, (pd.DataFrame, pd.Series)) else value for name, value in outputs.items()}
+
+
+def save_outputs(outputs: dict, path: str):
+    '''
+    Stores outputs of `simulate_social_housing` column by column into a `.npz` file - every column and index level is a separate array,
+    labels and other (scalar) outputs are kept in a json header.
+    '''
+    header, arrays = {}, {}
+    for name, value in outputs.items():
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            frame = value.to_frame() if isinstance(value, pd.Series) else value
+            header[name] = {
+                'kind': type(value).__name__,
+                'index_names': list(frame.index.names),
+                'column_names': list(frame.columns.names),
+                'columns': [list(col) if isinstance(col, tuple) else col for col in frame.columns],
+                'name': value.name if isinstance(value, pd.Series) else None,
+            }
+            for level, level_name in enumerate(frame.index.names):
+                arrays[f'{name}.index.{level}'] = frame.index.get_level_values(level).to_numpy()
+            for pos in range(frame.shape[1]):
+                arrays[f'{name}.column.{pos}'] = frame.iloc[:, pos].to_numpy()
+        else:
+            header[name] = {'kind': 'value', 'value': value}
+    arrays['header'] = np.array(json.dumps(header))
+
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(temporary, path)
+
+
+def load_outputs(path: str) -> dict:
+    '''
+    Loads outputs stored by `save_outputs`.
+    '''
+    with np.load(path, allow_pickle=False) as arrays:
+        header = json.loads(str(arrays['header']))
+        outputs = {}
+        for name, meta in header.items():
+            if meta['kind'] == 'value':
+                outputs[name] = meta['value']
+                continue
+
+            levels = [arrays[f'{name}.index.{level}'] for level in range(len(meta['index_names']))]
+            index = pd.MultiIndex.from_arrays(levels, names=meta['index_names']) if len(levels) > 1 else pd.Index(levels[0], name=meta['index_names'][0])
+            columns = meta['columns']
+            columns = pd.MultiIndex.from_tuples([tuple(col) for col in columns], names=meta['column_names']) if len(meta['column_names']) > 1 else pd.Index(columns, name=meta['column_names'][0])
+            frame = pd.DataFrame({pos: arrays[f'{name}.column.{pos}'] for pos in range(len(columns))}, index=index)
+            frame.columns = columns
+            outputs[name] = frame.iloc[:, 0].rename(meta['name']) if meta['kind'] == 'Series' else frame
+    return outputs
+
+
+class SimulationCache:
+    '''
+    Memoization of `simulate_social_housing` keyed by `simulation_key` of the parameters.
+
+    Results are kept in a bounded in-memory LRU (`maxsize` simulations) and optionally on disk in `directory`
+    (one columnar `.npz` file per simulation, see `save_outputs`) - the least recently used files are removed
+    once they take more than `max_disk_bytes`.
+
+    Every call gets its own copy of the cached tables, so modifying them does not change the cache.
+    '''
+
+    def __init__(self, maxsize: int = 64, directory: str = None, max_disk_bytes: int = 1 << 30):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key: str):
+        '''
+        Copy of the outputs cached under `key` or None.
+        '''
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return copy_outputs(self._memory[key])
+
+        if self.directory is not None and os.path.exists(self._path(key)):
+            try:
+                outputs = load_outputs(self._path(key))
+            except (OSError, ValueError, KeyError):
+                # Unreadable file (damaged, incompatible or being written) - a miss, the file is left to `put` or eviction
+                pass
+            else:
+                os.utime(self._path(key))
+                self.disk_hits += 1
+                self._remember(key, outputs)
+                return copy_outputs(outputs)
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, outputs: dict):
+        '''
+        Caches a copy of `outputs` under `key` in memory and on disk.
+        '''
+        outputs = copy_outputs(outputs)
+        self._remember(key, outputs)
+        if self.directory is not None:
+            save_outputs(outputs, self._path(key))
+            self._evict_disk()
+
+    def _remember(self, key: str, outputs: dict):
+        self._memory[key] = outputs
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_files(self) -> list:
+        files = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.npz')]
+        return sorted(files, key=lambda entry: entry.stat().st_mtime)
+
+    def _evict_disk(self):
+        files = self._disk_files()
+        total = sum(entry.stat().st_size for entry in files)
+        for entry in files:
+            if total <= self.max_disk_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+            self.evictions += 1
+
+    def simulate(self, scenario: Scenario = None, **parameters) -> dict:
+        '''
+        `simulate_social_housing` with the same parameters - repeated calls are served from the cache.
+
+        A compiled `scenario` (see `scenario.Scenario`) is looked up by its key without compiling the parameters again
+        and simulated by the array engine (`batch.simulate_scenario`) - its outputs equal those of the parameters up to rounding of costs.
+
+        The `profile` table is not cached (timings of an earlier run say nothing about the current one) - only a simulation
+        that is computed returns it.
+        '''
+        key = scenario.key if scenario is not None else simulation_key(parameters)
+        outputs = self.get(key)
+        if outputs is None:
+            if scenario is not None:
+                outputs = simulate_scenario(scenario)
+                outputs.pop('npv')
+            else:
+                outputs = simulate_social_housing(**parameters)
+            self.put(key, {name: value for name, value in outputs.items() if name != 'profile'})
+        # Scenarios differing only in their title share the outputs
+        outputs['title'] = scenario.title if scenario is not None else parameters.get('title')
+        return outputs
+
+    def clear(self, disk: bool = False):
+        '''
+        Empties the in-memory cache (and the on-disk cache if `disk`).
+        '''
+        self._memory.clear()
+        if disk and self.directory is not None:
+            for entry in self._disk_files():
+                os.remove(entry.path)
+
+    def stats(self) -> dict:
+        '''
+        Cache statistics - hits (memory and disk), misses, evictions and current size.
+        '''
+        stats = {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / max(self.hits + self.disk_hits + self.misses, 1),
+            'evictions': self.evictions,
+            'memory_entries': len(self._memory),
+        }
+        if self.directory is not None:
+            files = self._disk_files()
+            stats['disk_entries'] = len(files)
+            stats['disk_bytes'] = sum(entry.stat().st_size for entry in files)
+        return stats
+
+
+default_cache = SimulationCache()
+
+
+def simulate_social_housing_cached(**parameters) -> dict:
+    '''
+    `simulate_social_housing` memoized by `default_cache`, e.g. `simulate_social_housing_cached(**INPUT_1A)`.
+    '''
+    return default_cache.simulate(**parameters)
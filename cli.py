@@ -0,0 +1,135 @@
+'''
+Command-line entry point of the model, e.g.
+
+    python cli.py run varianty.toml --output vysledky --format csv --workers 4
+    python cli.py run varianty.toml --output vysledky --format parquet
+    python cli.py validate varianty.toml
+    python cli.py worker sweeps/mrizka
+
+Heavy modules (pandas, the model, matplotlib) are imported only by the commands that need them, plotting only with `--plots`.
+'''
+import os
+import sys
+import time
+import argparse
+
+TABLES = ['interventions','returnees','hhs','apartments_assigned','apartments_available','cohorts','costs','costs_units','costs_discounted', 'social_assistence_breakdown']
+
+
+def write_tables(outputs: dict, output: str, fmt: str):
+    '''
+    Writes tables of all variants {variant name: outputs} - one table per sheet (xlsx) or file (csv) with a `variant` column
+    (the layout of `analysis.save_tables_to_excel`) and a summary of total discounted costs `npv`.
+    '''
+    import pandas as pd
+
+    tables = {table: pd.concat([o[table].assign(variant=o['title']) for o in outputs.values()]) for table in TABLES}
+    tables['npv'] = pd.DataFrame({o['title']: o['npv'] for o in outputs.values()}).T.rename_axis('variant')
+
+    if fmt == 'xlsx':
+        path = output if output.endswith('.xlsx') else os.path.join(output, 'vysledky.xlsx')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with pd.ExcelWriter(path) as writer:
+            for table, frame in tables.items():
+                frame.to_excel(writer, sheet_name=table)
+    else:
+        os.makedirs(output, exist_ok=True)
+        for table, frame in tables.items():
+            frame.to_csv(os.path.join(output, f'{table}.csv'))
+
+
+def write_plots(outputs: dict, output: str):
+    '''
+    Saves summary charts of all variants into `output` (imports matplotlib).
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    import analysis
+
+    os.makedirs(output, exist_ok=True)
+    variants = list(outputs.values())
+    for name, plot in [('costs_summary', analysis.plot_costs_summary), ('hhs_in_emergency', analysis.plot_hhs_in_emergency)]:
+        plot(variants)
+        plt.gcf().savefig(os.path.join(output, f'{name}.png'), bbox_inches='tight')
+        plt.close('all')
+
+
+def run(args) -> int:
+    from spec import load_spec
+    from parallel import run_variants
+
+    start = time.perf_counter()
+    variants = load_spec(args.spec)
+    if args.format in ['parquet', 'arrow']:
+        # Large sweeps - tables are streamed into a dataset instead of being collected in memory
+        from export import export_variants
+        reader = export_variants(variants, args.output, format=args.format, max_workers=args.workers)
+        if args.plots:
+            write_plots(dict(reader.iter_variants(['costs_discounted', 'hhs'])), args.output)
+        print(f'{len(variants)} variants simulated and written to {args.output} in {time.perf_counter() - start:.1f} s')
+        return 0
+
+    outputs = run_variants(variants, max_workers=args.workers)
+    write_tables(outputs, args.output, args.format)
+    if args.plots:
+        write_plots(outputs, args.output if args.format == 'csv' or not args.output.endswith('.xlsx') else os.path.dirname(os.path.abspath(args.output)))
+    print(f'{len(outputs)} variants simulated and written to {args.output} in {time.perf_counter() - start:.1f} s')
+    return 0
+
+
+def validate(args) -> int:
+    from spec import load_spec
+    from scenario import Scenario
+
+    variants = load_spec(args.spec)
+    for name, parameters in variants.items():
+        Scenario.from_dict(parameters)
+    print(f'{len(variants)} variants are valid')
+    return 0
+
+
+def worker(args) -> int:
+    from shards import ShardedSweep
+
+    sweep = ShardedSweep(args.sweep)
+    start = time.perf_counter()
+    processed = sweep.work(args.name, max_shards=args.max_shards, claim_timeout=args.claim_timeout)
+    status = sweep.status()
+    print(f'{processed} shards processed in {time.perf_counter() - start:.1f} s, {status["shards"]}/{status["n_shards"]} shards of the sweep are finished')
+    return 0
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog='cli.py', description='Model nákladovosti systému sociálního bydlení')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='simulate all variants of a scenario spec and write result tables')
+    run_parser.add_argument('spec', help='scenario spec (JSON or TOML), see `spec.load_spec`')
+    run_parser.add_argument('--output', '-o', default='vysledky', help='output directory (or .xlsx file), a dataset directory for parquet/arrow (see `export.DatasetWriter`)')
+    run_parser.add_argument('--format', '-f', choices=['csv', 'xlsx', 'parquet', 'arrow'], default='csv')
+    run_parser.add_argument('--workers', '-w', type=int, default=None, help='number of processes (all cores by default)')
+    run_parser.add_argument('--plots', action='store_true', help='also save summary charts (requires matplotlib)')
+    run_parser.set_defaults(handler=run)
+
+    validate_parser = commands.add_parser('validate', help='check a scenario spec without simulating it')
+    validate_parser.add_argument('spec')
+    validate_parser.set_defaults(handler=validate)
+
+    worker_parser = commands.add_parser('worker', help='process missing shards of a sharded sweep (see `shards.ShardedSweep`)')
+    worker_parser.add_argument('sweep', help='sweep directory shared by the workers')
+    worker_parser.add_argument('--name', default=None, help='worker id written into claims (host-pid by default)')
+    worker_parser.add_argument('--max-shards', type=int, default=None)
+    worker_parser.add_argument('--claim-timeout', type=float, default=600, help='seconds after which a claim of a silent worker is taken over')
+    worker_parser.set_defaults(handler=worker)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.handler(args)
+    except Exception as error:
+        print(f'{type(error).__name__}: {error}', file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+'''
+Shared test fixtures - the main variants of `model.ipynb` as parameters of `simulate_social_housing`.
+'''
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+HOUSEHOLD_SIZE = 2.28
+
+
+def _variants() -> dict:
+    current_level, yearly_growth = 67000, 9100
+    hhs_inflow = pd.DataFrame({
+        'current_level': [0.3 * current_level, 0.7 * current_level],
+        'yearly_growth': [0.65 * yearly_growth, 0.35 * yearly_growth],
+    }, index=['low', 'high'])
+    startup_v1 = pd.DataFrame({it: [0.5, 0.75, 1.0] for it in ['consulting', 'mop_payment', 'guaranteed', 'municipal']}, index=[0, 1, 2])
+    startup_v0 = startup_v1.copy()
+    startup_v0.loc[:, :] = 1
+    shares_v0 = pd.DataFrame({'self_help': [.4, .15], 'consulting': [.0, .0], 'mop_payment': [.02, .02]}, index=['low', 'high'])
+    shares_v1 = pd.DataFrame({'self_help': [.2, .1], 'consulting': [.1, .05], 'mop_payment': [.2, .1]}, index=['low', 'high'])
+    years_of_support = pd.Series({'municipal': 3, 'guaranteed': 2, 'self_help': 1, 'mop_payment': 1, 'consulting': 1})
+    relapse_v1 = pd.DataFrame({
+        'self_help': [.2, .6], 'consulting': [.2, .5], 'mop_payment': [.1, .3], 'guaranteed': [.05, .3], 'municipal': [.05, .3],
+    }, index=['low', 'high'])
+    relapse_v0 = relapse_v1.copy()
+    relapse_v0.mop_payment = relapse_v0.mop_payment * 1.5
+    relapse_v0.loc['high', ['guaranteed', 'municipal']] = 0.4
+    relapse_v0.loc['low', ['guaranteed', 'municipal']] = 0.1
+    relapse_v3 = relapse_v0.copy()
+    relapse_v3.loc[:, 'guaranteed'] = [0.2, 0.45]
+    relapse_v3.loc[:, 'municipal'] = [0.15, 0.5]
+    assistences_v0 = pd.DataFrame({'share': [.0, .0, .7], 'years': [1, 2, 1]}, index=['mop_payment', 'guaranteed', 'municipal'])
+    assistences_v1 = pd.DataFrame({'share': [.25, .85, .85], 'years': [1, 2, 2]}, index=['mop_payment', 'guaranteed', 'municipal'])
+    costs_v1 = pd.Series({
+        ('entry', 'self_help'): 0, ('entry', 'mop_payment'): 35126, ('entry', 'guaranteed'): 15333, ('entry', 'municipal'): 0,
+        ('entry', 'social_assistance'): 0, ('yearly', 'self_help'): 0, ('yearly', 'mop_payment'): 0, ('yearly', 'guaranteed'): 48990,
+        ('yearly', 'municipal'): 52616, ('yearly', 'social_assistance'): 88976, ('yearly', 'queue_budget'): 1.19 * 1.108 * HOUSEHOLD_SIZE * 20303,
+        ('yearly', 'queue_social'): 146712, ('one_off', 'IT_system'): 60000000, ('yearly', 'IT_system'): 20000000,
+        ('yearly', 'regional_administration'): 65438210, ('yearly', 'consulting'): 483074298, ('one_off', 'consulting'): 406901511 - 483074298,
+    }).unstack()
+    costs_v0 = costs_v1.copy()
+    for row, col in [('yearly', 'IT_system'), ('yearly', 'regional_administration'), ('yearly', 'consulting'), ('one_off', 'consulting'),
+                     ('yearly', 'municipal'), ('one_off', 'IT_system')]:
+        costs_v0.loc[row, col] = 0
+    mop_v0 = pd.DataFrame({'high': [.0, .0], 'low': [.0, .0]}, index=['guaranteed', 'municipal'])
+    mop_v1 = pd.DataFrame({'high': [1, .5], 'low': [.25, .0]}, index=['guaranteed', 'municipal'])
+
+    v0 = {
+        'title': '0: Bez zákona', 'years': np.arange(15), 'years_of_support': years_of_support, 'intervention_costs': costs_v0,
+        'guaranteed_yearly_apartments': 0, 'municipal_apartments_today': 161100, 'municipal_yearly_new_apartments': 2000,
+        'municipal_existing_availability_rate': .002, 'municipal_new_availability_rate': .1, 'relapse_rates': relapse_v0,
+        'intervention_shares': shares_v0, 'hhs_inflow': hhs_inflow, 'social_assistences': assistences_v0, 'mop_housing_share': mop_v0,
+        'discount_rate': 0.04, 'low_to_high_risk_share': 0.5, 'startup_coefficients': startup_v0,
+    }
+    v1a = {
+        **copy.deepcopy(v0), 'title': '1A: Mix opatření', 'intervention_costs': costs_v1, 'guaranteed_yearly_apartments': 2000,
+        'municipal_existing_availability_rate': .004, 'municipal_new_availability_rate': .25, 'relapse_rates': relapse_v1,
+        'intervention_shares': shares_v1, 'social_assistences': assistences_v1, 'startup_coefficients': startup_v1, 'mop_housing_share': mop_v1,
+    }
+    v1b = {**copy.deepcopy(v1a), 'title': '1B: Mix opatření - 2x více bytů', 'guaranteed_yearly_apartments': 4000, 'municipal_existing_availability_rate': .008}
+    v2 = {
+        **copy.deepcopy(v1a), 'title': '2: Pouze poradenství a sociální služby', 'guaranteed_yearly_apartments': 0,
+        'municipal_existing_availability_rate': .002, 'municipal_new_availability_rate': .1,
+    }
+    v2['intervention_costs'].loc['yearly', 'municipal'] = 0
+    v2['social_assistences'].loc[['municipal', 'guaranteed'], 'share'] = [0.5, 0.25]
+    v3 = {
+        **copy.deepcopy(v1a), 'title': '3: Pouze bydlení', 'relapse_rates': relapse_v3, 'intervention_shares': shares_v0,
+        'intervention_costs': costs_v0.copy(), 'social_assistences': assistences_v0,
+    }
+    for row, col in [('yearly', 'municipal'), ('yearly', 'guaranteed'), ('entry', 'municipal'), ('entry', 'guaranteed')]:
+        v3['intervention_costs'].loc[row, col] = costs_v1.loc[row, col]
+    return {variant['title']: variant for variant in [v0, v1a, v1b, v2, v3]}
+
+
+VARIANTS = _variants()
+
+
+@pytest.fixture
+def variants() -> dict:
+    '''
+    Main variants {title: parameters of `simulate_social_housing`} - a fresh copy for every test.
+    '''
+    return copy.deepcopy(VARIANTS)
+
+
+@pytest.fixture(params=list(VARIANTS))
+def variant(request) -> dict:
+    '''
+    Parameters of each of the main variants.
+    '''
+    return copy.deepcopy(VARIANTS[request.param])
@@ -0,0 +1,15 @@
+HH_RISKS = ['low','high']
+INTERVENTION_TYPES = ['guaranteed','municipal','mop_payment','self_help','consulting']
+HH_STATUSES = INTERVENTION_TYPES + ['queue'] + [f'outside_{it}' for it in INTERVENTION_TYPES]
+APARTMENT_TYPES = ['guaranteed','municipal']
+
+# Transitions between risk groups of households in queue (from, to) - the yearly share is `low_to_high_risk_share`
+RISK_TRANSITIONS = [('low','high')]
+
+# Priority order of apartment assignments (apartment_type, hh_risk)
+APARTMENT_PRIORITIES = [
+    ('guaranteed','low'),
+    ('municipal','high'),
+    ('guaranteed','high'),
+    ('municipal','low'),
+]
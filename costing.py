@@ -0,0 +1,203 @@
+import pandas as pd
+import numpy as np
+
+from constants import APARTMENT_TYPES
+from dimensions import DEFAULT
+ASSISTED_TYPES = ['guaranteed','mop_payment','municipal']
+
+# Columns of `costs_units` and `costs` in the same order as `main.calculate_costs`
+COST_UNITS = [
+    'apartments_entry_guaranteed',
+    'apartments_entry_municipal',
+    'apartments_yearly_guaranteed',
+    'apartments_yearly_municipal',
+    'consulting',
+    'mop_payment',
+    'social_assistance',
+    'queue',
+]
+COSTS = [
+    'IT_system',
+    'apartments_yearly_guaranteed',
+    'apartments_entry_guaranteed',
+    'apartments_yearly_municipal',
+    'apartments_entry_municipal',
+    'consulting',
+    'regional_administration',
+    'mop_payment',
+    'social_assistence',
+    'queue_budget',
+    'queue_social',
+]
+
+# Cost line: (unit it is priced by, price tag in `intervention_costs`) - fixed cost lines have no unit
+UNIT_PRICES = {
+    'apartments_yearly_guaranteed': ('apartments_yearly_guaranteed', ('yearly','guaranteed')),
+    'apartments_entry_guaranteed': ('apartments_entry_guaranteed', ('entry','guaranteed')),
+    'apartments_yearly_municipal': ('apartments_yearly_municipal', ('yearly','municipal')),
+    'apartments_entry_municipal': ('apartments_entry_municipal', ('entry','municipal')),
+    'mop_payment': ('mop_payment', ('entry','mop_payment')),
+    'social_assistence': ('social_assistance', ('yearly','social_assistance')),
+    'queue_budget': ('queue', ('yearly','queue_budget')),
+    'queue_social': ('queue', ('yearly','queue_social')),
+}
+# Cost line: (yearly price tag, one-off price tag accounted to the first year)
+FIXED_PRICES = {
+    'IT_system': (('yearly','IT_system'), ('one_off','IT_system')),
+    'consulting': (('yearly','consulting'), ('one_off','consulting')),
+    'regional_administration': (('yearly','regional_administration'), None),
+}
+
+# All price tags of `intervention_costs` used by the model
+PRICE_TAGS = [price for _, price in UNIT_PRICES.values()] + [price for prices in FIXED_PRICES.values() for price in prices if price is not None]
+
+
+
+def to_arrays(years_of_support, social_assistences, intervention_costs, discount_rate, mop_housing_share, dimensions=DEFAULT) -> dict:
+    '''
+    Converts cost parameters of one scenario into dense arrays used by `run_arrays` (risk groups ordered as in `dimensions`).
+    '''
+    return {
+        'apartment_years': years_of_support.loc[APARTMENT_TYPES].to_numpy(dtype=int),
+        'assistance_share': social_assistences.loc[ASSISTED_TYPES, 'share'].to_numpy(dtype=float),
+        'assistance_years': social_assistences.loc[ASSISTED_TYPES, 'years'].to_numpy(dtype=int),
+        'mop_housing_share': mop_housing_share.loc[APARTMENT_TYPES, dimensions.hh_risks].to_numpy(dtype=float),
+        **price_arrays({tag: float(intervention_costs.loc[tag]) for tag in PRICE_TAGS}),
+        'discount_rate': float(discount_rate),
+    }
+
+
+def price_arrays(prices: dict) -> dict:
+    '''
+    Price arrays of `to_arrays` (`unit_price`, `yearly_price`, `one_off_price` by cost line) from `prices` {price tag: price} of all `PRICE_TAGS`.
+    '''
+    def price(tag):
+        return prices[tag] if tag is not None else 0.
+
+    return {
+        'unit_price': np.array([price(UNIT_PRICES[col][1]) if col in UNIT_PRICES else 0. for col in COSTS]),
+        'yearly_price': np.array([price(FIXED_PRICES[col][0]) if col in FIXED_PRICES else 0. for col in COSTS]),
+        'one_off_price': np.array([price(FIXED_PRICES[col][1]) if col in FIXED_PRICES else 0. for col in COSTS]),
+    }
+
+
+def price_positions(tag: tuple) -> list:
+    '''
+    Positions of a price tag of `intervention_costs` in the price arrays of `to_arrays` - list of (array name, cost line position).
+    '''
+    positions = []
+    for pos, col in enumerate(COSTS):
+        if col in UNIT_PRICES and UNIT_PRICES[col][1] == tag:
+            positions.append(('unit_price', pos))
+        if col in FIXED_PRICES and FIXED_PRICES[col][0] == tag:
+            positions.append(('yearly_price', pos))
+        if col in FIXED_PRICES and FIXED_PRICES[col][1] == tag:
+            positions.append(('one_off_price', pos))
+    return positions
+
+
+def rolling_sum(values: np.ndarray, windows: np.ndarray) -> np.ndarray:
+    '''
+    Rolling sums over the year axis (axis 1) of `values` (scenario, year, column) with window `windows` (scenario, column), `min_periods=1`.
+
+    Closed form - difference of cumulative sums at the end and at the start of each window.
+    '''
+    n_years = values.shape[1]
+    cumulative = np.concatenate([np.zeros_like(values[:, :1]), values.cumsum(axis=1)], axis=1)
+    window_start = np.maximum(np.arange(1, n_years + 1)[np.newaxis, :, np.newaxis] - windows[:, np.newaxis, :], 0)
+    return cumulative[:, 1:] - np.take_along_axis(cumulative, window_start, axis=1)
+
+
+def run_arrays(interventions, hhs, apartment_years, assistance_share, assistance_years, mop_housing_share, unit_price, yearly_price, one_off_price, discount_rate, dimensions=DEFAULT) -> dict:
+    '''
+    Array version of `main.calculate_costs`.
+
+    `interventions` (scenario, year, intervention_type, risk) and `hhs` (scenario, year, hh_status, risk) come from `engine.run_arrays`
+    (with categories of `dimensions`), cost parameters (see `to_arrays`) carry a leading scenario axis - costs of all scenarios are determined at once.
+
+    Returns dict of arrays `costs`, `costs_units`, `costs_discounted` (scenario, year, column), `social_assistence_breakdown` (scenario, year, assisted type)
+    and `npv` (scenario, cost line) - total of discounted costs.
+    '''
+    n_years = interventions.shape[1]
+    TYPE_POS = dimensions.type_pos
+    apartments = interventions[:, :, [TYPE_POS[it] for it in APARTMENT_TYPES]]
+
+    # Number of apartment interventions in given year and apartments assigned in the given year (years_of_support included)
+    entry_apartments = apartments.sum(axis=3)
+    yearly_apartments = rolling_sum(entry_apartments, apartment_years)
+
+    # Number of consultings - all interventions in 'guaranteed', 'municipal','consulting','mop_payment'
+    consulting_units = interventions[:, :, [TYPE_POS[it] for it in ['guaranteed','municipal','consulting','mop_payment']]].sum(axis=(2, 3))
+
+    # Number of Mops (paid directly and with housing)
+    direct_mops = interventions[:, :, TYPE_POS['mop_payment']].sum(axis=2)
+    housing_mops = (apartments * mop_housing_share[:, np.newaxis]).sum(axis=(2, 3))
+    mops = direct_mops + housing_mops
+
+    # Number of social assistences
+    assisted = np.stack([entry_apartments[..., 0], direct_mops, entry_apartments[..., 1]], axis=2) * assistance_share[:, np.newaxis]
+    social_assistence_breakdown = rolling_sum(assisted, assistance_years)
+
+    queue = hhs[:, :, dimensions.queue].sum(axis=2)
+
+    costs_units = np.stack([
+        entry_apartments[..., 0],
+        entry_apartments[..., 1],
+        yearly_apartments[..., 0],
+        yearly_apartments[..., 1],
+        consulting_units,
+        mops,
+        social_assistence_breakdown.sum(axis=2),
+        queue,
+    ], axis=2)
+
+    # Convert units to costs ("labelling price tags"), fixed costs are added, one-offs are accounted to the first year
+    priced_units = costs_units[:, :, [COST_UNITS.index(UNIT_PRICES[col][0]) if col in UNIT_PRICES else 0 for col in COSTS]]
+    costs = priced_units * unit_price[:, np.newaxis] + yearly_price[:, np.newaxis]
+    costs[:, 0] += one_off_price
+
+    # Discounting future costs
+    discount_factors = (1 + np.asarray(discount_rate, dtype=float)[:, np.newaxis]) ** np.arange(n_years)
+    costs_discounted = costs / discount_factors[..., np.newaxis]
+
+    return {
+        'costs': costs,
+        'costs_units': costs_units,
+        'costs_discounted': costs_discounted,
+        'social_assistence_breakdown': social_assistence_breakdown,
+        'npv': costs_discounted.sum(axis=1),
+    }
+
+
+def to_frames(arrays: dict, index: pd.Index, scenarios: pd.Index = None) -> dict:
+    '''
+    Labels arrays of `run_arrays` - leading (scenario, year) axes are flattened into `index`, `npv` is indexed by `scenarios`.
+    '''
+    def frame(values, columns):
+        return pd.DataFrame(values.reshape(len(index), -1), index=index, columns=columns)
+
+    return {
+        'costs': frame(arrays['costs'], COSTS),
+        'costs_units': frame(arrays['costs_units'], COST_UNITS),
+        'costs_discounted': frame(arrays['costs_discounted'], COSTS),
+        'social_assistence_breakdown': frame(arrays['social_assistence_breakdown'], ASSISTED_TYPES),
+        'npv': pd.DataFrame(arrays['npv'], index=scenarios, columns=COSTS) if scenarios is not None else pd.Series(arrays['npv'][0], index=COSTS),
+    }
+
+
+def calculate_costs(interventions, hhs, years_of_support, social_assistences, intervention_costs, discount_rate, mop_housing_share, dimensions=DEFAULT):
+    '''
+    Vectorized counterpart of `main.calculate_costs` for a single scenario.
+
+    Returns `costs`, `costs_units`, `costs_discounted`, `social_assistence_breakdown` and `npv` (total discounted costs per cost line).
+    '''
+    types, statuses, risks = dimensions.intervention_types, dimensions.hh_statuses, dimensions.hh_risks
+    parameters = to_arrays(years_of_support, social_assistences, intervention_costs, discount_rate, mop_housing_share, dimensions)
+    arrays = run_arrays(
+        interventions=interventions.loc[:, pd.MultiIndex.from_product([types, risks])].to_numpy().reshape(1, len(interventions), len(types), len(risks)),
+        hhs=hhs.loc[:, pd.MultiIndex.from_product([statuses, risks])].to_numpy().reshape(1, len(hhs), len(statuses), len(risks)),
+        dimensions=dimensions,
+        **{key: np.asarray(value)[np.newaxis] for key, value in parameters.items()}
+    )
+    frames = to_frames(arrays, interventions.index)
+    return frames['costs'], frames['costs_units'], frames['costs_discounted'], frames['social_assistence_breakdown'], frames['npv']
@@ -0,0 +1,135 @@
+import pandas as pd
+import numpy as np
+
+from constants import HH_RISKS, INTERVENTION_TYPES, APARTMENT_TYPES, RISK_TRANSITIONS, APARTMENT_PRIORITIES
+
+
+def _ordered(labels, defaults: list) -> list:
+    # Built-in labels keep their order (and so do the dense arrays of default scenarios), other labels follow in order of appearance
+    labels = list(dict.fromkeys(labels))
+    return [label for label in defaults if label in labels] + [label for label in labels if label not in defaults]
+
+
+def transition_dict(low_to_high_risk_share, risk_transitions=None) -> dict:
+    '''
+    Yearly shares of households in queue moving between risk groups {(from, to): share}, parameters as in `transition_shares`.
+    '''
+    if isinstance(risk_transitions, pd.DataFrame):
+        risk_transitions = risk_transitions.stack()
+        risk_transitions = risk_transitions[risk_transitions != 0]
+    transitions = {tuple(transition): float(share) for transition, share in dict(risk_transitions).items()} if risk_transitions is not None else {}
+    if low_to_high_risk_share is not None:
+        if ('low', 'high') in transitions:
+            raise Exception('Transition (low, high) is given both by `low_to_high_risk_share` and `risk_transitions`...')
+        transitions = {('low', 'high'): float(low_to_high_risk_share), **transitions}
+    return transitions
+
+
+def transition_shares(low_to_high_risk_share, risk_transitions=None) -> pd.Series:
+    '''
+    Sparse table of yearly shares of households in queue moving between risk groups, indexed by (`from`, `to`).
+
+    `risk_transitions` is a dict {(from, to): share}, a Series indexed by (from, to) or a matrix (from x to, missing and zero
+    entries are left out). `low_to_high_risk_share` is the (low, high) transition, None if there is no such transition.
+    '''
+    transitions = transition_dict(low_to_high_risk_share, risk_transitions)
+    return pd.Series(list(transitions.values()), index=pd.MultiIndex.from_tuples(list(transitions), names=('from', 'to')), dtype=float)
+
+
+class Dimensions:
+    '''
+    Categories the model is simulated over - household risk groups, intervention types (household statuses follow from them),
+    transitions between risk groups and the priority order of apartment assignments.
+
+    Intervention types must include the built-in `INTERVENTION_TYPES` (apartment supply and cost lines are tied to them), other types are
+    soft interventions given by shares. `transitions` (from, to) is the sparse structure of risk transitions, their shares are scenario
+    parameters. `apartment_priorities` lists (apartment_type, hh_risk) in the order of assignment - risk groups not listed get no apartments.
+
+    The dense arrays of the engine are ordered as the lists here. Consecutive priorities with distinct apartment types and risk groups
+    do not compete for apartments nor households, so they are assigned at once (`priority_waves`).
+    '''
+
+    def __init__(self, hh_risks: list = HH_RISKS, intervention_types: list = INTERVENTION_TYPES, transitions: list = RISK_TRANSITIONS, apartment_priorities: list = None):
+        self.hh_risks = list(hh_risks)
+        self.intervention_types = list(intervention_types)
+        self.transitions = [tuple(transition) for transition in transitions]
+        if apartment_priorities is None:
+            apartment_priorities = [(at, hh_risk) for at, hh_risk in APARTMENT_PRIORITIES if hh_risk in self.hh_risks]
+        self.apartment_priorities = [tuple(priority) for priority in apartment_priorities]
+
+        if len(set(self.hh_risks)) != len(self.hh_risks) or len(set(self.intervention_types)) != len(self.intervention_types):
+            raise Exception('Risk groups and intervention types must be unique...')
+        missing = [it for it in INTERVENTION_TYPES if it not in self.intervention_types]
+        if missing:
+            raise Exception(f'Intervention types must include {INTERVENTION_TYPES}, missing {missing}...')
+        unknown = [t for t in self.transitions if t[0] not in self.hh_risks or t[1] not in self.hh_risks or t[0] == t[1]]
+        if unknown or len(set(self.transitions)) != len(self.transitions):
+            raise Exception(f'Risk transitions must be unique pairs of distinct risk groups {self.hh_risks}, got {unknown or self.transitions}...')
+        unknown = [p for p in self.apartment_priorities if p[0] not in APARTMENT_TYPES or p[1] not in self.hh_risks]
+        if unknown or len(set(self.apartment_priorities)) != len(self.apartment_priorities):
+            raise Exception(f'Apartment priorities must be unique pairs of {APARTMENT_TYPES} and risk groups {self.hh_risks}, got {unknown or self.apartment_priorities}...')
+
+        self.hh_statuses = self.intervention_types + ['queue'] + [f'outside_{it}' for it in self.intervention_types]
+        self.soft_types = [it for it in self.intervention_types if it not in APARTMENT_TYPES]
+
+        # Positions of labels in the dense arrays
+        self.risk_pos = {h: i for i, h in enumerate(self.hh_risks)}
+        self.type_pos = {it: i for i, it in enumerate(self.intervention_types)}
+        self.status_pos = {st: i for i, st in enumerate(self.hh_statuses)}
+        self.queue = self.status_pos['queue']
+        self.outside = slice(self.queue + 1, len(self.hh_statuses))
+        # pandas sums over intervention types in label (alphabetical) order - the engine sums in the same order to be bit-identical
+        self.sorted_types = np.array([self.type_pos[it] for it in sorted(self.intervention_types)])
+
+        self.sources = np.array([self.risk_pos[source] for source, _ in self.transitions], dtype=int)
+        self.targets = np.array([self.risk_pos[target] for _, target in self.transitions], dtype=int)
+        # Without repeated sources and targets the transfer needs no unbuffered (`ufunc.at`) updates
+        self.distinct_transitions = len(set(self.sources)) == len(self.sources) and len(set(self.targets)) == len(self.targets)
+
+        waves = []
+        for apartment_type, hh_risk in self.apartment_priorities:
+            row = (self.type_pos[apartment_type], self.risk_pos[hh_risk], APARTMENT_TYPES.index(apartment_type))
+            if waves and row[1] not in waves[-1][1] and row[2] not in waves[-1][2]:
+                for wave, value in zip(waves[-1], row):
+                    wave.append(value)
+            else:
+                waves.append(([row[0]], [row[1]], [row[2]]))
+        # (intervention types, risk groups, apartment types) of priorities assigned at once
+        self.priority_waves = [tuple(np.array(values) for values in wave) for wave in waves]
+
+        self.key = (tuple(self.hh_risks), tuple(self.intervention_types), tuple(self.transitions), tuple(self.apartment_priorities))
+
+    @classmethod
+    def from_inputs(cls, hhs_inflow: pd.DataFrame, years_of_support: pd.Series, transitions, apartment_priorities=None) -> 'Dimensions':
+        '''
+        Dimensions given by the parameters of `simulate_social_housing` - risk groups are the rows of `hhs_inflow`, intervention types
+        the labels of `years_of_support`, transitions the index of `transitions` (see `transition_shares`) or the keys of a dict of `transition_dict`.
+        `apartment_priorities` is a list of (apartment_type, hh_risk) or a table with these columns, in the order of assignment.
+        '''
+        if isinstance(apartment_priorities, pd.DataFrame):
+            apartment_priorities = list(apartment_priorities[['apartment_type', 'hh_risk']].itertuples(index=False, name=None))
+        return cls(
+            hh_risks=_ordered(hhs_inflow.index, HH_RISKS),
+            intervention_types=_ordered(years_of_support.index, INTERVENTION_TYPES),
+            transitions=list(transitions.index) if isinstance(transitions, pd.Series) else list(transitions),
+            apartment_priorities=apartment_priorities,
+        )
+
+    def transition_array(self, transitions) -> np.ndarray:
+        '''
+        Shares of `transitions` (see `transition_shares` and `transition_dict`) ordered as `self.transitions`.
+        '''
+        transitions = dict(transitions)
+        return np.array([transitions[transition] for transition in self.transitions], dtype=float)
+
+    def __eq__(self, other):
+        return isinstance(other, Dimensions) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f'Dimensions(risks={len(self.hh_risks)}, types={len(self.intervention_types)}, transitions={len(self.transitions)}, priorities={len(self.apartment_priorities)})'
+
+
+DEFAULT = Dimensions()
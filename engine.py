@@ -0,0 +1,296 @@
+import pandas as pd
+import numpy as np
+
+from constants import APARTMENT_TYPES
+from dimensions import DEFAULT
+from profiling import DISABLED
+import kernel
+
+
+def share_coefficients(startup_coefficients: pd.DataFrame, years: np.ndarray, dimensions=DEFAULT) -> np.ndarray:
+    '''
+    Startup coefficients of soft interventions expanded to (year, intervention_type) - 1 for years and intervention types without a coefficient.
+    '''
+    soft_startup = [it for it in ['consulting','mop_payment'] if it in startup_coefficients.columns]
+    coefficients = np.ones((len(years), len(dimensions.intervention_types)))
+    coefficients[:, [dimensions.type_pos[it] for it in soft_startup]] = startup_coefficients[soft_startup].reindex(years).fillna(1).to_numpy(dtype=float)
+    return coefficients
+
+
+def expand_shares(shares: np.ndarray, coefficients: np.ndarray) -> np.ndarray:
+    '''
+    Effective shares (..., year, intervention_type, risk) from shares (..., intervention_type, risk) and startup `coefficients` (year, intervention_type).
+
+    Multiplying by coefficient 1 is exact, so shares of types without startup are kept as they are.
+    '''
+    return shares[..., np.newaxis, :, :] * coefficients[:, :, np.newaxis]
+
+
+def to_arrays(apartments, relapse_rates, intervention_shares, hhs_inflow, years_of_support, startup_coefficients, years, dimensions=DEFAULT):
+    '''
+    Converts labelled model inputs into dense arrays used by `run_arrays`, ordered as the labels of `dimensions`.
+
+    Shares and startup coefficients are expanded to (year, intervention_type, risk) so that no lookup is needed inside the year loop.
+    `apartments` is a dataframe from `supply.simulate_apartment_stock` or an already dense (year, apartment_type) array.
+    '''
+    types, risks = dimensions.intervention_types, dimensions.hh_risks
+    shares = intervention_shares.reindex(index=risks, columns=types).fillna(0).to_numpy(dtype=float).T
+    year_shares = expand_shares(shares, share_coefficients(startup_coefficients, years, dimensions))
+    relapse = relapse_rates.reindex(index=risks, columns=types).fillna(0).to_numpy(dtype=float).T
+
+    return {
+        'apartments': apartments.reindex(index=years, columns=APARTMENT_TYPES).to_numpy() if isinstance(apartments, pd.DataFrame) else np.asarray(apartments),
+        'shares': year_shares,
+        'soft_types': np.array([dimensions.type_pos[it] for it in intervention_shares.columns]),
+        'relapse': relapse,
+        'current_level': hhs_inflow.loc[risks, 'current_level'].to_numpy(dtype=float),
+        'yearly_growth': hhs_inflow.loc[risks, 'yearly_growth'].to_numpy(dtype=float),
+        'years_of_support': years_of_support.loc[types].to_numpy(dtype=int),
+    }
+
+
+def run_arrays(apartments, shares, soft_types, relapse, current_level, yearly_growth, years_of_support, transitions, n_years, cohort_length=None, start_year=0, checkpoint=None, dimensions=DEFAULT, jit=None, age_structure=True, hold_states=False):
+    '''
+    Array version of `main.generate_interventions`.
+
+    All parameters carry a leading scenario axis, so that any number of scenarios is simulated in one pass of the year loop:
+        * `apartments` (scenario, year, apartment_type)
+        * `shares` (scenario, year, intervention_type, risk)
+        * `relapse` (scenario, intervention_type, risk)
+        * `current_level`, `yearly_growth` (scenario, risk)
+        * `years_of_support` (scenario, intervention_type)
+        * `transitions` (scenario, transition) - shares of the risk transitions of `dimensions`
+
+    Follows the very same rules (and order of floating point operations) as the pandas implementation:
+        1. Determine hhs and particularly queue (returnees from ending cohorts of interventions, risk transfer, inflow)
+        2. Soft interventions given by shares
+        3. Priority assignments of apartments (see `dimensions.Dimensions`)
+        4. Record new cohort of interventions
+
+    Categories are axes of the arrays (ordered as in `dimensions`) - the year loop does not loop over risk groups nor intervention types,
+    risk transitions are applied as a sparse (from, to) list and apartment priorities in waves of independent assignments.
+    `soft_types` are positions of soft intervention types in the column order of `intervention_shares` (the order pandas sums them in).
+    `cohort_length` is the length of the ring buffer of cohorts (and of the age axis of `cohorts_by_age`), the longest `years_of_support` by default.
+
+    Results up to a year are a complete checkpoint of the simulation state at the end of that year - queue and outside pools in `hhs`,
+    cumulative `apartments_assigned` and cohorts of ongoing interventions in `interventions`. With `start_year` > 0 the years before it are taken
+    from `checkpoint` (dict with `interventions`, `hhs`, `returnees`, `apartments_assigned` and `cohorts` of a run with the same inputs up to `start_year`,
+    see `first_difference`) and only the remaining years are simulated.
+
+    The year loop runs in the compiled `kernel` when Numba is installed (`jit=None`), `jit=False` keeps the NumPy loop below
+    and `jit=True` runs the kernel even without Numba (interpreted, only to check its parity) - both give the same numbers.
+    With `age_structure=False` the age structure of cohorts is not built (`cohorts_by_age` is None) - callers reducing the results
+    to a few metrics skip its (scenario, year, cohort_age, ...) array.
+    Years before any intervention can end are left empty as in the pandas implementation; with `hold_states=True` households keep
+    their statuses from the previous year instead - sub-annual steps (see `substeps`) need it, as supports there last several steps.
+
+    Returns arrays `interventions` (scenario, year, intervention_type, risk), `hhs` (scenario, year, hh_status, risk),
+    `returnees` (scenario, year, intervention_type, risk), cumulative `apartments_assigned` (scenario, year, apartment_type),
+    age structure of ongoing interventions `cohorts_by_age` (scenario, year, cohort_age, intervention_type, risk) and a boolean mask (scenario, year) of years in which returnees were determined.
+    '''
+    n_scenarios = len(current_level)
+    n_types = len(dimensions.intervention_types)
+    n_risks = len(dimensions.hh_risks)
+    QUEUE, OUTSIDE = dimensions.queue, dimensions.outside
+    scenario_index = np.arange(n_scenarios)[:, np.newaxis]
+    type_index = np.arange(n_types)[np.newaxis, :]
+    transitions = np.asarray(transitions, dtype=float).reshape(n_scenarios, len(dimensions.transitions))
+
+    hhs = np.zeros((n_scenarios, n_years, len(dimensions.hh_statuses), n_risks))
+    interventions = np.zeros((n_scenarios, n_years, n_types, n_risks))
+    returnees = np.zeros((n_scenarios, n_years, n_types, n_risks))
+    returnees_known = np.zeros((n_scenarios, n_years), dtype=bool)
+    apartments_assigned = np.zeros((n_scenarios, n_years, len(APARTMENT_TYPES)))
+
+    # Ring buffer of interventions by their start year (started in `yr` are stored in slot `yr % cohort_length`) and its age structure in each year
+    cohort_length = cohort_length or years_of_support.max()
+    ages = np.arange(cohort_length)
+    cohorts = np.zeros((n_scenarios, cohort_length, n_types, n_risks))
+    cohorts_by_age = np.zeros((n_scenarios, n_years, cohort_length, n_types, n_risks)) if age_structure else None
+    supported_ages = ages[np.newaxis, :, np.newaxis] < years_of_support[:, np.newaxis, :]
+
+    if start_year > 0:
+        if checkpoint['cohorts'].shape[2] != cohort_length:
+            raise Exception('Checkpoint was made with a different length of cohorts...')
+        hhs[:, :start_year] = checkpoint['hhs'][:, :start_year]
+        interventions[:, :start_year] = checkpoint['interventions'][:, :start_year]
+        returnees[:, :start_year] = checkpoint['returnees'][:, :start_year]
+        apartments_assigned[:, :start_year] = checkpoint['apartments_assigned'][:, :start_year]
+        if age_structure:
+            cohorts_by_age[:, :start_year] = checkpoint['cohorts'][:, :start_year]
+        returnees_known[:, :start_year] = (np.arange(start_year)[np.newaxis, :, np.newaxis] >= years_of_support[:, np.newaxis, :]).any(axis=2)
+        # Ring buffer holds the cohorts started in the last `cohort_length` years
+        for yr in range(max(start_year - cohort_length, 0), start_year):
+            cohorts[:, yr % cohort_length] = interventions[:, yr]
+    else:
+        hhs[:, 0, QUEUE] = current_level
+
+    if jit or (jit is None and kernel.AVAILABLE):
+        kernel.run_years(
+            apartments, shares, soft_types, relapse, yearly_growth, years_of_support, transitions, dimensions, start_year,
+            hhs, interventions, returnees, returnees_known, apartments_assigned, cohorts, cohorts_by_age, hold_states
+        )
+        return interventions, hhs, returnees, apartments_assigned, cohorts_by_age, returnees_known
+
+    for yr in range(start_year, n_years):
+        # 1. Determine queue (only in scenarios where at least one intervention type can end)
+        start_years = yr - years_of_support
+        ending_types = start_years >= 0
+        active = ending_types.any(axis=1)
+        if active.any():
+            queue = transfer_risks(hhs[:, yr - 1, QUEUE], transitions, dimensions)
+            queue = queue + yearly_growth
+
+            ending = cohorts[scenario_index, start_years % cohort_length, type_index]
+            ending = np.where(ending_types[..., np.newaxis], ending, 0.)
+
+            ongoing = hhs[:, yr - 1, :n_types] - ending
+
+            number_of_returnees = ending * relapse
+
+            returnees_to_queue = number_of_returnees[:, dimensions.sorted_types].sum(axis=1)
+            queue += transfer_risks(returnees_to_queue, transitions, dimensions)
+
+            outside = hhs[:, yr - 1, OUTSIDE] + (ending - number_of_returnees)
+
+            if active.all():
+                hhs[:, yr, QUEUE] = queue
+                hhs[:, yr, :n_types] = ongoing
+                hhs[:, yr, OUTSIDE] = outside
+                returnees[:, yr] = number_of_returnees
+            else:
+                hhs[active, yr, QUEUE] = queue[active]
+                hhs[active, yr, :n_types] = ongoing[active]
+                hhs[active, yr, OUTSIDE] = outside[active]
+                returnees[active, yr] = number_of_returnees[active]
+            returnees_known[:, yr] = active
+        if hold_states and yr > 0 and not active.all():
+            # No intervention can end yet - households stay where they were in the previous year
+            hhs[~active, yr] = hhs[~active, yr - 1]
+
+        # 2. Soft interventions
+        intervened = hhs[:, yr, np.newaxis, QUEUE] * shares[:, yr, soft_types]
+        interventions[:, yr, soft_types] = intervened
+        hhs[:, yr, QUEUE] -= intervened.sum(axis=1)
+        hhs[:, yr, soft_types] += intervened
+
+        # 3. Apartments - available apartments are read from the running ledger of assignments
+        if yr > 0:
+            apartments_assigned[:, yr] = apartments_assigned[:, yr - 1]
+        # (priorities in one wave share neither apartment types nor risk groups, so they are independent)
+        for t, r, a in dimensions.priority_waves:
+            available = apartments[:, yr, a] - apartments_assigned[:, yr, a]
+            assignment = np.minimum(available, hhs[:, yr, QUEUE, r])
+            interventions[:, yr, t, r] = assignment
+            apartments_assigned[:, yr, a] += assignment
+            hhs[:, yr, QUEUE, r] -= assignment
+            hhs[:, yr, t, r] += assignment
+
+        # 4. Record new cohort (replaces the cohort that ended this year)
+        cohorts[:, yr % cohort_length] = interventions[:, yr]
+        if age_structure:
+            ongoing = supported_ages & (ages <= yr)[np.newaxis, :, np.newaxis]
+            cohorts_by_age[:, yr] = np.where(ongoing[..., np.newaxis], cohorts[:, (yr - ages) % cohort_length], 0.)
+
+    return interventions, hhs, returnees, apartments_assigned, cohorts_by_age, returnees_known
+
+
+def transfer_risks(queue: np.ndarray, transitions: np.ndarray, dimensions=DEFAULT) -> np.ndarray:
+    '''
+    Moves shares `transitions` (scenario, transition) of households in `queue` (scenario, risk) along the sparse risk transitions of `dimensions`
+    - all shares apply to the queue before the transfer, leaving households are removed first and then added to their new groups. Returns the new queue.
+    '''
+    transfer = queue[:, dimensions.sources] * transitions
+    queue = queue.copy()
+    if dimensions.distinct_transitions:
+        queue[:, dimensions.sources] -= transfer
+        queue[:, dimensions.targets] += transfer
+    else:
+        np.subtract.at(queue, (slice(None), dimensions.sources), transfer)
+        np.add.at(queue, (slice(None), dimensions.targets), transfer)
+    return queue
+
+
+def first_difference(arrays: dict, other: dict) -> int:
+    '''
+    First year (position) in which inputs of two scenarios (see `to_arrays`) differ - `run_arrays` of both gives the same results before it.
+    Returns the number of years if the inputs are identical.
+
+    Apartments and shares act from their year on, other inputs (relapse rates, inflow, years of support, ...) from the first year.
+    '''
+    if arrays['shares'].shape != other['shares'].shape:
+        return 0
+    for key in arrays:
+        if key not in ['apartments', 'shares'] and not np.array_equal(arrays[key], other[key]):
+            return 0
+
+    differs = (arrays['apartments'] != other['apartments']).any(axis=-1) | (arrays['shares'] != other['shares']).any(axis=(-2, -1))
+    return int(np.argmax(differs)) if differs.any() else len(differs)
+
+
+def stack_arrays(arrays: list) -> dict:
+    '''
+    Stacks arrays of individual scenarios (see `to_arrays`) along a leading scenario axis.
+    '''
+    soft_types = arrays[0]['soft_types']
+    if any(not np.array_equal(a['soft_types'], soft_types) for a in arrays):
+        raise Exception('All scenarios must share the same intervention types (in the same column order) in `intervention_shares`...')
+
+    stacked = {key: np.stack([a[key] for a in arrays]) for key in arrays[0] if key != 'soft_types'}
+    stacked['soft_types'] = soft_types
+    return stacked
+
+
+def to_frame(values: np.ndarray, index: pd.Index, labels: list, name: str, hh_risks: list = DEFAULT.hh_risks) -> pd.DataFrame:
+    '''
+    Converts (..., `name`, risk) array into a labelled dataframe with (`name`, 'hh_risk') columns, leading axes are flattened into `index`.
+
+    Values are stored column-major, i.e. in the same memory layout as the column-by-column filled dataframes of `main` -
+    reductions of the dataframe (e.g. in `main.calculate_costs`) then sum in the same order and give bit-identical results.
+    '''
+    return pd.DataFrame(
+        np.asfortranarray(values.reshape(len(index), -1)),
+        index=index,
+        columns=pd.MultiIndex.from_product([labels, hh_risks], names=(name, 'hh_risk'))
+    )
+
+
+def generate_interventions(
+    apartments: pd.DataFrame,
+    relapse_rates: pd.DataFrame,
+    intervention_shares: pd.DataFrame,
+    hhs_inflow: pd.DataFrame,
+    years_of_support: pd.Series,
+    risk_transitions: pd.Series,
+    startup_coefficients: pd.DataFrame,
+    years: np.ndarray,
+    dimensions=DEFAULT,
+    profiler=DISABLED
+) -> pd.DataFrame:
+    '''
+    Drop-in replacement of `main.generate_interventions` keeping the state in preallocated NumPy arrays.
+
+    Returns the same `interventions`, `hhs`, `returnees`, `apartments_assigned` and `cohorts` dataframes - the labelled tables are built only once, after the last simulated year.
+    `profiler` measures the conversion to arrays, the year loop and the labelling (the year loop is not split into years).
+    '''
+    with profiler.stage('to_arrays'):
+        arrays = stack_arrays([to_arrays(apartments, relapse_rates, intervention_shares, hhs_inflow, years_of_support, startup_coefficients, years, dimensions)])
+    with profiler.stage('run_arrays'):
+        interventions, hhs, returnees, apartments_assigned, cohorts_by_age, returnees_known = (values[0] for values in run_arrays(
+            transitions=dimensions.transition_array(risk_transitions)[np.newaxis],
+            n_years=len(years),
+            dimensions=dimensions,
+            **arrays
+        ))
+
+    returnees[~returnees_known] = np.nan
+
+    with profiler.stage('to_frames'):
+        types, risks = dimensions.intervention_types, dimensions.hh_risks
+        return (
+            to_frame(interventions, years, types, 'intervention_type', risks),
+            to_frame(hhs, years, dimensions.hh_statuses, 'hh_status', risks),
+            to_frame(returnees, years, types, 'intervention_type', risks),
+            pd.DataFrame(apartments_assigned, index=years, columns=APARTMENT_TYPES),
+            to_frame(cohorts_by_age, pd.MultiIndex.from_product([years, range(cohorts_by_age.shape[1])], names=[None, 'cohort_age']), types, 'intervention_type', risks),
+        )
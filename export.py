@@ -0,0 +1,252 @@
+import os
+import glob
+import json
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+# Tables written for every variant (the same as in `analysis.save_tables_to_excel`)
+TABLES = ['interventions','returnees','hhs','apartments_assigned','apartments_available','cohorts','costs','costs_units','costs_discounted', 'social_assistence_breakdown']
+FORMATS = ['parquet', 'arrow']
+EXCEL_MAX_ROWS = 1048576
+
+
+def _arrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise Exception('Export into Parquet/Arrow datasets requires `pyarrow` (pip install pyarrow)...')
+    return pyarrow
+
+
+class DatasetWriter:
+    '''
+    Streams tables of variants into a dataset directory `root` partitioned by table and variant - every write adds one part file per table
+    `{root}/{table}/part-{id}.{parquet|arrow}` in which each variant is a separate row group (Parquet) or record batch (Arrow IPC),
+    so a variant is read back without touching the others. Memory does not grow with the number of variants.
+
+    Variants (name, title, part and row group) are listed in `{root}/variants.jsonl`.
+    `format` is `parquet` (compressed) or `arrow` (uncompressed Arrow IPC, read back by memory mapping without copies).
+
+    A new writer clears a dataset previously written into `root` and writes its manifest `{root}/dataset.json`;
+    with `clear=False` it only adds parts into the dataset created before (workers of `export_variants`).
+    '''
+
+    def __init__(self, root: str, tables: list = None, format: str = 'parquet', clear: bool = True):
+        if format not in FORMATS:
+            raise Exception(f'Unknown format `{format}`, use one of {FORMATS}')
+        self.root = root
+        self.tables = tables or TABLES
+        self.format = format
+        if clear:
+            self.clear()
+            with open(os.path.join(root, 'dataset.json'), 'w', encoding='utf-8') as file:
+                json.dump({'format': format, 'tables': self.tables}, file)
+
+    def clear(self):
+        '''
+        Removes the manifest, the variant list and part files of a dataset previously written into `root` (other files are kept).
+        '''
+        os.makedirs(self.root, exist_ok=True)
+        tables = set(self.tables)
+        manifest = os.path.join(self.root, 'dataset.json')
+        if os.path.exists(manifest):
+            with open(manifest, encoding='utf-8') as file:
+                tables |= set(json.load(file)['tables'])
+            os.remove(manifest)
+        for table in tables:
+            for path in glob.glob(os.path.join(self.root, table, 'part-*')):
+                os.remove(path)
+        if os.path.exists(os.path.join(self.root, 'variants.jsonl')):
+            os.remove(os.path.join(self.root, 'variants.jsonl'))
+
+    def write(self, variant: str, outputs: dict):
+        '''
+        Writes tables of one variant (outputs of `simulate_social_housing`), a later write of the same variant replaces it.
+        '''
+        self.write_part([str(variant)], [outputs.get('title')], {table: pd.concat({str(variant): outputs[table]}, names=['variant']) for table in self.tables})
+
+    def write_part(self, variants: list, titles: list, frames: dict):
+        '''
+        Writes tables of several variants at once - `frames` {table: dataframe} are indexed by (variant, ...) with rows of `variants` in the given order.
+        '''
+        pa = _arrow()
+        part = uuid.uuid4().hex
+        for table in self.tables:
+            frame = frames[table]
+            path = os.path.join(self.root, table, f'part-{part}.{self.format}')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            arrow_table = pa.Table.from_pandas(frame, preserve_index=True)
+
+            # Row ranges of the variants - variants are contiguous blocks of rows
+            codes = pd.Index(variants).get_indexer(frame.index.get_level_values('variant'))
+            bounds = [0] + list((codes[1:] != codes[:-1]).nonzero()[0] + 1) + [len(codes)]
+            temporary = f'{path}.tmp'
+            if self.format == 'parquet':
+                import pyarrow.parquet as pq
+                with pq.ParquetWriter(temporary, arrow_table.schema) as writer:
+                    for start, stop in zip(bounds[:-1], bounds[1:]):
+                        writer.write_table(arrow_table.slice(start, stop - start))
+            else:
+                with pa.OSFile(temporary, 'wb') as sink, pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                    for start, stop in zip(bounds[:-1], bounds[1:]):
+                        writer.write_table(arrow_table.slice(start, stop - start))
+            os.replace(temporary, path)
+
+        lines = [json.dumps({'variant': variant, 'title': title, 'part': part, 'group': group}, ensure_ascii=False) for group, (variant, title) in enumerate(zip(variants, titles))]
+        with open(os.path.join(self.root, 'variants.jsonl'), 'a', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+
+
+class DatasetReader:
+    '''
+    Reads a dataset written by `DatasetWriter` - part files are memory mapped and only the row groups of the requested variants are loaded.
+    '''
+
+    def __init__(self, root: str):
+        self.root = root
+        with open(os.path.join(root, 'dataset.json'), encoding='utf-8') as file:
+            meta = json.load(file)
+        self.format = meta['format']
+        self.tables = meta['tables']
+
+    def variants(self) -> pd.DataFrame:
+        '''
+        Variants in the dataset (the last write of a variant wins) with their title, part and row group, indexed by variant.
+        '''
+        with open(os.path.join(self.root, 'variants.jsonl'), encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file if line.strip()]
+        return pd.DataFrame(rows, columns=['variant', 'title', 'part', 'group']).drop_duplicates('variant', keep='last').set_index('variant')
+
+    def _read(self, table: str, part: str, groups: list) -> pd.DataFrame:
+        pa = _arrow()
+        path = os.path.join(self.root, table, f'part-{part}.{self.format}')
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(path, memory_map=True).read_row_groups(groups).to_pandas()
+        with pa.memory_map(path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            return pa.Table.from_batches([reader.get_batch(group) for group in groups]).to_pandas()
+
+    def iter_table(self, table: str, variants: list = None):
+        '''
+        Yields tables (indexed by variant, ...) of `variants` (names, all by default) part by part - one part in memory at a time.
+        '''
+        if table not in self.tables:
+            raise Exception(f'Table `{table}` is not in the dataset...')
+        listed = self.variants()
+        if variants is not None:
+            listed = listed.loc[[str(v) for v in variants]]
+        for part, groups in listed.groupby('part', sort=False)['group']:
+            yield self._read(table, part, sorted(groups))
+
+    def read(self, table: str, variants: list = None) -> pd.DataFrame:
+        '''
+        Table of `variants` (all by default) with a `variant` column (the layout of `analysis.save_tables_to_excel`).
+        '''
+        frame = pd.concat(list(self.iter_table(table, variants)))
+        variant = frame.index.get_level_values('variant')
+        return frame.droplevel('variant').assign(variant=variant)
+
+    def iter_variants(self, tables: list = None, variants: list = None):
+        '''
+        Yields (variant, tables of the variant) - e.g. for `write_excel`.
+        '''
+        listed = self.variants()
+        for variant in (listed.index if variants is None else variants):
+            outputs = {table: next(self.iter_table(table, [variant])).droplevel('variant') for table in tables or self.tables}
+            outputs['title'] = listed.loc[str(variant), 'title']
+            yield variant, outputs
+
+
+def _simulate_and_write(chunk: list, root: str, tables: list, format: str) -> int:
+    '''
+    Worker - simulates a chunk of variants [(name, parameters)] as one batch and writes them into the dataset as one part.
+    '''
+    from scenario import Scenario
+    from batch import run_scenarios, label_results
+
+    names = [str(name) for name, _ in chunk]
+    scenarios = [Scenario.from_dict({'title': name, **parameters}) for name, parameters in chunk]
+    frames = label_results(run_scenarios(scenarios), ids=names, years=scenarios[0].years, base_year=scenarios[0].base_year, titles=[s.title for s in scenarios], dimensions=scenarios[0].dimensions)
+
+    # Age structure of each variant only up to its longest support (as in `simulate_social_housing`)
+    support = pd.Series([int(s.arrays['years_of_support'].max()) for s in scenarios], index=names)
+    cohorts = frames['cohorts']
+    frames['cohorts'] = cohorts[cohorts.index.get_level_values('cohort_age') < support.reindex(cohorts.index.get_level_values('scenario')).to_numpy()]
+
+    DatasetWriter(root, tables, format, clear=False).write_part(names, [s.title for s in scenarios], {table: frames[table].rename_axis(index={'scenario': 'variant'}) for table in tables})
+    return len(chunk)
+
+
+def export_variants(variants, root: str, tables: list = None, format: str = 'parquet', chunksize: int = 100, max_workers: int = None) -> DatasetReader:
+    '''
+    Simulates `variants` ({name: parameters of `simulate_social_housing`} or an iterable of (name, parameters), e.g. a generator)
+    and streams their tables into a dataset (see `DatasetWriter`). All variants must share `years`.
+
+    Chunks of `chunksize` variants are simulated as batches on `max_workers` processes (all cores by default) and each worker writes
+    its chunk directly - at most two chunks per worker are in flight, so memory stays constant regardless of the number of variants.
+
+    The dataset previously written into `root` is cleared up front. Returns a reader of the dataset.
+    '''
+    tables = tables or TABLES
+    DatasetWriter(root, tables, format)
+    items = iter(variants.items() if isinstance(variants, dict) else variants)
+    max_workers = max_workers or os.cpu_count()
+
+    def chunks():
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    if max_workers == 1:
+        for chunk in chunks():
+            _simulate_and_write(chunk, root, tables, format)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            pending = set()
+            for chunk in chunks():
+                if len(pending) >= 2 * max_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(pool.submit(_simulate_and_write, chunk, root, tables, format))
+            for future in pending:
+                future.result()
+
+    return DatasetReader(root)
+
+
+def write_excel(variants, path: str, tables: list = None, max_rows: int = EXCEL_MAX_ROWS):
+    '''
+    Optional Excel output for small result sets - `variants` is an iterable of (variant, outputs of `simulate_social_housing`)
+    (e.g. `DatasetReader.iter_variants()` or `parallel.run_variants(...).items()`).
+
+    Variants are appended to the sheets one at a time (the layout of `analysis.save_tables_to_excel`, with a `variant` column);
+    a table that does not fit into `max_rows` rows continues on sheets `{table}_2`, `{table}_3`, ...
+    '''
+    tables = tables or TABLES
+    position = {table: [table, 0] for table in tables}
+
+    with pd.ExcelWriter(path) as writer:
+        for variant, outputs in variants:
+            for table in tables:
+                frame = outputs[table].assign(variant=outputs.get('title', variant))
+                header_rows = frame.columns.nlevels + (1 if frame.columns.nlevels > 1 else 0)
+                sheet, row = position[table]
+                if row and row + len(frame) > max_rows:
+                    part = int(sheet.rsplit('_', 1)[1]) + 1 if sheet != table else 2
+                    sheet, row = f'{table}_{part}', 0
+                if row == 0:
+                    frame.to_excel(writer, sheet_name=sheet)
+                    row = header_rows + len(frame)
+                else:
+                    frame.to_excel(writer, sheet_name=sheet, startrow=row, header=False)
+                    row += len(frame)
+                position[table] = [sheet, row]
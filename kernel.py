@@ -0,0 +1,180 @@
+'''
+Compiled year loop of `engine.run_arrays` - queue update, soft interventions, priority assignment of apartments and expiry of cohorts
+written as plain loops over scenarios and categories, compiled by Numba when it is installed (pip install numba).
+Long horizons and sub-annual steps then do not pay the interpreter overhead of many small array operations in every year.
+
+Compiled code is cached on disk (`__pycache__`), so only the first process after a change of this file pays the compilation.
+Without Numba `AVAILABLE` is False and `engine.run_arrays` keeps its NumPy loop - the functions here still run (interpreted, slowly),
+which is enough to check their parity:
+
+    python kernel.py
+'''
+import sys
+
+import numpy as np
+
+from constants import APARTMENT_TYPES
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+AVAILABLE = numba is not None
+
+
+def _compile(function):
+    return numba.njit(cache=True, nogil=True)(function) if AVAILABLE else function
+
+
+@_compile
+def _transfer(queue, transitions, sources, targets, out):
+    # `engine.transfer_risks` of one scenario - all leaving households are removed first, then added to their new groups
+    out[:] = queue
+    for n in range(len(sources)):
+        out[sources[n]] -= queue[sources[n]] * transitions[n]
+    for n in range(len(sources)):
+        out[targets[n]] += queue[sources[n]] * transitions[n]
+
+
+@_compile
+def _run_years(
+    apartments, shares, soft_types, relapse, yearly_growth, years_of_support, transitions, sources, targets, sorted_types,
+    priority_types, priority_risks, priority_apartments, queue_pos, start_year,
+    hhs, interventions, returnees, returnees_known, apartments_assigned, cohorts, cohorts_by_age, age_structure, hold_states
+):
+    n_scenarios, n_years = hhs.shape[0], hhs.shape[1]
+    n_types, n_risks = interventions.shape[2], interventions.shape[3]
+    cohort_length = cohorts.shape[1]
+    queue = np.empty(n_risks)
+    transferred = np.empty(n_risks)
+    returning = np.empty(n_risks)
+    ending = np.empty((n_types, n_risks))
+
+    for s in range(n_scenarios):
+        for yr in range(start_year, n_years):
+            # 1. Queue - returnees from ending cohorts, risk transfer and inflow (with `hold_states` statuses are kept until an intervention can end)
+            active = False
+            for t in range(n_types):
+                if yr - years_of_support[s, t] >= 0:
+                    active = True
+            if active:
+                _transfer(hhs[s, yr - 1, queue_pos], transitions[s], sources, targets, transferred)
+                for r in range(n_risks):
+                    queue[r] = transferred[r] + yearly_growth[s, r]
+
+                for t in range(n_types):
+                    start = yr - years_of_support[s, t]
+                    for r in range(n_risks):
+                        ending[t, r] = cohorts[s, start % cohort_length, t, r] if start >= 0 else 0.
+                        hhs[s, yr, t, r] = hhs[s, yr - 1, t, r] - ending[t, r]
+                        returnees[s, yr, t, r] = ending[t, r] * relapse[s, t, r]
+                        outside = queue_pos + 1 + t
+                        hhs[s, yr, outside, r] = hhs[s, yr - 1, outside, r] + (ending[t, r] - returnees[s, yr, t, r])
+
+                for r in range(n_risks):
+                    returning[r] = returnees[s, yr, sorted_types[0], r]
+                    for pos in range(1, len(sorted_types)):
+                        returning[r] += returnees[s, yr, sorted_types[pos], r]
+                _transfer(returning, transitions[s], sources, targets, transferred)
+                for r in range(n_risks):
+                    hhs[s, yr, queue_pos, r] = queue[r] + transferred[r]
+                returnees_known[s, yr] = True
+            elif hold_states and yr > 0:
+                hhs[s, yr] = hhs[s, yr - 1]
+
+            # 2. Soft interventions (all shares apply to the queue before any of them is removed)
+            for r in range(n_risks):
+                waiting = hhs[s, yr, queue_pos, r]
+                removed = 0.
+                for pos in range(len(soft_types)):
+                    t = soft_types[pos]
+                    intervened = waiting * shares[s, yr, t, r]
+                    interventions[s, yr, t, r] = intervened
+                    removed = intervened if pos == 0 else removed + intervened
+                    hhs[s, yr, t, r] += intervened
+                if len(soft_types) > 0:
+                    hhs[s, yr, queue_pos, r] -= removed
+
+            # 3. Apartments in the priority order - available apartments are read from the running ledger of assignments
+            if yr > 0:
+                apartments_assigned[s, yr] = apartments_assigned[s, yr - 1]
+            for pos in range(len(priority_types)):
+                t, r, a = priority_types[pos], priority_risks[pos], priority_apartments[pos]
+                assignment = min(apartments[s, yr, a] - apartments_assigned[s, yr, a], hhs[s, yr, queue_pos, r])
+                interventions[s, yr, t, r] = assignment
+                apartments_assigned[s, yr, a] += assignment
+                hhs[s, yr, queue_pos, r] -= assignment
+                hhs[s, yr, t, r] += assignment
+
+            # 4. New cohort replaces the cohort that ended this year, age structure of ongoing cohorts
+            cohorts[s, yr % cohort_length] = interventions[s, yr]
+            if not age_structure:
+                continue
+            for age in range(cohort_length):
+                for t in range(n_types):
+                    supported = age < years_of_support[s, t] and age <= yr
+                    for r in range(n_risks):
+                        cohorts_by_age[s, yr, age, t, r] = cohorts[s, (yr - age) % cohort_length, t, r] if supported else 0.
+
+
+def run_years(apartments, shares, soft_types, relapse, yearly_growth, years_of_support, transitions, dimensions, start_year,
+              hhs, interventions, returnees, returnees_known, apartments_assigned, cohorts, cohorts_by_age, hold_states=False):
+    '''
+    Simulates years from `start_year` on - parameters and preallocated results (filled in place) as in `engine.run_arrays`,
+    the ring buffer `cohorts` holds the cohorts of the years before `start_year`. With `cohorts_by_age` None the age structure is skipped.
+    '''
+    def values(array, dtype=float):
+        return np.ascontiguousarray(array, dtype=dtype)
+
+    priorities = np.array([
+        (dimensions.type_pos[apartment_type], dimensions.risk_pos[hh_risk], APARTMENT_TYPES.index(apartment_type))
+        for apartment_type, hh_risk in dimensions.apartment_priorities
+    ], dtype=int).reshape(-1, 3)
+    _run_years(
+        values(apartments), values(shares), values(soft_types, int), values(relapse), values(yearly_growth), values(years_of_support, int),
+        values(transitions), values(dimensions.sources, int), values(dimensions.targets, int), values(dimensions.sorted_types, int),
+        values(priorities[:, 0], int), values(priorities[:, 1], int), values(priorities[:, 2], int), dimensions.queue, start_year,
+        hhs, interventions, returnees, returnees_known, apartments_assigned, cohorts,
+        np.zeros((0,) * 5) if cohorts_by_age is None else cohorts_by_age, cohorts_by_age is not None, hold_states
+    )
+
+
+# Tables of the simulation of interventions compared by `check_parity`
+PARITY_TABLES = ['interventions', 'hhs', 'returnees', 'apartments_assigned', 'apartments_available', 'cohorts']
+
+
+def check_parity(parameters: list, jit: bool = True) -> list:
+    '''
+    Compares the kernel with the reference implementation - every dict of `simulate_social_housing` parameters in `parameters`
+    is simulated by the pandas model and by the kernel (compiled or interpreted), or with `jit=False` by the NumPy loop of `engine.run_arrays`.
+    Returns (title, table) of tables that are not bit-identical.
+    '''
+    from main import simulate_social_housing
+    from scenario import Scenario
+    from batch import stack_scenarios, run_stacked, label_results
+
+    differences = []
+    for p in parameters:
+        reference = simulate_social_housing(**p, engine='pandas')
+        scenario = Scenario.from_dict(p)
+        outputs = label_results(
+            run_stacked(*stack_scenarios([scenario]), jit=jit),
+            ids=None, years=scenario.years, base_year=scenario.base_year, titles=[scenario.title], dimensions=scenario.dimensions
+        )
+        for table in PARITY_TABLES:
+            expected = reference[table].reindex(index=outputs[table].index, columns=outputs[table].columns)
+            if not np.array_equal(expected.to_numpy(dtype=float), outputs[table].to_numpy(dtype=float), equal_nan=True):
+                differences.append((p.get('title'), table))
+    return differences
+
+
+if __name__ == '__main__':
+    from benchmark import make_variants
+
+    print(f'Numba {"available - compiled" if AVAILABLE else "not installed - interpreted"} kernel')
+    differences = check_parity(make_variants(years=15, variants=2, risks=2) + make_variants(years=30, variants=1, risks=4))
+    for title, table in differences:
+        print(f'{title}: `{table}` differs from the reference')
+    print('Kernel matches the reference...' if not differences else f'{len(differences)} tables differ...')
+    sys.exit(1 if differences else 0)
@@ -4,27 +4,28 @@ idx = pd.IndexSlice
 
 from supply import simulate_apartment_stock
 idx = pd.IndexSlice
-import pdb
 
-HH_RISKS = ['low','high']
-INTERVENTION_TYPES = ['guaranteed','municipal','mop_payment','self_help','consulting']
-HH_STATUSES = INTERVENTION_TYPES + ['queue'] + [f'outside_{it}' for it in INTERVENTION_TYPES]
+from dimensions import DEFAULT, Dimensions, transition_shares
+import engine
+from scenario import Scenario
+from substeps import simulate_substeps, steps_per_year
+from profiling import DISABLED, to_profiler
 
 
-def fill_apartment_interventions(yr: int, interventions: pd.Series, apartments: pd.DataFrame, hhs:pd.DataFrame, apartment_type: str, hh_risk: str) -> pd.Series:
+def fill_apartment_interventions(yr: int, interventions: pd.Series, apartments: pd.DataFrame, apartments_assigned: pd.DataFrame, hhs:pd.DataFrame, apartment_type: str, hh_risk: str) -> pd.Series:
     '''
     Assign `hh_risk` households into `apartment_type` apartments for year `yr`. 
 
     All households that can be assigned to available apartments are assigned
     
-    Records an intervention into `hhs` and `interventions` dataframes.
+    Records an intervention into `hhs` and `interventions` dataframes and the assigned apartments into `apartments_assigned` ledger.
     '''
 
     # Number of households that are currently waiting for an intervention
     hhs_in_need = hhs.loc[yr, ('queue', hh_risk)]
 
-    # Number of apartments that were assigned up to this moment (note that no apartment can be used twice)
-    apartments_assigned_until_now = interventions.loc[:yr,idx[apartment_type,:]].sum().sum()
+    # Number of apartments that were assigned up to this moment (note that no apartment can be used twice) - running ledger of all assignments
+    apartments_assigned_until_now = apartments_assigned.loc[yr, apartment_type]
     
     # Derive number of available apartments
 
@@ -34,6 +35,7 @@ def fill_apartment_interventions(yr: int, interventions: pd.Series, apartments:
     assignment = min(available_apartments, hhs_in_need)
 
     interventions.loc[yr,(apartment_type, hh_risk)] = assignment
+    apartments_assigned.loc[yr, apartment_type] += assignment
         
     # Remove from queue
     hhs.loc[yr, ('queue', hh_risk)] -= assignment
@@ -41,7 +43,7 @@ def fill_apartment_interventions(yr: int, interventions: pd.Series, apartments:
     #last_year = hhs.loc[yr-1, (apartment_type, hh_risk)] if yr > 0 else 0
     hhs.loc[yr, (apartment_type, hh_risk)] += assignment 
     
-    return interventions, hhs
+    return interventions, hhs, apartments_assigned
 
 def fill_share_interventions(yr: int, interventions: pd.Series, hhs: pd.DataFrame, intervention_shares: pd.DataFrame, hh_risks, intervention_types, startup_coefficients: pd.Series,hhs_inflow: pd.DataFrame, ) -> pd.Series:
     '''
@@ -49,9 +51,6 @@ def fill_share_interventions(yr: int, interventions: pd.Series, hhs: pd.DataFram
     
     Records an intervention into `hhs` and `interventions` dataframes.
     '''
-    if (intervention_shares.sum(axis=1) > 1).any():
-        raise Exception('Intervention shares cannot sum above 100% in one hh group...')
-    
     # Number of households that are currently waiting for an intervention
     #if yr == 0:
     eligible_hhs = hhs.loc[yr, 'queue']
@@ -69,14 +68,48 @@ def fill_share_interventions(yr: int, interventions: pd.Series, hhs: pd.DataFram
     interventions.loc[yr, intervened.index] = intervened
     
     # Remove from queue
-    hhs.loc[yr, [('queue',hh_risk) for hh_risk in HH_RISKS]] -= intervened.unstack(1).sum().loc[HH_RISKS].to_list()
+    hhs.loc[yr, [('queue',hh_risk) for hh_risk in hh_risks]] -= intervened.unstack(1).sum().loc[hh_risks].to_list()
     
     # Record hhs interventions
     hhs.loc[yr, intervened.index] += intervened 
     
     return hhs, interventions
 
-def determine_hhs_queue(yr, hhs, returnees, interventions, relapse_rates, years_of_support, hhs_inflow, low_to_high_risk_share):
+def ending_cohorts(yr: int, cohorts: pd.DataFrame, years_of_support: pd.Series) -> pd.Series:
+    '''
+    Reads interventions that end in year `yr` (i.e. started `years_of_support` years ago) from the `cohorts` ring buffer.
+    
+    `cohorts` holds interventions started in year `start` in row `start % len(cohorts)`; the buffer is as long as the longest support.
+    Intervention types that cannot end yet (started before the first simulated year) end with 0 households.
+    '''
+    start_years = yr - years_of_support.loc[cohorts.columns.get_level_values('intervention_type')].to_numpy()
+    ending = cohorts.to_numpy()[start_years % len(cohorts), np.arange(len(cohorts.columns))]
+    return pd.Series(np.where(start_years >= 0, ending, 0.), index=cohorts.columns)
+
+def cohort_ages(yr: int, cohorts: pd.DataFrame, years_of_support: pd.Series) -> pd.DataFrame:
+    '''
+    Age structure of ongoing interventions at the end of year `yr` - number of households by the number of years (`cohort_age`) since the intervention started.
+    '''
+    ages = np.arange(len(cohorts))
+    support = years_of_support.loc[cohorts.columns.get_level_values('intervention_type')].to_numpy()
+    ongoing = ((ages[:, np.newaxis] < support) & (ages[:, np.newaxis] <= yr))
+    values = cohorts.to_numpy()[(yr - ages) % len(cohorts)]
+    return pd.DataFrame(np.where(ongoing, values, 0.), index=pd.Index(ages, name='cohort_age'), columns=cohorts.columns)
+
+def transfer_risks(queue: pd.Series, risk_transitions: pd.Series) -> pd.Series:
+    '''
+    Moves shares `risk_transitions` (from, to) of households in `queue` (by hh_risk) between risk groups - all shares apply to the queue before the transfer,
+    households leaving the groups are removed first and then added to their new groups (in order of the transitions, as in `engine.transfer_risks`).
+    '''
+    new_queue = queue.copy()
+    transfers = [(source, target, queue.loc[source] * share) for (source, target), share in risk_transitions.items()]
+    for source, _, transfer in transfers:
+        new_queue.loc[source] -= transfer
+    for _, target, transfer in transfers:
+        new_queue.loc[target] += transfer
+    return new_queue
+
+def determine_hhs_queue(yr, hhs, returnees, cohorts, relapse_rates, years_of_support, hhs_inflow, risk_transitions, dimensions=DEFAULT):
     '''
     To find how many hhs in queue is going to be on the beginning of year `yr` it is necessary:
     
@@ -84,30 +117,21 @@ def determine_hhs_queue(yr, hhs, returnees, interventions, relapse_rates, years_
         2. To account for an inflow of new hhs
         
     Also number of ongoing interventions is stated on the beginning of each year - that is in later steps adjusted.   
+    
+    Ending interventions are read from `cohorts` ring buffer (see `ending_cohorts`).
     '''
-    # startyears of interventions that end this year (np.nan if none)
-    years_of_interest = (yr - years_of_support).apply(lambda x: x if x >= 0 else np.nan).dropna()
-
-    if not years_of_interest.empty:
-        # Some low risks in queue are now high-risks
+    hh_risks = dimensions.hh_risks
+    if (yr - years_of_support >= 0).any():
+        # Some households in queue move to other risk groups (e.g. low risks are now high-risks)
         #pdb.set_trace()
         old_queue = hhs.loc[yr-1].loc['queue'] 
-        new_queue = old_queue.copy()
-        
-        old_queue_risk_transfer = old_queue.loc['low'] * low_to_high_risk_share
-        
-
-        new_queue.loc['low'] -= old_queue_risk_transfer
-        new_queue.loc['high'] += old_queue_risk_transfer
-        
+        new_queue = transfer_risks(old_queue, risk_transitions)
             
         # New inflow to queue # TODO check functionality of transfer from if statement below
-        hhs.loc[yr, [('queue',h) for h in HH_RISKS]] = (new_queue.loc[HH_RISKS] + hhs_inflow.loc[HH_RISKS,'yearly_growth']).loc[HH_RISKS].to_list()
+        hhs.loc[yr, [('queue',h) for h in hh_risks]] = (new_queue.loc[hh_risks] + hhs_inflow.loc[hh_risks,'yearly_growth']).loc[hh_risks].to_list()
 
-        # Find ending interventions - accounting for years of interest nans!       
-        ending_interventions = pd.Series(0,index=pd.MultiIndex.from_product([INTERVENTION_TYPES, HH_RISKS], names=('intervention_type', 'hh_risk')))
-        ending = interventions[years_of_interest.index].apply(lambda col: col.loc[years_of_interest.loc[col.name[0]]])
-        ending_interventions.loc[ending.index] = ending
+        # Find ending interventions
+        ending_interventions = ending_cohorts(yr, cohorts, years_of_support)
         
         # How many interventions are currently in place?
         ongoing_interventions = hhs.loc[yr - 1, ending_interventions.index] - ending_interventions
@@ -119,16 +143,12 @@ def determine_hhs_queue(yr, hhs, returnees, interventions, relapse_rates, years_
         returnees.loc[yr] = number_of_returnees
         #hhs.loc[yr, ('queue','high')] = hhs.loc[yr, ('queue','high')] + number_of_returnees.sum() 
         
-        returnees_to_queue = number_of_returnees.unstack('hh_risk').sum()
-        returnees_risk_transfer = returnees_to_queue.loc['low'] * low_to_high_risk_share
-        
-        returnees_to_queue.loc['low'] -= returnees_risk_transfer
-        returnees_to_queue.loc['high'] += returnees_risk_transfer
+        returnees_to_queue = transfer_risks(number_of_returnees.unstack('hh_risk').sum(), risk_transitions)
         
-        hhs.loc[yr, [('queue',h) for h in HH_RISKS]] += returnees_to_queue        
+        hhs.loc[yr, [('queue',h) for h in hh_risks]] += returnees_to_queue        
         
         # and put the rest outside
-        outside_cols = {it: f'outside_{it}' for it in INTERVENTION_TYPES}
+        outside_cols = {it: f'outside_{it}' for it in dimensions.intervention_types}
         new_outside = (ending_interventions - number_of_returnees).rename(outside_cols)
         new_outside.index = new_outside.index.rename(level='intervention_type',names='hh_status')
         hhs.loc[yr, outside_cols.values()] = (hhs.loc[yr-1,outside_cols.values()] + new_outside).fillna(0)
@@ -141,9 +161,11 @@ def generate_interventions(
     intervention_shares: pd.DataFrame,
     hhs_inflow: pd.DataFrame,
     years_of_support: pd.Series,
-    low_to_high_risk_share: float,
+    risk_transitions: pd.Series,
     startup_coefficients: pd.DataFrame,
-    years: np.ndarray
+    years: np.ndarray,
+    dimensions=DEFAULT,
+    profiler=DISABLED
 ) -> pd.DataFrame:
     '''
     Generates interventions within the social housing system. 
@@ -158,6 +180,9 @@ def generate_interventions(
     Interventions are done on two groups of households
         - `low_risk`
         - `high_risk`
+
+    Other risk groups and soft intervention types can be added by `dimensions` (see `dimensions.Dimensions`).
+    Households in queue move between risk groups by shares `risk_transitions` (from, to), see `dimensions.transition_shares`.
         
     The interventions are computed sequentially, taking into account all of the previous interventions. 
     
@@ -166,55 +191,83 @@ def generate_interventions(
         3. Self-helps (separately for high risk and low risks)
         4. Consultings
         5. MOPs
-        5. Low risk households to guaranteed apartments
-        6. High risk households to municipal apartments
-        7. High risk households to guaranteed apartments
-        8. Low risk households to municipal apartments
+        6. Apartments in the priority order of `dimensions.apartment_priorities`, by default:
+            - Low risk households to guaranteed apartments
+            - High risk households to municipal apartments
+            - High risk households to guaranteed apartments
+            - Low risk households to municipal apartments
+
+    `profiler` (see `profiling.Profiler`) measures the steps of every year.
     '''    
+    if (intervention_shares.sum(axis=1) > 1).any():
+        raise Exception('Intervention shares cannot sum above 100% in one hh group...')
+    
+    hh_risks, intervention_types = dimensions.hh_risks, dimensions.intervention_types
+
     # Pregenerate table for households
-    hhs = pd.DataFrame(0,index=years, columns=pd.MultiIndex.from_product([HH_STATUSES, HH_RISKS], names=('hh_status', 'hh_risk')),dtype=float)
+    hhs = pd.DataFrame(0,index=years, columns=pd.MultiIndex.from_product([dimensions.hh_statuses, hh_risks], names=('hh_status', 'hh_risk')),dtype=float)
 
     # Pregenerate Interventions and Returnees (Returnees only for tracking purpose)
-    interventions = pd.DataFrame(index=years,columns=pd.MultiIndex.from_product([INTERVENTION_TYPES, HH_RISKS], names=('intervention_type', 'hh_risk')),dtype=float)
-    returnees = pd.DataFrame(index=years, columns=pd.MultiIndex.from_product([INTERVENTION_TYPES,HH_RISKS], names=('intervention_type', 'hh_risk')),dtype=float)
+    interventions = pd.DataFrame(index=years,columns=pd.MultiIndex.from_product([intervention_types, hh_risks], names=('intervention_type', 'hh_risk')),dtype=float)
+    returnees = pd.DataFrame(index=years, columns=pd.MultiIndex.from_product([intervention_types,hh_risks], names=('intervention_type', 'hh_risk')),dtype=float)
+
+    # Risk groups without an apartment priority get no apartments
+    unassigned = [(apartment_type, hh_risk) for apartment_type in engine.APARTMENT_TYPES for hh_risk in hh_risks if (apartment_type, hh_risk) not in dimensions.apartment_priorities]
+    interventions.loc[:, unassigned] = 0.
+    
+    # Ledger of apartments assigned up to the given year (cumulative)
+    apartments_assigned = pd.DataFrame(0, index=years, columns=apartments.columns, dtype=float)
+    
+    # Ring buffer of ongoing interventions by their start year (interventions started in `yr` are stored in row `yr % len(cohorts)`)
+    cohorts = pd.DataFrame(0, index=range(years_of_support.max()), columns=interventions.columns, dtype=float)
+    cohorts_by_age = {}
      
     # Assign hhs currently in queue (current level)
-    hhs.loc[0, [('queue',h) for h in HH_RISKS]] = hhs_inflow.loc[HH_RISKS,'current_level'].to_list() #hhs.loc[0, [('total',h) for h in HH_RISKS]]
+    hhs.loc[0, [('queue',h) for h in hh_risks]] = hhs_inflow.loc[hh_risks,'current_level'].to_list() #hhs.loc[0, [('total',h) for h in HH_RISKS]]
     
     for yr in years:
         # Determine number of households in the queue
-        hhs, returnees = determine_hhs_queue(
-                yr = yr,
+        with profiler.stage('determine_hhs_queue', yr):
+            hhs, returnees = determine_hhs_queue(
+                    yr = yr,
+                    hhs = hhs,
+                    returnees = returnees,
+                    cohorts = cohorts, 
+                    relapse_rates = relapse_rates, 
+                    years_of_support = years_of_support,
+                    hhs_inflow = hhs_inflow,
+                    risk_transitions = risk_transitions,
+                    dimensions = dimensions
+                )
+        
+        # Assign soft interventions for both low risks and high risks
+        with profiler.stage('fill_share_interventions', yr):
+            hhs, interventions = fill_share_interventions(
+                yr = yr, 
+                interventions = interventions,
                 hhs = hhs,
-                returnees = returnees,
-                interventions = interventions, 
-                relapse_rates = relapse_rates, 
-                years_of_support = years_of_support,
+                intervention_shares = intervention_shares,
+                hh_risks = hh_risks, 
+                intervention_types = dimensions.soft_types,
+                startup_coefficients = startup_coefficients[['consulting','mop_payment']],
                 hhs_inflow = hhs_inflow,
-                low_to_high_risk_share = low_to_high_risk_share
             )
-        
-        # Assign soft interventions for both low risks and high risks
-        hhs, interventions = fill_share_interventions(
-            yr = yr, 
-            interventions = interventions,
-            hhs = hhs,
-            intervention_shares = intervention_shares,
-            hh_risks = HH_RISKS, 
-            intervention_types = ['self_help','consulting','mop_payment'],
-            startup_coefficients = startup_coefficients[['consulting','mop_payment']],
-            hhs_inflow = hhs_inflow,
-        )
                 
-        # Priority assignments of apartments
-        interventions, hhs = fill_apartment_interventions(yr, interventions, apartments, hhs, 'guaranteed', 'low')
-        interventions, hhs = fill_apartment_interventions(yr, interventions, apartments, hhs, 'municipal', 'high')
+        with profiler.stage('fill_apartment_interventions', yr):
+            # Apartments assigned in previous years
+            if yr > 0:
+                apartments_assigned.loc[yr] = apartments_assigned.loc[yr-1]
+                    
+            # Priority and secondary assignments of apartments
+            for apartment_type, hh_risk in dimensions.apartment_priorities:
+                interventions, hhs, apartments_assigned = fill_apartment_interventions(yr, interventions, apartments, apartments_assigned, hhs, apartment_type, hh_risk)
         
-        # Secondary assignments of apartments
-        interventions, hhs = fill_apartment_interventions(yr, interventions, apartments, hhs, 'guaranteed', 'high')
-        interventions, hhs = fill_apartment_interventions(yr, interventions, apartments, hhs, 'municipal', 'low')
+        # Record new cohort of interventions (replaces the cohort that ended this year)
+        with profiler.stage('cohorts', yr):
+            cohorts.loc[yr % len(cohorts)] = interventions.loc[yr]
+            cohorts_by_age[yr] = cohort_ages(yr, cohorts, years_of_support)
         #pdb.set_trace()
-    return interventions, hhs, returnees
+    return interventions, hhs, returnees, apartments_assigned, pd.concat(cohorts_by_age, names=[None, 'cohort_age'])
 
 
 def calculate_costs(interventions, hhs, years_of_support, social_assistences, intervention_costs, discount_rate, mop_housing_share):
@@ -226,7 +279,7 @@ def calculate_costs(interventions, hhs, years_of_support, social_assistences, in
     
     # Number of apartment interventions in given year
     
-    entry_apartments = interventions.loc[:,idx[['guaranteed', 'municipal'],:]].groupby('intervention_type',axis=1).sum()
+    entry_apartments = interventions.loc[:,idx[['guaranteed', 'municipal'],:]].T.groupby(level='intervention_type').sum().T
 
     # Number of apartments assigned in the given year (years_of_support included)
     yearly_apartments = pd.DataFrame({
@@ -297,6 +350,11 @@ def calculate_costs(interventions, hhs, years_of_support, social_assistences, in
 
     return costs, costs_units, costs_discounted, social_assistence_breakdown
 
+GENERATORS = {
+    'pandas': generate_interventions,
+    'numpy': engine.generate_interventions,
+}
+
 def simulate_social_housing(
     guaranteed_yearly_apartments,
     municipal_apartments_today ,
@@ -315,7 +373,12 @@ def simulate_social_housing(
     mop_housing_share,
     years,
     base_year=2025,
-    title=None
+    title=None,
+    risk_transitions=None,
+    apartment_priorities=None,
+    engine='pandas',
+    profile=False,
+    steps='year'
 ):
     '''
     An entering function into model. If not interested in breaking the model to pieces, you most likely want to use this function.
@@ -330,56 +393,131 @@ def simulate_social_housing(
     Returns dataframes with relevant outputs:
         * `interventions` contain assigned interventions in each year
         * `hhs` contains status of hhs in given year
+        * `apartments_assigned` contains number of apartments assigned up to given year (cumulative)
+        * `apartments_available` contains number of apartments that entered the system and are still not assigned
+        * `cohorts` contains age structure of ongoing interventions (by years since the intervention started) at the end of given year
         * `
+        
+    Categories are given by the input tables - risk groups by rows of `hhs_inflow`, intervention types by `years_of_support`
+    (other types than the built-in ones are soft interventions given by `intervention_shares`, without cost lines):
+        * `risk_transitions`: yearly shares of households in queue moving between risk groups, {(from, to): share} or a matrix (from x to),
+          in addition to `low_to_high_risk_share` (None if there is no such transition), see `dimensions.transition_shares`
+        * `apartment_priorities`: (apartment_type, hh_risk) pairs or a table with these columns in the order of assignment of apartments
+          (`constants.APARTMENT_PRIORITIES` by default)
+
+    `engine` selects implementation of the simulation of interventions:
+        * `pandas`: reference implementation (`generate_interventions`)
+        * `numpy`: array implementation (`engine.generate_interventions`), bit-identical and much faster
+
+    `profile` adds a `profile` table with wall time, calls and allocation peaks of the stages (see `profiling.Profiler`) -
+    True (time and calls), 'memory' (also allocation peaks, slower) or a `Profiler` (e.g. with hooks forwarding the metrics).
+    Disabled profiling costs practically nothing.
+
+    `steps` sets the time step - 'year', 'quarter', 'month' or a number of steps per year (see `substeps.simulate_substeps`).
+    Sub-annual steps run on the array engine (`engine` is ignored) and are aggregated back into years, `startup_coefficients`
+    can then also be given at times within years (e.g. 0.5 for the middle of the first year).
     
     '''
-    apartments = simulate_apartment_stock(
-        guaranteed_yearly_apartments=guaranteed_yearly_apartments,
-        municipal_apartments_today = municipal_apartments_today,
-        municipal_yearly_new_apartments = municipal_yearly_new_apartments,
-        municipal_existing_availability_rate = municipal_existing_availability_rate,
-        municipal_new_availability_rate = municipal_new_availability_rate,
-        startup_coefficients = startup_coefficients[['guaranteed','municipal']],
-        years=years,
-    )
-    
-    interventions, hhs, returnees = generate_interventions(
-        apartments = apartments,
-        relapse_rates = relapse_rates,
-        intervention_shares = intervention_shares,
-        hhs_inflow =hhs_inflow,
-        years_of_support = years_of_support,
-        low_to_high_risk_share = low_to_high_risk_share,
-        startup_coefficients = startup_coefficients,
-        years = years
-    )
-    
-    
-    costs, costs_units, costs_discounted, social_assistence_breakdown = calculate_costs(
-        interventions=interventions,
-        hhs = hhs,
-        years_of_support=years_of_support,
-        social_assistences=social_assistences,
-        intervention_costs=intervention_costs,
-        discount_rate=discount_rate,
-        mop_housing_share=mop_housing_share
-    )
+    profiler, profiled = to_profiler(profile)
+    if steps_per_year(steps) > 1:
+        scenario = Scenario(
+            guaranteed_yearly_apartments=guaranteed_yearly_apartments,
+            municipal_apartments_today=municipal_apartments_today,
+            municipal_yearly_new_apartments=municipal_yearly_new_apartments,
+            municipal_existing_availability_rate=municipal_existing_availability_rate,
+            municipal_new_availability_rate=municipal_new_availability_rate,
+            relapse_rates=relapse_rates,
+            intervention_shares=intervention_shares,
+            hhs_inflow=hhs_inflow,
+            years_of_support=years_of_support,
+            social_assistences=social_assistences,
+            intervention_costs=intervention_costs,
+            discount_rate=discount_rate,
+            low_to_high_risk_share=low_to_high_risk_share,
+            startup_coefficients=startup_coefficients[startup_coefficients.index % 1 == 0],
+            mop_housing_share=mop_housing_share,
+            years=years,
+            base_year=base_year,
+            title=title,
+            risk_transitions=risk_transitions,
+            apartment_priorities=apartment_priorities,
+        )
+        with profiler.stage('simulate_substeps'):
+            outputs = simulate_substeps(scenario, steps, startup_coefficients)
+        outputs.pop('npv')
+        if profiled:
+            outputs['profile'] = profiler.table(base_year)
+        return outputs
+
+    risk_transitions = transition_shares(low_to_high_risk_share, risk_transitions)
+    dimensions = Dimensions.from_inputs(hhs_inflow, years_of_support, risk_transitions, apartment_priorities)
+    with profiler.stage('simulate_apartment_stock'):
+        apartments = simulate_apartment_stock(
+            guaranteed_yearly_apartments=guaranteed_yearly_apartments,
+            municipal_apartments_today = municipal_apartments_today,
+            municipal_yearly_new_apartments = municipal_yearly_new_apartments,
+            municipal_existing_availability_rate = municipal_existing_availability_rate,
+            municipal_new_availability_rate = municipal_new_availability_rate,
+            startup_coefficients = startup_coefficients[['guaranteed','municipal']],
+            years=years,
+        )
+    
+    if engine not in GENERATORS:
+        raise Exception(f'Unknown engine `{engine}`, use one of {list(GENERATORS)}')
+    
+    with profiler.stage('generate_interventions'):
+        interventions, hhs, returnees, apartments_assigned, cohorts = GENERATORS[engine](
+            apartments = apartments,
+            relapse_rates = relapse_rates,
+            intervention_shares = intervention_shares,
+            hhs_inflow =hhs_inflow,
+            years_of_support = years_of_support,
+            risk_transitions = risk_transitions,
+            startup_coefficients = startup_coefficients,
+            years = years,
+            dimensions = dimensions,
+            profiler = profiler
+        )
+    
+    
+    with profiler.stage('calculate_costs'):
+        costs, costs_units, costs_discounted, social_assistence_breakdown = calculate_costs(
+            interventions=interventions,
+            hhs = hhs,
+            years_of_support=years_of_support,
+            social_assistences=social_assistences,
+            intervention_costs=intervention_costs,
+            discount_rate=discount_rate,
+            mop_housing_share=mop_housing_share
+        )
     
     interventions.index = (interventions.index + base_year).rename('rok')
     hhs.index = (hhs.index + base_year).rename('rok')
     returnees.index = (returnees.index + base_year).rename('rok')
     
+    # Vacancies - apartments that entered the system and were not assigned yet
+    apartments_available = apartments - apartments_assigned
+    apartments_assigned.index = (apartments_assigned.index + base_year).rename('rok')
+    apartments_available.index = (apartments_available.index + base_year).rename('rok')
+    cohorts.index = cohorts.index.set_levels(cohorts.index.levels[0] + base_year, level=0).rename('rok', level=0)
+    
     costs.index = (costs.index + base_year).rename('rok')
     costs_units.index = (costs_units.index + base_year).rename('rok')
     costs_discounted.index = (costs_discounted.index + base_year).rename('rok')
     social_assistence_breakdown.index = (social_assistence_breakdown.index + base_year).rename('rok')
-    return {
+    outputs = {
         'interventions':interventions,
         'hhs':hhs.sort_index(),
         'returnees':returnees,
+        'apartments_assigned':apartments_assigned,
+        'apartments_available':apartments_available,
+        'cohorts':cohorts,
         'costs':costs,
         'costs_units':costs_units, 
         'costs_discounted':costs_discounted,
         'social_assistence_breakdown':social_assistence_breakdown,
         'title':title
     }
+    if profiled:
+        outputs['profile'] = profiler.table(base_year)
+    return outputs
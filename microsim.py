@@ -0,0 +1,195 @@
+'''
+Household-level microsimulation - the rules of `main.generate_interventions` (queue, soft interventions, apartment assignment,
+`years_of_support`, `relapse_rates`, risk transitions) applied to individual households with random draws instead of expected counts.
+
+Households are rows of one structured NumPy array (`HOUSEHOLD`) updated by vectorized draws every year, so a population of
+a few hundred thousand households is simulated over the whole horizon in seconds. Besides the usual aggregate tables
+the microsimulation answers distributional questions - how long households wait and how many times they relapse.
+'''
+import numpy as np
+import pandas as pd
+
+from constants import APARTMENT_TYPES
+from scenario import Scenario
+from batch import label_results
+import costing
+
+# One household - statuses and risk groups are positions in `Dimensions.hh_statuses` and `Dimensions.hh_risks` of the scenario
+HOUSEHOLD = np.dtype([
+    ('status', np.int16),
+    ('risk', np.int16),
+    ('entry', np.int16),      # year (position) the household entered the system
+    ('since', np.int16),      # year its current status started
+    ('relapses', np.int16),   # returns to queue after an ended intervention
+    ('waited', np.int16),     # years spent waiting in queue
+])
+
+# Which households waiting in queue get the apartments available in a year
+APARTMENT_ORDERS = ['random', 'fifo']
+
+
+def _cohorts(interventions: np.ndarray, years_of_support: np.ndarray) -> np.ndarray:
+    '''
+    Age structure (year, cohort_age, intervention_type, risk) of interventions (year, intervention_type, risk) ongoing at the end of every year.
+    '''
+    n_years = len(interventions)
+    ages = np.arange(years_of_support.max())
+    start = np.arange(n_years)[:, np.newaxis] - ages[np.newaxis, :]
+    ongoing = (start >= 0)[..., np.newaxis] & (ages[:, np.newaxis] < years_of_support)[np.newaxis]
+    return np.where(ongoing[..., np.newaxis], interventions[np.maximum(start, 0)], 0.)
+
+
+def simulate_households(scenario, seed=None, apartment_order: str = 'random') -> dict:
+    '''
+    Microsimulation of `scenario` (`Scenario` or dict of `simulate_social_housing` parameters) - every household is followed over the horizon:
+        * the queue starts with `current_level` households, `yearly_growth` is the mean of the (Poisson) yearly inflow of every risk group
+        * households in queue (and returnees) change risk group by the shares of risk transitions
+        * an ended intervention (after `years_of_support`) returns the household to queue with probability `relapse_rates`, otherwise it leaves the system
+        * every household in queue gets a soft intervention with probability given by its share
+        * available apartments go to households in queue in the priority order of the scenario - to randomly chosen households
+          or (`apartment_order='fifo'`) to the longest waiting ones
+
+    Returns the tables of `simulate_social_housing` (counts of households, costs of them), `npv` and:
+        * `households` - the final state of every household (see `HOUSEHOLD`, `waited` includes the wait ongoing at the end of the horizon)
+        * `waiting_times` - waits in queue by their length in years (from entering the queue to an intervention, 0 = within the same year),
+          `completed` and `ongoing` at the end of the horizon (their length so far)
+        * `relapses` - households by the number of relapses
+
+    Results depend on `seed` - simulate more seeds to see the variability of a population of the given size.
+    '''
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    if apartment_order not in APARTMENT_ORDERS:
+        raise Exception(f'Unknown apartment order `{apartment_order}`, use one of {APARTMENT_ORDERS}...')
+
+    dimensions, arrays = scenario.dimensions, scenario.arrays
+    rng = np.random.default_rng(seed)
+    n_years = len(scenario.years)
+    n_types, n_risks, n_statuses = len(dimensions.intervention_types), len(dimensions.hh_risks), len(dimensions.hh_statuses)
+    QUEUE = dimensions.queue
+    years_of_support = arrays['years_of_support']
+    soft_types = arrays['soft_types']
+
+    # Years in which interventions can end - only then households flow in and change risk groups (as in `main.determine_hhs_queue`)
+    active = (np.arange(n_years)[:, np.newaxis] >= years_of_support).any(axis=1)
+
+    # Support of statuses - only interventions end
+    support = np.full(n_statuses, np.iinfo(np.int16).max, dtype=np.int64)
+    support[:n_types] = years_of_support
+
+    # Cumulative probabilities of the new risk group of households in risk groups with outgoing transitions
+    transitions = np.zeros((n_risks, n_risks))
+    np.add.at(transitions, (dimensions.sources, dimensions.targets), arrays['transitions'])
+    transitions[np.diag_indices(n_risks)] = 1 - transitions.sum(axis=1)
+    cumulative_transitions = transitions.cumsum(axis=1)
+    cumulative_transitions[:, -1] = np.inf
+    moving_risks = np.isin(np.arange(n_risks), dimensions.sources)
+
+    # The whole population is drawn up front, so that the array of households is allocated once
+    initial = np.rint(arrays['current_level']).astype(np.int64)
+    inflow = np.where(active[:, np.newaxis], rng.poisson(arrays['yearly_growth'], size=(n_years, n_risks)), 0)
+    households = np.zeros(initial.sum() + inflow.sum(), dtype=HOUSEHOLD)
+    n = initial.sum()
+    households['status'][:n] = QUEUE
+    households['risk'][:n] = np.repeat(np.arange(n_risks), initial)
+
+    priorities = [(dimensions.type_pos[at], dimensions.risk_pos[hh_risk], APARTMENT_TYPES.index(at)) for at, hh_risk in dimensions.apartment_priorities]
+
+    hhs = np.zeros((n_years, n_statuses, n_risks))
+    interventions = np.zeros((n_years, n_types, n_risks))
+    returnees = np.full((n_years, n_types, n_risks), np.nan)
+    apartments_assigned = np.zeros((n_years, len(APARTMENT_TYPES)))
+    assigned = np.zeros(len(APARTMENT_TYPES))
+    completed_waits = np.zeros(n_years + 1, dtype=np.int64)
+
+    def start_interventions(chosen, types, yr):
+        # Households leave the queue - their waits end
+        waits = yr - households['since'][chosen]
+        completed_waits[:] += np.bincount(waits, minlength=len(completed_waits))
+        households['waited'][chosen] += waits
+        households['status'][chosen] = types
+        households['since'][chosen] = yr
+        interventions[yr] += np.bincount(types * n_risks + households['risk'][chosen], minlength=n_types * n_risks).reshape(n_types, n_risks)
+
+    for yr in range(n_years):
+        if active[yr]:
+            # 1. Ending interventions - relapsing households return to queue, the others are outside
+            status, risk = households['status'][:n], households['risk'][:n]
+            ending = np.flatnonzero(yr - households['since'][:n] >= support[status])
+            ending_types, ending_risks = status[ending], risk[ending]
+            relapsing = rng.random(len(ending)) < arrays['relapse'][ending_types, ending_risks]
+            returnees[yr] = np.bincount(ending_types[relapsing] * n_risks + ending_risks[relapsing], minlength=n_types * n_risks).reshape(n_types, n_risks)
+            back, out = ending[relapsing], ending[~relapsing]
+            households['status'][out] += QUEUE + 1
+            households['status'][back] = QUEUE
+            households['since'][back] = yr
+            households['relapses'][back] += 1
+
+            # Households in queue (including returnees) change risk groups
+            movers = np.flatnonzero((status == QUEUE) & moving_risks[risk])
+            draws = rng.random(len(movers))
+            households['risk'][movers] = (draws[:, np.newaxis] >= cumulative_transitions[risk[movers]]).sum(axis=1)
+
+            # New households enter the queue
+            entering = inflow[yr].sum()
+            new = households[n:n + entering]
+            new['status'] = QUEUE
+            new['risk'] = np.repeat(np.arange(n_risks), inflow[yr])
+            new['entry'] = yr
+            new['since'] = yr
+            n += entering
+
+        # 2. Soft interventions - each household in queue draws one of the soft types (or none) by the shares of its risk group
+        queued = np.flatnonzero(households['status'][:n] == QUEUE)
+        cumulative_shares = arrays['shares'][yr, soft_types].T.cumsum(axis=1)
+        choice = (rng.random(len(queued))[:, np.newaxis] >= cumulative_shares[households['risk'][queued]]).sum(axis=1)
+        treated = choice < len(soft_types)
+        start_interventions(queued[treated], soft_types[choice[treated]], yr)
+
+        # 3. Apartments in the priority order - households of every risk group are taken in the order of the draw (or of waiting)
+        queued = np.flatnonzero(households['status'][:n] == QUEUE)
+        risks = households['risk'][queued]
+        keys = rng.random(len(queued)) if apartment_order == 'random' else households['since'][queued] + rng.random(len(queued))
+        order = queued[np.lexsort((keys, risks))]
+        starts = np.searchsorted(np.sort(risks), np.arange(n_risks + 1))
+        taken = np.zeros(n_risks, dtype=np.int64)
+        for t, r, a in priorities:
+            available = int(np.floor(arrays['apartments'][yr, a] - assigned[a]))
+            count = max(min(available, starts[r + 1] - starts[r] - taken[r]), 0)
+            chosen = order[starts[r] + taken[r]:starts[r] + taken[r] + count]
+            taken[r] += count
+            assigned[a] += count
+            start_interventions(chosen, np.full(count, t, dtype=np.int16), yr)
+        apartments_assigned[yr] = assigned
+
+        # 4. State at the end of the year
+        hhs[yr] = np.bincount(households['status'][:n] * n_risks + households['risk'][:n], minlength=n_statuses * n_risks).reshape(n_statuses, n_risks)
+
+    # Waits ongoing at the end of the horizon
+    queued = households['status'] == QUEUE
+    ongoing = n_years - households['since'][queued]
+    households['waited'][queued] += ongoing
+    ongoing_waits = np.bincount(ongoing, minlength=n_years + 1)
+
+    results = {
+        'interventions': interventions[np.newaxis],
+        'hhs': hhs[np.newaxis],
+        'returnees': returnees[np.newaxis],
+        'apartments_assigned': apartments_assigned[np.newaxis],
+        'apartments_available': (arrays['apartments'] - apartments_assigned)[np.newaxis],
+        'cohorts': _cohorts(interventions, years_of_support)[np.newaxis],
+    }
+    results.update(costing.run_arrays(
+        interventions[np.newaxis], hhs[np.newaxis], dimensions=dimensions,
+        **{key: np.asarray(value)[np.newaxis] for key, value in scenario.cost_arrays.items()}
+    ))
+    outputs = label_results(results, ids=None, years=scenario.years, base_year=scenario.base_year, titles=[scenario.title], dimensions=dimensions)
+
+    outputs['households'] = households
+    outputs['waiting_times'] = pd.DataFrame(
+        {'completed': completed_waits, 'ongoing': ongoing_waits},
+        index=pd.RangeIndex(n_years + 1, name='years_waited')
+    )
+    relapses = np.bincount(households['relapses'])
+    outputs['relapses'] = pd.Series(relapses, index=pd.RangeIndex(len(relapses), name='relapses'), name='households')
+    return outputs
@@ -0,0 +1,121 @@
+import pandas as pd
+import numpy as np
+
+from scenario import Scenario
+from sketch import QuantileSketch
+from batch import run_stacked
+import costing
+
+
+def normal(mean: float, sd: float, low: float = None, high: float = None):
+    '''
+    Normal distribution, optionally clipped to [low, high] - returns sampler `(rng, size) -> values` accepted by `simulate_monte_carlo`.
+    '''
+    return lambda rng, size: np.clip(rng.normal(mean, sd, size), low, high) if low is not None or high is not None else rng.normal(mean, sd, size)
+
+
+def uniform(low: float, high: float):
+    '''
+    Uniform distribution on [low, high].
+    '''
+    return lambda rng, size: rng.uniform(low, high, size)
+
+
+def triangular(low: float, mode: float, high: float):
+    '''
+    Triangular distribution on [low, high] with peak at `mode` - handy for expert estimates (pessimistic, likely, optimistic).
+    '''
+    return lambda rng, size: rng.triangular(low, mode, high, size)
+
+
+def beta(mean: float, sd: float):
+    '''
+    Beta distribution with given mean and standard deviation - suitable for rates and shares bounded in (0, 1).
+    '''
+    concentration = mean * (1 - mean) / sd ** 2 - 1
+    if concentration <= 0:
+        raise Exception('Standard deviation is too large for a beta distribution with this mean...')
+    return lambda rng, size: rng.beta(mean * concentration, (1 - mean) * concentration, size)
+
+
+def lognormal(median: float, sigma: float):
+    '''
+    Lognormal distribution with given median and sigma of the underlying normal - suitable for positive amounts (costs, inflows).
+    '''
+    return lambda rng, size: median * rng.lognormal(0., sigma, size)
+
+
+def draw(distributions: dict, n_samples: int, seed=None) -> pd.DataFrame:
+    '''
+    Draws `n_samples` values of parameters {parameter name: distribution} - a distribution is either a sampler `(rng, size) -> values`
+    or a frozen `scipy.stats` distribution. Parameters are drawn in the given order from one generator seeded by `seed`.
+    '''
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for name, distribution in distributions.items():
+        if hasattr(distribution, 'rvs'):
+            samples[name] = distribution.rvs(size=n_samples, random_state=rng)
+        else:
+            samples[name] = distribution(rng, n_samples)
+    return pd.DataFrame(samples, index=pd.RangeIndex(n_samples, name='sample'))
+
+
+def simulate_monte_carlo(scenario, distributions: dict, n_samples: int, seed=None, chunksize: int = 5000, percentiles=(5, 25, 50, 75, 95), sketch_size: int = 2000) -> dict:
+    '''
+    Monte Carlo mode of `simulate_social_housing` - uncertain parameters of `scenario` (`Scenario` or dict of `simulate_social_housing` parameters)
+    are drawn from `distributions` {parameter name: distribution} (see `Scenario.parameter_names` for names and `draw` for distributions),
+    e.g. {'relapse_rates.high.municipal': beta(0.2, 0.05), 'hhs_inflow.low.yearly_growth': normal(6000, 500, low=0), 'low_to_high_risk_share': uniform(0.05, 0.15)}.
+
+    Samples are simulated by the array engine in chunks of `chunksize` scenarios and only quantile sketches of the outputs are kept
+    (see `sketch.QuantileSketch`), so memory does not grow with `n_samples`.
+
+    Returns percentile bands indexed by (percentile, rok) of `costs_discounted` (with `total`), `queue` (queued households by risk and `total`)
+    and `interventions`; `npv` bands indexed by percentile and `samples` with drawn parameters and total NPV of every sample.
+    '''
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    names = list(distributions.keys())
+    unknown = set(names) - set(scenario.parameter_names())
+    if unknown:
+        raise Exception(f'Unknown parameters {sorted(unknown)}...')
+
+    samples = draw(distributions, n_samples, seed)
+    n_years = len(scenario.years)
+    hh_risks, intervention_types = scenario.dimensions.hh_risks, scenario.dimensions.intervention_types
+    sketches = {
+        'costs_discounted': QuantileSketch((n_years, len(costing.COSTS) + 1), sketch_size),
+        'queue': QuantileSketch((n_years, len(hh_risks) + 1), sketch_size),
+        'interventions': QuantileSketch((n_years, len(intervention_types), len(hh_risks)), sketch_size),
+        'npv': QuantileSketch((len(costing.COSTS) + 1,), sketch_size),
+    }
+    npv_total = np.empty(n_samples)
+
+    for start in range(0, n_samples, chunksize):
+        arrays, cost_arrays = scenario.expand(names, samples.iloc[start:start + chunksize].to_numpy())
+        results = run_stacked(scenario.years, arrays, cost_arrays, cohorts=False)
+
+        costs_discounted = results['costs_discounted']
+        queue = results['hhs'][:, :, scenario.dimensions.queue]
+        npv = results['npv']
+        sketches['costs_discounted'].update(np.concatenate([costs_discounted, costs_discounted.sum(axis=2, keepdims=True)], axis=2))
+        sketches['queue'].update(np.concatenate([queue, queue.sum(axis=2, keepdims=True)], axis=2))
+        sketches['interventions'].update(results['interventions'])
+        sketches['npv'].update(np.concatenate([npv, npv.sum(axis=1, keepdims=True)], axis=1))
+        npv_total[start:start + chunksize] = npv.sum(axis=1)
+
+    q = np.asarray(percentiles, dtype=float) / 100
+    rok = pd.Index(scenario.years + scenario.base_year, name='rok')
+    index = pd.MultiIndex.from_product([list(percentiles), rok], names=('percentile', 'rok'))
+
+    def bands(name, columns):
+        return pd.DataFrame(sketches[name].quantiles(q).reshape(len(index), -1), index=index, columns=columns)
+
+    samples['npv'] = npv_total
+    return {
+        'costs_discounted': bands('costs_discounted', costing.COSTS + ['total']),
+        'queue': bands('queue', hh_risks + ['total']),
+        'interventions': bands('interventions', pd.MultiIndex.from_product([intervention_types, hh_risks], names=('intervention_type', 'hh_risk'))),
+        'npv': pd.DataFrame(sketches['npv'].quantiles(q), index=pd.Index(list(percentiles), name='percentile'), columns=costing.COSTS + ['total']),
+        'samples': samples,
+        'title': scenario.title,
+    }
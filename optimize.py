@@ -0,0 +1,276 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+from scenario import Scenario
+from batch import run_stacked
+import engine
+import costing
+
+# Households in queue (all risk groups), see `costing.run_arrays`
+QUEUE = costing.COST_UNITS.index('queue')
+QUEUE_COSTS = ['queue_budget', 'queue_social']
+
+
+def _summarize(scenario: Scenario, names: list, values: np.ndarray) -> np.ndarray:
+    '''
+    Simulates variations of `scenario` and reduces every run to the vector used by the optimizer -
+    npv by cost line, total queue in every year and total apartments of each type supplied by the end of the horizon.
+    '''
+    arrays, cost_arrays = scenario.expand(names, values)
+    results = run_stacked(scenario.years, arrays, cost_arrays, cohorts=False)
+    return np.concatenate([results['npv'], results['costs_units'][:, :, QUEUE], arrays['apartments'][:, -1]], axis=1)
+
+
+class Evaluator:
+    '''
+    Evaluates points (rows of values of parameters `names`, see `Scenario.parameter_names`) as variations of `scenario`.
+
+    Points are evaluated in batches by the array engine - a batch is split evenly across `max_workers` processes
+    (in chunks of at most `chunksize` points). The last `cache_size` evaluated points are remembered and served
+    from the cache (`hits`, `misses`).
+    '''
+
+    def __init__(self, scenario: Scenario, names: list, max_workers: int = None, chunksize: int = 2000, cache_size: int = 10000):
+        self.scenario = scenario
+        self.names = list(names)
+        self.max_workers = max_workers or os.cpu_count()
+        self.chunksize = chunksize
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._pool = None
+
+        n_years = len(scenario.years)
+        self.npv = slice(0, len(costing.COSTS))
+        self.queue = slice(self.npv.stop, self.npv.stop + n_years)
+        self.apartments = slice(self.queue.stop, self.queue.stop + len(engine.APARTMENT_TYPES))
+
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        '''
+        Returns summaries (point, summary) of points `values` (point, parameter) - see `_summarize`.
+        '''
+        values = np.asarray(values, dtype=float).reshape(-1, len(self.names))
+        keys = [row.tobytes() for row in values]
+        missing = list({key: pos for pos, key in enumerate(keys) if key not in self.cache}.values())
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+
+        summaries = {}
+        if missing:
+            size = min(self.chunksize, -(-len(missing) // self.max_workers))
+            chunks = [missing[start:start + size] for start in range(0, len(missing), size)]
+            if self.max_workers > 1 and len(chunks) > 1:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                evaluated = self._pool.map(_summarize, [self.scenario] * len(chunks), [self.names] * len(chunks), [values[chunk] for chunk in chunks])
+            else:
+                evaluated = (_summarize(self.scenario, self.names, values[chunk]) for chunk in chunks)
+            summaries = {keys[pos]: row for chunk, summary in zip(chunks, evaluated) for pos, row in zip(chunk, summary)}
+
+        for key in keys:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+        result = np.stack([summaries[key] if key in summaries else self.cache[key] for key in keys])
+
+        self.cache.update(summaries)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def share_excess(scenario: Scenario, names: list, values: np.ndarray) -> np.ndarray:
+    '''
+    How much intervention shares of points `values` (point, parameter) exceed 100% in any hh group (0 for valid points).
+    '''
+    excess = np.zeros(len(values))
+    for hh_risk in scenario.dimensions.hh_risks:
+        columns = [pos for pos, name in enumerate(names) if name.startswith(f'intervention_shares.{hh_risk}.')]
+        if columns:
+            fixed = scenario.shares[:, scenario.dimensions.risk_pos[hh_risk]].sum() - scenario.parameter_values([names[pos] for pos in columns]).sum()
+            excess = np.maximum(excess, fixed + values[:, columns].sum(axis=1) - 1)
+    return np.maximum(excess, 0)
+
+
+def _objective_and_violation(evaluator: Evaluator, values: np.ndarray, include_queue_costs: bool, queue_limits: dict, max_apartments: dict) -> tuple:
+    '''
+    Objective (total discounted costs) and total relative violation of constraints of points `values` - invalid points are not simulated.
+    '''
+    scenario = evaluator.scenario
+    rok = scenario.years + scenario.base_year
+    cost_lines = [pos for pos, col in enumerate(costing.COSTS) if include_queue_costs or col not in QUEUE_COSTS]
+
+    excess = share_excess(scenario, evaluator.names, values)
+    objective = np.full(len(values), np.inf)
+    violation = excess * 1e3
+    valid = excess == 0
+    if valid.any():
+        summary = evaluator(values[valid])
+        objective[valid] = summary[:, evaluator.npv][:, cost_lines].sum(axis=1)
+        for year, limit in queue_limits.items():
+            if year not in rok:
+                raise Exception(f'Year {year} is not simulated...')
+            queue = summary[:, evaluator.queue][:, list(rok).index(year)]
+            violation[valid] += np.maximum(queue - limit, 0) / max(limit, 1)
+        for apartment_type, limit in max_apartments.items():
+            apartments = summary[:, evaluator.apartments][:, engine.APARTMENT_TYPES.index(apartment_type)]
+            violation[valid] += np.maximum(apartments - limit, 0) / max(limit, 1)
+    return objective, violation
+
+
+def _better(objective, violation, other_objective, other_violation) -> np.ndarray:
+    '''
+    Feasibility rules - feasible beats infeasible, then lower objective among feasible and lower violation among infeasible points.
+    '''
+    return np.where(
+        (violation == 0) & (other_violation == 0),
+        objective <= other_objective,
+        violation <= other_violation
+    )
+
+
+def minimize_costs(
+        scenario,
+        bounds: dict,
+        queue_limits: dict = None,
+        max_apartments: dict = None,
+        include_queue_costs: bool = False,
+        integer: list = None,
+        population: int = None,
+        generations: int = 100,
+        tol: float = 1e-6,
+        seed=None,
+        max_workers: int = None
+    ) -> dict:
+    '''
+    Cheapest setting of decision parameters `bounds` {parameter name: (low, high)} (see `Scenario.parameter_names`), e.g.
+    `guaranteed_yearly_apartments`, `municipal_new_availability_rate` or `intervention_shares.high.self_help`, other parameters of `scenario` are kept.
+
+    Minimizes total `costs_discounted` (without `queue_budget` and `queue_social` unless `include_queue_costs`) subject to
+     * `queue_limits` {rok: maximal number of households in queue in that year}
+     * `max_apartments` {apartment type: maximal number of apartments supplied by the end of the horizon}
+     * intervention shares not exceeding 100% in a hh group.
+
+    Differential evolution (rand/1/bin with feasibility rules) - every generation is evaluated as one batch (see `Evaluator`),
+    parameters listed in `integer` are rounded. Stops when the costs of the population differ less than `tol` (relative).
+
+    Returns dict with `parameters` (Series), `costs`, `queue` (Series by rok), `feasible`, `generations` and evaluator statistics.
+    '''
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    names = list(bounds.keys())
+    queue_limits = queue_limits or {}
+    max_apartments = max_apartments or {}
+    rounded = np.array([name in (integer or []) for name in names])
+    low, high = np.array(list(bounds.values()), dtype=float).T
+    n_params = len(names)
+    population = population or max(15 * n_params, 20)
+    rng = np.random.default_rng(seed)
+
+    def clip(values):
+        values = np.clip(values, low, high)
+        return np.where(rounded, np.round(values), values)
+
+    evaluator = Evaluator(scenario, names, max_workers=max_workers)
+    try:
+        members = clip(low + rng.random((population, n_params)) * (high - low))
+        # The current setting of the scenario is one of the candidates
+        members[0] = clip(scenario.parameter_values(names))
+        objective, violation = _objective_and_violation(evaluator, members, include_queue_costs, queue_limits, max_apartments)
+
+        generation = 0
+        for generation in range(1, generations + 1):
+            # Mutation from three distinct other members and binomial crossover
+            others = np.argsort(rng.random((population, population - 1)), axis=1)[:, :3]
+            others = others + (others >= np.arange(population)[:, np.newaxis])
+            factor = rng.uniform(0.5, 1., (population, 1))
+            mutants = members[others[:, 0]] + factor * (members[others[:, 1]] - members[others[:, 2]])
+            crossover = rng.random((population, n_params)) < 0.9
+            crossover[np.arange(population), rng.integers(0, n_params, population)] = True
+            trials = clip(np.where(crossover, mutants, members))
+
+            trial_objective, trial_violation = _objective_and_violation(evaluator, trials, include_queue_costs, queue_limits, max_apartments)
+            replace = _better(trial_objective, trial_violation, objective, violation)
+            members[replace], objective[replace], violation[replace] = trials[replace], trial_objective[replace], trial_violation[replace]
+
+            feasible = violation == 0
+            if feasible.all() and np.ptp(objective) <= tol * np.abs(objective).max():
+                break
+
+        best = np.lexsort((objective, violation))[0]
+        summary = evaluator(members[best:best + 1])[0]
+        return {
+            'parameters': pd.Series(members[best], index=names),
+            'costs': objective[best],
+            'queue': pd.Series(summary[evaluator.queue], index=pd.Index(scenario.years + scenario.base_year, name='rok'), name='queue'),
+            'feasible': bool(violation[best] == 0),
+            'generations': generation,
+            'evaluations': evaluator.misses,
+            'cache_hits': evaluator.hits,
+        }
+    finally:
+        evaluator.close()
+
+
+def solve_for(
+        scenario,
+        name: str,
+        bounds: tuple,
+        queue_limits: dict = None,
+        max_apartments: dict = None,
+        integer: bool = False,
+        n_points: int = 16,
+        tol: float = 1e-4,
+        max_workers: int = None
+    ) -> float:
+    '''
+    Inverse query - the smallest value of parameter `name` within `bounds` (low, high) for which the constraints hold
+    (`queue_limits`, `max_apartments` as in `minimize_costs`), e.g. the required `guaranteed_yearly_apartments` for a target queue.
+
+    Constraints are assumed to hold for all values above the solution (e.g. more apartments never lengthen the queue).
+    The interval is searched with `n_points` evaluated in one batch per step until it is narrower than `tol` * (high - low)
+    (or down to a whole number for `integer` parameters).
+
+    Returns the value, or None if the constraints do not hold even at the upper bound.
+    '''
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    low, high = map(float, bounds)
+    width = tol * (high - low)
+    evaluator = Evaluator(scenario, [name], max_workers=max_workers)
+    try:
+        def feasible(points):
+            _, violation = _objective_and_violation(evaluator, points[:, np.newaxis], False, queue_limits or {}, max_apartments or {})
+            return violation == 0
+
+        if integer:
+            low, high = np.floor(low), np.ceil(high)
+        ends = feasible(np.array([low, high]))
+        if ends[0]:
+            return low
+        if not ends[1]:
+            return None
+        while high - low > (1 if integer else width):
+            points = np.linspace(low, high, n_points + 2)[1:-1]
+            if integer:
+                points = np.unique(np.round(points))
+                points = points[(points > low) & (points < high)] if ((points > low) & (points < high)).any() else np.array([np.floor((low + high) / 2)])
+            ok = feasible(points)
+            if ok.any():
+                first = np.argmax(ok)
+                high = points[first]
+                low = points[first - 1] if first > 0 else low
+            else:
+                low = points[-1]
+        return high
+    finally:
+        evaluator.close()
@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from scenario import Scenario
+from batch import run_scenarios, label_results
+
+
+def _attach(specs: dict) -> tuple:
+    '''
+    Attaches to shared memory blocks described by `specs` {key: (name, shape)} - returns the blocks and float arrays backed by them.
+    '''
+    blocks = {key: shared_memory.SharedMemory(name=name) for key, (name, _) in specs.items()}
+    arrays = {key: np.ndarray(shape, dtype=float, buffer=blocks[key].buf) for key, (_, shape) in specs.items()}
+    return blocks, arrays
+
+
+def _simulate_chunk(positions: list, parameters: list, specs: dict, cohort_length: int) -> int:
+    '''
+    Worker - compiles and simulates a chunk of variants as one batch and writes the results into shared memory at `positions`.
+    '''
+    results = run_scenarios([Scenario.from_dict(p) for p in parameters], cohort_length=cohort_length)
+    blocks, arrays = _attach(specs)
+    try:
+        for key, values in results.items():
+            arrays[key][positions] = values
+    finally:
+        del arrays
+        for block in blocks.values():
+            block.close()
+    return len(positions)
+
+
+def run_variants(variants: dict, max_workers: int = None, chunksize: int = None) -> dict:
+    '''
+    Simulates variants {variant_name: parameters of `simulate_social_housing`} on a process pool across all cores.
+
+    Every worker simulates a chunk of variants as one batch (see `batch.run_scenarios`) and writes the plain arrays of results
+    into shared memory; the labelled tables are assembled once in the parent process. All variants must share `years` and categories (see `dimensions.Dimensions`).
+
+    Returns {variant_name: outputs} with the same tables as `simulate_social_housing` (computed by the array engine) and `npv`.
+    '''
+    names = list(variants.keys())
+    parameters = [variants[name] for name in names]
+    max_workers = max_workers or os.cpu_count()
+    chunksize = chunksize or max(1, -(-len(names) // (max_workers * 4)))
+
+    # Shapes of the results from a run of the first variant (cohorts are padded to the longest support of all variants)
+    cohort_length = max(int(p['years_of_support'].max()) for p in parameters)
+    first = Scenario.from_dict(parameters[0])
+    sample = run_scenarios([first], cohort_length=cohort_length)
+
+    blocks = {key: shared_memory.SharedMemory(create=True, size=max(values[0].nbytes, 1) * len(names)) for key, values in sample.items()}
+    specs = {key: (blocks[key].name, (len(names),) + sample[key].shape[1:]) for key in sample}
+    try:
+        chunks = [list(range(start, min(start + chunksize, len(names)))) for start in range(0, len(names), chunksize)]
+        if max_workers == 1 or len(chunks) == 1:
+            for chunk in chunks:
+                _simulate_chunk(chunk, [parameters[pos] for pos in chunk], specs, cohort_length)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = [pool.submit(_simulate_chunk, chunk, [parameters[pos] for pos in chunk], specs, cohort_length) for chunk in chunks]
+                for future in futures:
+                    future.result()
+
+        results = {key: np.ndarray(shape, dtype=float, buffer=blocks[key].buf).copy() for key, (_, shape) in specs.items()}
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+
+    # Age structure only up to the longest support of the variant (as in `simulate_social_housing`)
+    return {
+        name: label_results(
+            {key: values[pos:pos + 1] if key != 'cohorts' else values[pos:pos + 1, :, :int(p['years_of_support'].max())] for key, values in results.items()},
+            ids=None,
+            years=first.years,
+            base_year=p.get('base_year', 2025),
+            titles=[p.get('title')],
+            dimensions=first.dimensions
+        )
+        for pos, (name, p) in enumerate(zip(names, parameters))
+    }
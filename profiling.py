@@ -0,0 +1,116 @@
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+import pandas as pd
+
+
+class Profiler:
+    '''
+    Instrumentation of `simulate_social_housing` - records wall time, number of calls and (with `memory`) the peak of memory
+    allocated (tracemalloc) by every stage, for stages inside the year loop separately for every simulated year.
+
+    `hooks` are callables receiving every measurement as a dict {`stage`, `yr`, `seconds`, `peak_bytes`} right after the stage
+    ends, e.g. to forward metrics to monitoring. Measurements are summarized by `table`.
+    '''
+
+    def __init__(self, memory: bool = False, hooks: list = None):
+        self.memory = memory
+        self.hooks = list(hooks or [])
+        self.records = {}
+        self._open = []
+
+    def stage(self, stage: str, yr: int = None):
+        '''
+        Context manager measuring one call of `stage` (in simulated year `yr`).
+        '''
+        return _Measurement(self, stage, yr)
+
+    def record(self, stage: str, yr, seconds: float, peak_bytes: int = None):
+        key = (stage, yr)
+        calls, total, peak = self.records.get(key, (0, 0., None))
+        if peak_bytes is not None:
+            peak = peak_bytes if peak is None else max(peak, peak_bytes)
+        self.records[key] = (calls + 1, total + seconds, peak)
+        if self.hooks:
+            event = {'stage': stage, 'yr': yr, 'seconds': seconds, 'peak_bytes': peak_bytes}
+            for hook in self.hooks:
+                hook(event)
+
+    def table(self, base_year: int = 0) -> pd.DataFrame:
+        '''
+        Measurements in order of the stages - `stage`, `rok` (empty for stages outside the year loop), `calls`, `seconds` and `peak_bytes`.
+        '''
+        rows = [
+            (stage, None if yr is None else yr + base_year, calls, seconds, peak)
+            for (stage, yr), (calls, seconds, peak) in self.records.items()
+        ]
+        table = pd.DataFrame(rows, columns=['stage', 'rok', 'calls', 'seconds', 'peak_bytes'])
+        table['rok'] = table['rok'].astype('Int64')
+        table['peak_bytes'] = table['peak_bytes'].astype('Int64')
+        return table
+
+
+class _Measurement:
+    __slots__ = ('profiler', 'stage', 'yr', 'start', 'traced', 'baseline', 'peak')
+
+    def __init__(self, profiler: Profiler, stage: str, yr):
+        self.profiler = profiler
+        self.stage = stage
+        self.yr = yr
+
+    def __enter__(self):
+        if self.profiler.memory:
+            self.traced = tracemalloc.is_tracing()
+            if not self.traced:
+                tracemalloc.start()
+            # Nested stages reset the tracemalloc peak - the peak so far is kept by the enclosing stage
+            if self.profiler._open:
+                parent = self.profiler._open[-1]
+                parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.baseline = tracemalloc.get_traced_memory()[0]
+            self.peak = self.baseline
+            self.profiler._open.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        peak_bytes = None
+        if self.profiler.memory:
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            self.profiler._open.pop()
+            if self.profiler._open:
+                parent = self.profiler._open[-1]
+                parent.peak = max(parent.peak, peak)
+            elif not self.traced:
+                tracemalloc.stop()
+            peak_bytes = peak - self.baseline
+        self.profiler.record(self.stage, None if self.yr is None else int(self.yr), seconds, peak_bytes)
+        return False
+
+
+class _Disabled:
+    '''
+    Profiler that measures nothing - its stages are a shared no-op context manager, so instrumented code runs at full speed.
+    '''
+    _context = nullcontext()
+
+    def stage(self, stage: str, yr: int = None):
+        return self._context
+
+
+DISABLED = _Disabled()
+
+
+def to_profiler(profile) -> tuple:
+    '''
+    Profiler for the `profile` argument of `simulate_social_housing` - False/None (disabled), True (time and calls),
+    'memory' (also allocation peaks) or a `Profiler` (e.g. with hooks). Returns (profiler, whether it is enabled).
+    '''
+    if isinstance(profile, Profiler):
+        return profile, True
+    if not profile:
+        return DISABLED, False
+    return Profiler(memory=profile == 'memory'), True
@@ -0,0 +1,112 @@
+import pandas as pd
+import numpy as np
+
+from scenario import Scenario, SUPPLY_PARAMETERS
+from batch import run_stacked, label_results
+import costing
+
+REGIONS = [
+    'Hlavní město Praha',
+    'Středočeský kraj',
+    'Jihočeský kraj',
+    'Plzeňský kraj',
+    'Karlovarský kraj',
+    'Ústecký kraj',
+    'Liberecký kraj',
+    'Královéhradecký kraj',
+    'Pardubický kraj',
+    'Kraj Vysočina',
+    'Jihomoravský kraj',
+    'Olomoucký kraj',
+    'Zlínský kraj',
+    'Moravskoslezský kraj',
+]
+
+# Cost lines of the system as a whole - accounted once nationally, not in regions
+NATIONAL_COSTS = ['IT_system']
+
+
+def extensive_parameters(scenario: Scenario) -> list:
+    '''
+    Flat parameters of `scenario` that are amounts (households, apartments, fixed costs) - split among regions by `split_national`, rates and shares are kept.
+    '''
+    return (
+        [name for name in SUPPLY_PARAMETERS if not name.endswith('rate')]
+        + [f'hhs_inflow.{hh_risk}.{col}' for hh_risk in scenario.dimensions.hh_risks for col in ['current_level', 'yearly_growth']]
+        + [f'intervention_costs.{row}.{col}' for row, col in costing.PRICE_TAGS if col in costing.FIXED_PRICES and col not in NATIONAL_COSTS]
+    )
+
+
+def split_national(scenario, weights: pd.Series) -> pd.DataFrame:
+    '''
+    Regional parameters (region x flat parameter name, see `Scenario.parameter_names`) splitting national amounts of `scenario`
+    (`extensive_parameters` - inflow, apartment stock and supply, regional fixed costs) by `weights` {region: weight}, e.g. population.
+    The table can be adjusted (e.g. regional shares or rates added as columns) before it is passed to `simulate_regions`.
+    '''
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    weights = weights / weights.sum()
+    names = extensive_parameters(scenario)
+    return pd.DataFrame(np.outer(weights.to_numpy(), scenario.parameter_values(names)), index=weights.index.rename('region'), columns=names)
+
+
+def _national_fixed_costs(scenario: Scenario, lines: list) -> tuple:
+    '''
+    Costs (year, cost line) of national fixed cost `lines` of `scenario` - undiscounted and discounted.
+    '''
+    n_years = len(scenario.years)
+    positions = [costing.COSTS.index(line) for line in lines]
+    costs = np.zeros((n_years, len(costing.COSTS)))
+    costs[:, positions] = scenario.cost_arrays['yearly_price'][positions]
+    costs[0, positions] += scenario.cost_arrays['one_off_price'][positions]
+    discounted = costs / ((1 + scenario.cost_arrays['discount_rate']) ** np.arange(n_years))[:, np.newaxis]
+    return costs, discounted
+
+
+def simulate_regions(scenario, regions: pd.DataFrame, national_costs: list = None) -> dict:
+    '''
+    Simulates regions of the social housing system - regions share all parameters of `scenario` (`Scenario` or dict of
+    `simulate_social_housing` parameters) except the flat parameters in columns of `regions` (region x parameter name,
+    see `Scenario.parameter_names` and `split_national`), e.g. their own inflow, apartment stock, supply and intervention shares.
+
+    Regions are separate systems - households and apartments do not move between them. All regions are simulated together
+    in one pass of the array engine. Fixed cost lines `national_costs` (`NATIONAL_COSTS` by default) are accounted once nationally
+    with prices of `scenario`, the regions do not bear them.
+
+    Returns national outputs (the tables of `simulate_social_housing` summed over regions, plus national costs, and the national `npv`) and `regions`
+    with the tables of every region indexed by (region, rok) and `npv` of every region.
+    '''
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    national_costs = NATIONAL_COSTS if national_costs is None else national_costs
+    unknown = [line for line in national_costs if line not in costing.FIXED_PRICES]
+    if unknown:
+        raise Exception(f'Only fixed cost lines {list(costing.FIXED_PRICES)} can be national, got {unknown}...')
+
+    # National price tags are zeroed in regions
+    national_tags = [f'intervention_costs.{tag[0]}.{tag[1]}' for line in national_costs for tag in costing.FIXED_PRICES[line] if tag is not None]
+    overrides = regions.drop(columns=[tag for tag in national_tags if tag in regions.columns]).assign(**{tag: 0. for tag in national_tags})
+    arrays, cost_arrays = scenario.expand(list(overrides.columns), overrides.to_numpy(dtype=float))
+    results = run_stacked(scenario.years, arrays, cost_arrays)
+
+    names = [str(region) for region in regions.index]
+    tables = label_results(results, ids=names, years=scenario.years, base_year=scenario.base_year, titles=names, dimensions=scenario.dimensions)
+    tables.pop('title')
+    npv = tables.pop('npv')
+    regional = {table: frame.rename_axis(index={'scenario': 'region'}) for table, frame in tables.items()}
+
+    # Cohorts only up to the longest support (as in `simulate_social_housing`)
+    support = int(arrays['years_of_support'].max())
+    cohorts = regional['cohorts']
+    regional['cohorts'] = cohorts[cohorts.index.get_level_values('cohort_age') < support]
+
+    # National totals - sums over regions (returnees stay unknown where they are unknown in all regions)
+    outputs = {table: frame.groupby(level=[name for name in frame.index.names if name != 'region']).sum(min_count=1) for table, frame in regional.items()}
+    costs, discounted = _national_fixed_costs(scenario, national_costs)
+    outputs['costs'] = outputs['costs'] + costs
+    outputs['costs_discounted'] = outputs['costs_discounted'] + discounted
+    outputs['npv'] = pd.Series(outputs['costs_discounted'].sum().to_numpy(), index=costing.COSTS)
+
+    outputs['title'] = scenario.title
+    outputs['regions'] = {**regional, 'npv': npv.rename_axis('region')}
+    return outputs
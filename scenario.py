@@ -0,0 +1,359 @@
+import hashlib
+
+import numpy as np
+
+from dimensions import Dimensions, transition_dict
+from constants import APARTMENT_TYPES
+from supply import simulate_apartment_stock_arrays
+import engine
+import costing
+
+STARTUP_TYPES = ['guaranteed','municipal','consulting','mop_payment']
+
+# Parameters of `simulate_social_housing`
+SUPPLY_PARAMETERS = [
+    'guaranteed_yearly_apartments',
+    'municipal_apartments_today',
+    'municipal_yearly_new_apartments',
+    'municipal_existing_availability_rate',
+    'municipal_new_availability_rate',
+]
+PARAMETERS = SUPPLY_PARAMETERS + [
+    'relapse_rates',
+    'intervention_shares',
+    'hhs_inflow',
+    'years_of_support',
+    'social_assistences',
+    'intervention_costs',
+    'discount_rate',
+    'low_to_high_risk_share',
+    'startup_coefficients',
+    'mop_housing_share',
+    'years',
+    'risk_transitions',
+    'apartment_priorities',
+]
+
+
+def check_labels(name: str, table, index: list, columns: list = None) -> np.ndarray:
+    '''
+    Values of `table` at `index` (and `columns`) labels as a float array - raises an exception if `table` does not contain all the labels
+    or if any of the values is missing. The table is reindexed once, so the values are read without lookups by label.
+    '''
+    missing = [label for label in index if label not in table.index]
+    if columns is not None:
+        missing += [label for label in columns if label not in table.columns]
+    if missing:
+        raise Exception(f'`{name}` is missing labels {missing}...')
+
+    values = (table.reindex(index=index, columns=columns) if columns is not None else table.reindex(index)).to_numpy(dtype=float)
+    if np.isnan(values).any():
+        raise Exception(f'`{name}` contains missing values...')
+    return values
+
+
+def check_bounds(name: str, values, lower: float = 0, upper: float = None):
+    '''
+    Raises an exception if any of `values` is outside of [`lower`, `upper`] interval.
+    '''
+    values = np.asarray(values, dtype=float)
+    if (values < lower).any() or (upper is not None and (values > upper).any()):
+        raise Exception(f'`{name}` must be within [{lower}, {upper if upper is not None else "inf"}]...')
+
+
+def transition_name(transition: tuple) -> str:
+    '''
+    Name of the scalar parameter of risk transition (from, to) - see `Scenario.parameter_names`.
+    '''
+    return 'low_to_high_risk_share' if transition == ('low', 'high') else f'risk_transitions.{transition[0]}.{transition[1]}'
+
+
+class Scenario:
+    '''
+    Validated and compiled parameters of one run of the model.
+
+    Built once from the parameters of `simulate_social_housing` (see `Scenario.from_dict`) - all labels, shapes and bounds are checked up front
+    and the parameters are stored as aligned dense arrays (startup coefficients expanded to the full horizon):
+        * `arrays`: parameters of `engine.run_arrays` (including the apartment stock)
+        * `cost_arrays`: parameters of `costing.run_arrays`
+
+    Categories (risk groups, intervention types, risk transitions and apartment priorities) are kept in `dimensions` (see `dimensions.Dimensions`).
+
+    Scenarios are immutable and hashable - two scenarios are equal if they simulate the same numbers (`title` is not taken into account).
+    '''
+
+    def __init__(
+        self,
+        guaranteed_yearly_apartments,
+        municipal_apartments_today,
+        municipal_yearly_new_apartments,
+        municipal_existing_availability_rate,
+        municipal_new_availability_rate,
+        relapse_rates,
+        intervention_shares,
+        hhs_inflow,
+        years_of_support,
+        social_assistences,
+        intervention_costs,
+        discount_rate,
+        low_to_high_risk_share,
+        startup_coefficients,
+        mop_housing_share,
+        years,
+        base_year=2025,
+        title=None,
+        risk_transitions=None,
+        apartment_priorities=None
+    ):
+        years = np.asarray(years)
+        if years.ndim != 1 or len(years) == 0 or not np.array_equal(years, np.arange(len(years))):
+            raise Exception('`years` must be a sequence 0, 1, ..., n-1...')
+
+        # Supply
+        for name, value in zip(SUPPLY_PARAMETERS, [guaranteed_yearly_apartments, municipal_apartments_today, municipal_yearly_new_apartments]):
+            check_bounds(name, value)
+        check_bounds('municipal_existing_availability_rate', municipal_existing_availability_rate, 0, 1)
+        check_bounds('municipal_new_availability_rate', municipal_new_availability_rate, 0, 1)
+
+        # Categories
+        transitions = transition_dict(low_to_high_risk_share, risk_transitions)
+        dimensions = Dimensions.from_inputs(hhs_inflow, years_of_support, transitions, apartment_priorities)
+        hh_risks, intervention_types = dimensions.hh_risks, dimensions.intervention_types
+        TYPE_POS = dimensions.type_pos
+
+        # Every table is read once into an array ordered as the labels of `dimensions`, the checks and the arrays below work on these
+
+        # Households
+        inflow = check_labels('hhs_inflow', hhs_inflow, hh_risks, ['current_level', 'yearly_growth'])
+        check_bounds('hhs_inflow', inflow)
+        transition_values = dimensions.transition_array(transitions)
+        check_bounds('risk_transitions', transition_values, 0, 1)
+        if (np.bincount(dimensions.sources, weights=transition_values, minlength=len(hh_risks)) > 1).any():
+            raise Exception('Risk transitions cannot sum above 100% from one hh group...')
+
+        # Interventions
+        unknown = [it for it in intervention_shares.columns if it not in dimensions.soft_types]
+        if unknown:
+            raise Exception(f'`intervention_shares` can only contain soft interventions {dimensions.soft_types}, got {unknown}...')
+        share_values = check_labels('intervention_shares', intervention_shares, hh_risks, list(intervention_shares.columns))
+        check_bounds('intervention_shares', share_values, 0, 1)
+        if (share_values.sum(axis=1) > 1).any():
+            raise Exception('Intervention shares cannot sum above 100% in one hh group...')
+
+        relapse = check_labels('relapse_rates', relapse_rates, hh_risks, intervention_types)
+        check_bounds('relapse_rates', relapse, 0, 1)
+
+        support = check_labels('years_of_support', years_of_support, intervention_types)
+        if (support < 1).any() or (support % 1 != 0).any():
+            raise Exception('`years_of_support` must be whole number of years (at least 1)...')
+
+        unknown = [it for it in startup_coefficients.columns if it not in STARTUP_TYPES]
+        if unknown or not set(APARTMENT_TYPES) <= set(startup_coefficients.columns):
+            raise Exception(f'`startup_coefficients` must contain {APARTMENT_TYPES} and can contain {STARTUP_TYPES}...')
+        if not startup_coefficients.index.isin(years).all():
+            raise Exception('`startup_coefficients` can only contain simulated years...')
+        # Years and types without a coefficient get 1
+        startup = startup_coefficients.reindex(index=years, columns=STARTUP_TYPES).to_numpy(dtype=float)
+        startup[np.isnan(startup)] = 1
+        check_bounds('startup_coefficients', startup)
+
+        # Costs
+        assistance = check_labels('social_assistences', social_assistences, costing.ASSISTED_TYPES, ['share', 'years'])
+        check_bounds('social_assistences', assistance[:, 0], 0, 1)
+        check_bounds('social_assistences', assistance[:, 1], 1)
+        housing_share = check_labels('mop_housing_share', mop_housing_share, APARTMENT_TYPES, hh_risks)
+        check_bounds('mop_housing_share', housing_share, 0, 1)
+        rows, columns = list(dict.fromkeys(tag[0] for tag in costing.PRICE_TAGS)), list(dict.fromkeys(tag[1] for tag in costing.PRICE_TAGS))
+        price_values = intervention_costs.reindex(index=rows, columns=columns).to_numpy(dtype=float)
+        self.prices = {tag: float(price_values[rows.index(tag[0]), columns.index(tag[1])]) for tag in costing.PRICE_TAGS}
+        missing = [tag for tag, price in self.prices.items() if np.isnan(price)]
+        if missing:
+            raise Exception(f'`intervention_costs` is missing price tags {missing}...')
+        if discount_rate <= -1:
+            raise Exception('`discount_rate` must be above -100 %...')
+
+        self.supply_startup = startup[:, [STARTUP_TYPES.index(at) for at in APARTMENT_TYPES]]
+        # Effective shares in each year - startup coefficients of soft interventions (multiplying by 1 elsewhere is exact)
+        self.share_coefficients = np.ones((len(years), len(intervention_types)))
+        self.share_coefficients[:, [TYPE_POS[it] for it in ['consulting', 'mop_payment']]] = startup[:, [STARTUP_TYPES.index(it) for it in ['consulting', 'mop_payment']]]
+        self.shares = np.zeros((len(intervention_types), len(hh_risks)))
+        self.shares[[TYPE_POS[it] for it in intervention_shares.columns]] = share_values.T
+
+        # Base values needed to re-derive the arrays when parameters are overridden (see `expand`)
+        self.supply = {
+            'guaranteed_yearly_apartments': guaranteed_yearly_apartments,
+            'municipal_apartments_today': municipal_apartments_today,
+            'municipal_yearly_new_apartments': municipal_yearly_new_apartments,
+            'municipal_existing_availability_rate': municipal_existing_availability_rate,
+            'municipal_new_availability_rate': municipal_new_availability_rate,
+        }
+
+        self.years = years
+        self.base_year = base_year
+        self.title = title
+        self.dimensions = dimensions
+        # Parameters of `engine.run_arrays` and `costing.run_arrays`, the same as `engine.to_arrays` and `costing.to_arrays` of the tables
+        self.arrays = {
+            'apartments': simulate_apartment_stock_arrays(startup=self.supply_startup, years=years, **self.supply)[0],
+            'shares': engine.expand_shares(self.shares, self.share_coefficients),
+            'soft_types': np.array([TYPE_POS[it] for it in intervention_shares.columns]),
+            'relapse': relapse.T.copy(),
+            'current_level': inflow[:, 0].copy(),
+            'yearly_growth': inflow[:, 1].copy(),
+            'years_of_support': support.astype(int),
+            'transitions': transition_values,
+        }
+        self.cost_arrays = {
+            'apartment_years': support[[TYPE_POS[at] for at in APARTMENT_TYPES]].astype(int),
+            'assistance_share': assistance[:, 0].copy(),
+            'assistance_years': assistance[:, 1].astype(int),
+            'mop_housing_share': housing_share,
+            **costing.price_arrays(self.prices),
+            'discount_rate': np.asarray(float(discount_rate)),
+        }
+
+        for array in list(self.arrays.values()) + list(self.cost_arrays.values()) + [self.years, self.supply_startup, self.shares, self.share_coefficients]:
+            array.setflags(write=False)
+
+        self.key = self._digest()
+
+    @classmethod
+    def from_dict(cls, parameters: dict) -> 'Scenario':
+        '''
+        Builds a scenario from a dict of `simulate_social_housing` parameters (other keys, e.g. `engine`, are ignored).
+        '''
+        return cls(**{key: value for key, value in parameters.items() if key in PARAMETERS + ['base_year', 'title']})
+
+    def _digest(self) -> str:
+        digest = hashlib.sha1(str(self.base_year).encode())
+        digest.update(repr(self.dimensions.key).encode())
+        for name, arrays in [('arrays', self.arrays), ('cost_arrays', self.cost_arrays)]:
+            for key in sorted(arrays):
+                digest.update(f'{name}.{key}{arrays[key].dtype}{arrays[key].shape}'.encode())
+                digest.update(np.ascontiguousarray(arrays[key]).tobytes())
+        return digest.hexdigest()
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, Scenario) and self.key == other.key
+
+    def __repr__(self):
+        return f'Scenario({self.title!r}, years={len(self.years)}, key={self.key[:12]})'
+
+    def parameter_names(self) -> list:
+        '''
+        Names of all scalar parameters of the scenario that can be overridden by `expand`, e.g.
+        `guaranteed_yearly_apartments`, `discount_rate`, `relapse_rates.high.municipal`, `intervention_shares.low.self_help`,
+        `hhs_inflow.low.yearly_growth` or `intervention_costs.yearly.guaranteed`.
+
+        Risk transitions are `risk_transitions.{from}.{to}`, except the (low, high) transition named `low_to_high_risk_share`.
+        '''
+        hh_risks, intervention_types = self.dimensions.hh_risks, self.dimensions.intervention_types
+        soft_types = [intervention_types[t] for t in self.arrays['soft_types']]
+        return (
+            SUPPLY_PARAMETERS
+            + [transition_name(transition) for transition in self.dimensions.transitions] + ['discount_rate']
+            + [f'relapse_rates.{hh_risk}.{it}' for hh_risk in hh_risks for it in intervention_types]
+            + [f'intervention_shares.{hh_risk}.{it}' for hh_risk in hh_risks for it in soft_types]
+            + [f'hhs_inflow.{hh_risk}.{col}' for hh_risk in hh_risks for col in ['current_level', 'yearly_growth']]
+            + [f'intervention_costs.{row}.{col}' for row, col in costing.PRICE_TAGS]
+        )
+
+    def _transition(self, name: str) -> int:
+        group, *labels = name.split('.')
+        transition = ('low', 'high') if group == 'low_to_high_risk_share' else tuple(labels)
+        if transition not in self.dimensions.transitions:
+            raise Exception(f'Unknown parameter `{name}`...')
+        return self.dimensions.transitions.index(transition)
+
+    def parameter_values(self, names: list) -> np.ndarray:
+        '''
+        Values of scalar parameters `names` (see `parameter_names`) in the scenario.
+        '''
+        TYPE_POS, RISK_POS = self.dimensions.type_pos, self.dimensions.risk_pos
+        values = []
+        for name in names:
+            group, *labels = name.split('.')
+            if group in SUPPLY_PARAMETERS:
+                values.append(self.supply[group])
+            elif group in ['low_to_high_risk_share', 'risk_transitions']:
+                values.append(self.arrays['transitions'][self._transition(name)])
+            elif group == 'discount_rate':
+                values.append(self.cost_arrays['discount_rate'])
+            elif group == 'relapse_rates':
+                values.append(self.arrays['relapse'][TYPE_POS[labels[1]], RISK_POS[labels[0]]])
+            elif group == 'intervention_shares':
+                values.append(self.shares[TYPE_POS[labels[1]], RISK_POS[labels[0]]])
+            elif group == 'hhs_inflow':
+                values.append(self.arrays[labels[1]][RISK_POS[labels[0]]])
+            elif group == 'intervention_costs':
+                values.append(self.prices[tuple(labels)])
+            else:
+                raise Exception(f'Unknown parameter `{name}`...')
+        return np.array(values, dtype=float)
+
+    def expand(self, names: list, values: np.ndarray) -> tuple:
+        '''
+        Variations of the scenario - scalar parameters `names` (see `parameter_names`) take `values` (variation, parameter),
+        all other parameters keep their values.
+
+        Returns dict of arrays accepted by `engine.run_arrays` (with the `dimensions` of the scenario) and dict of cost parameters accepted
+        by `costing.run_arrays`, both with a leading axis of variations (see `batch.run_stacked`). Bounds of overridden rates and shares are checked.
+        '''
+        TYPE_POS, RISK_POS = self.dimensions.type_pos, self.dimensions.risk_pos
+        values = np.asarray(values, dtype=float)
+        values = values if values.ndim == 2 else values.reshape(-1, len(names))
+        n = len(values)
+
+        arrays = {key: np.repeat(value[np.newaxis], n, axis=0) for key, value in self.arrays.items() if key != 'soft_types'}
+        arrays['soft_types'] = self.arrays['soft_types']
+        arrays['dimensions'] = self.dimensions
+        cost_arrays = {key: np.repeat(value[np.newaxis], n, axis=0) for key, value in self.cost_arrays.items()}
+        supply = {key: np.full(n, value) for key, value in self.supply.items()}
+        shares = None
+
+        for name, column in zip(names, values.T):
+            group, *labels = name.split('.')
+            if group in SUPPLY_PARAMETERS:
+                supply[group] = column
+            elif group in ['low_to_high_risk_share', 'risk_transitions']:
+                check_bounds(name, column, 0, 1)
+                arrays['transitions'][:, self._transition(name)] = column
+            elif group == 'discount_rate':
+                check_bounds(name, column, -1)
+                cost_arrays['discount_rate'] = column
+            elif group == 'relapse_rates':
+                check_bounds(name, column, 0, 1)
+                arrays['relapse'][:, TYPE_POS[labels[1]], RISK_POS[labels[0]]] = column
+            elif group == 'intervention_shares':
+                if shares is None:
+                    shares = np.repeat(self.shares[np.newaxis], n, axis=0)
+                shares[:, TYPE_POS[labels[1]], RISK_POS[labels[0]]] = column
+            elif group == 'hhs_inflow':
+                check_bounds(name, column)
+                arrays[labels[1]][:, RISK_POS[labels[0]]] = column
+            elif group == 'intervention_costs':
+                for key, pos in costing.price_positions(tuple(labels)):
+                    cost_arrays[key][:, pos] = column
+            else:
+                raise Exception(f'Unknown parameter `{name}`...')
+
+        if any(name.split('.')[0] in SUPPLY_PARAMETERS for name in names):
+            for name in SUPPLY_PARAMETERS:
+                check_bounds(name, supply[name], 0, 1 if name.endswith('rate') else None)
+            arrays['apartments'] = simulate_apartment_stock_arrays(startup=self.supply_startup, years=self.years, **supply)
+
+        if any(name.split('.')[0] in ['low_to_high_risk_share', 'risk_transitions'] for name in names) and len(self.dimensions.transitions) > 1:
+            sources = self.dimensions.sources
+            if (np.stack([arrays['transitions'][:, sources == source].sum(axis=1) for source in np.unique(sources)], axis=1) > 1).any():
+                raise Exception('Risk transitions cannot sum above 100% from one hh group...')
+
+        if shares is not None:
+            check_bounds('intervention_shares', shares, 0, 1)
+            if (shares.sum(axis=1) > 1).any():
+                raise Exception('Intervention shares cannot sum above 100% in one hh group...')
+            arrays['shares'] = engine.expand_shares(shares, self.share_coefficients)
+
+        return arrays, cost_arrays
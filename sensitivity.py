@@ -0,0 +1,145 @@
+import pandas as pd
+import numpy as np
+
+from scenario import Scenario
+from batch import run_stacked
+import costing
+
+# Households in queue (all risk groups), see `costing.run_arrays`
+QUEUE = costing.COST_UNITS.index('queue')
+
+# Output: function of results of `batch.run_stacked` returning one value per scenario
+OUTPUTS = {
+    'npv': lambda results: results['npv'].sum(axis=1),
+    'final_queue': lambda results: results['costs_units'][:, -1, QUEUE],
+    'mean_queue': lambda results: results['costs_units'][:, :, QUEUE].mean(axis=1),
+}
+
+
+def default_bounds(scenario: Scenario, names: list, spread: float = 0.2) -> dict:
+    '''
+    Ranges of parameters `names` (see `Scenario.parameter_names`) - +-`spread` around their values in `scenario`,
+    rates and shares are kept within [0, 1].
+    '''
+    bounds = {}
+    for name, value in zip(names, scenario.parameter_values(names)):
+        low, high = sorted([value * (1 - spread), value * (1 + spread)])
+        if name.split('.')[0] in ['relapse_rates', 'intervention_shares', 'low_to_high_risk_share', 'risk_transitions'] or name.endswith('rate'):
+            low, high = max(low, 0.), min(high, 1.)
+        bounds[name] = (low, high)
+    return bounds
+
+
+def evaluate(scenario: Scenario, names: list, values: np.ndarray, outputs: dict = None, chunksize: int = 5000) -> pd.DataFrame:
+    '''
+    Evaluates the model as a function of parameter vector `names` - every row of `values` (evaluation, parameter) is simulated
+    as a variation of `scenario` (see `Scenario.expand`) by the batched array engine in chunks of `chunksize` scenarios.
+
+    Returns dataframe (evaluation, output) of scalar `outputs` {output name: function of results} (`OUTPUTS` by default).
+    '''
+    outputs = outputs or OUTPUTS
+    values = np.asarray(values, dtype=float).reshape(-1, len(names))
+    evaluated = np.empty((len(values), len(outputs)))
+    for start in range(0, len(values), chunksize):
+        results = run_stacked(scenario.years, *scenario.expand(names, values[start:start + chunksize]))
+        evaluated[start:start + chunksize] = np.stack([output(results) for output in outputs.values()], axis=1)
+    return pd.DataFrame(evaluated, columns=list(outputs.keys()))
+
+
+def scale(unit: np.ndarray, bounds: dict) -> np.ndarray:
+    '''
+    Maps points of the unit hypercube (point, parameter) onto parameter ranges `bounds` {parameter name: (low, high)}.
+    '''
+    low, high = np.array(list(bounds.values()), dtype=float).T
+    return low + unit * (high - low)
+
+
+def morris(scenario, bounds: dict, n_trajectories: int = 50, levels: int = 4, seed=None, outputs: dict = None) -> pd.DataFrame:
+    '''
+    Morris elementary effects screening - `bounds` {parameter name: (low, high)} (see `default_bounds`).
+
+    Every trajectory starts in a random point of a `levels` grid of the unit hypercube and moves one parameter at a time
+    by delta = levels / (2 * (levels - 1)); the elementary effect is the change of the output per unit (whole range) change of the parameter.
+    All trajectories are evaluated as one batch.
+
+    Returns dataframe indexed by parameter with (output, statistic) columns - `mu`, `mu_star` (mean absolute effect, ranks importance) and `sigma`.
+    '''
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    names = list(bounds.keys())
+    n_params = len(names)
+    rng = np.random.default_rng(seed)
+    delta = levels / (2 * (levels - 1))
+
+    # Trajectories (trajectory, step, parameter) - start from the grid points from which a step up stays inside the hypercube
+    start = rng.integers(0, levels // 2, size=(n_trajectories, n_params)) / (levels - 1)
+    order = np.argsort(rng.random((n_trajectories, n_params)), axis=1)
+    direction = np.where(rng.random((n_trajectories, n_params)) < 0.5, -1., 1.)
+    start = np.where(direction < 0, start + delta, start)
+    steps = np.zeros((n_trajectories, n_params, n_params))
+    steps[np.arange(n_trajectories)[:, np.newaxis], np.arange(n_params), order] = direction[np.arange(n_trajectories)[:, np.newaxis], order] * delta
+    points = start[:, np.newaxis] + np.concatenate([np.zeros((n_trajectories, 1, n_params)), steps.cumsum(axis=1)], axis=1)
+
+    evaluated = evaluate(scenario, names, scale(points.reshape(-1, n_params), bounds), outputs)
+    values = evaluated.to_numpy().reshape(n_trajectories, n_params + 1, -1)
+
+    # Effect of step k belongs to the parameter moved in step k
+    effects = np.empty((n_trajectories, n_params, values.shape[2]))
+    step_effects = np.diff(values, axis=1) / (direction[np.arange(n_trajectories)[:, np.newaxis], order] * delta)[..., np.newaxis]
+    effects[np.arange(n_trajectories)[:, np.newaxis], order] = step_effects
+
+    statistics = {
+        'mu': effects.mean(axis=0),
+        'mu_star': np.abs(effects).mean(axis=0),
+        'sigma': effects.std(axis=0, ddof=1) if n_trajectories > 1 else np.zeros(effects.shape[1:]),
+    }
+    return pd.concat(
+        {output: pd.DataFrame({stat: statistic[:, pos] for stat, statistic in statistics.items()}, index=pd.Index(names, name='parameter')) for pos, output in enumerate(evaluated.columns)},
+        axis=1
+    )
+
+
+def sobol(scenario, bounds: dict, n_samples: int = 10000, seed=None, outputs: dict = None, n_bootstrap: int = 100) -> pd.DataFrame:
+    '''
+    Sobol variance-based indices - `bounds` {parameter name: (low, high)} (see `default_bounds`), parameters are uniform within their ranges.
+
+    Saltelli sampling design with matrices A, B and A with i-th column from B for every parameter - n_samples * (parameters + 2) evaluations
+    in one batch. First-order indices `S1` by Saltelli (2010), total indices `ST` by Jansen estimator; `S1_conf` and `ST_conf`
+    are 95% bootstrap confidence half-widths.
+
+    Returns dataframe indexed by parameter with (output, index) columns.
+    '''
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    names = list(bounds.keys())
+    n_params = len(names)
+    rng = np.random.default_rng(seed)
+
+    a = rng.random((n_samples, n_params))
+    b = rng.random((n_samples, n_params))
+    ab = np.repeat(a[np.newaxis], n_params, axis=0)
+    ab[np.arange(n_params), :, np.arange(n_params)] = b.T
+    design = np.concatenate([a, b, ab.reshape(-1, n_params)])
+
+    evaluated = evaluate(scenario, names, scale(design, bounds), outputs)
+    values = evaluated.to_numpy()
+    # Outputs are centered - the estimators are invariant to a shift of the output but much less noisy for outputs with large mean (e.g. NPV)
+    values = values - values[:2 * n_samples].mean(axis=0)
+    f_a, f_b, f_ab = values[:n_samples], values[n_samples:2 * n_samples], values[2 * n_samples:].reshape(n_params, n_samples, -1)
+
+    def indices(rows):
+        variance = np.concatenate([f_a[rows], f_b[rows]]).var(axis=0)
+        first = (f_b[rows] * (f_ab[:, rows] - f_a[rows])).mean(axis=1) / variance
+        total = 0.5 * ((f_a[rows] - f_ab[:, rows]) ** 2).mean(axis=1) / variance
+        return first, total
+
+    first, total = indices(np.arange(n_samples))
+    resampled = [indices(rng.integers(0, n_samples, n_samples)) for _ in range(n_bootstrap)]
+    first_conf = 1.96 * np.std([r[0] for r in resampled], axis=0, ddof=1) if n_bootstrap > 1 else np.full(first.shape, np.nan)
+    total_conf = 1.96 * np.std([r[1] for r in resampled], axis=0, ddof=1) if n_bootstrap > 1 else np.full(total.shape, np.nan)
+
+    statistics = {'S1': first, 'S1_conf': first_conf, 'ST': total, 'ST_conf': total_conf}
+    return pd.concat(
+        {output: pd.DataFrame({stat: statistic[:, pos] for stat, statistic in statistics.items()}, index=pd.Index(names, name='parameter')) for pos, output in enumerate(evaluated.columns)},
+        axis=1
+    )
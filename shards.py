@@ -0,0 +1,221 @@
+'''
+Resumable sharded sweeps - a parameter grid is split into deterministic shards that are processed by any number of workers
+(local processes or other machines sharing the sweep directory) through a file-based work queue:
+
+    {root}/sweep.pkl                  scenario, grid axes, shard size and reducers of the sweep
+    {root}/claims/shard-000042        claim of a shard being processed (worker id, stale claims are taken over)
+    {root}/done/shard-000042.pkl      reducers of a finished shard (written atomically)
+
+An interrupted sweep is resumed by running workers again - only shards without a result are processed.
+Workers on other machines are started by `python cli.py worker SWEEP_DIRECTORY`.
+'''
+import os
+import sys
+import copy
+import time
+import pickle
+import socket
+
+import numpy as np
+
+from scenario import Scenario
+from sweep import default_reducers, fold, _simulate_metrics
+
+
+def _write_atomic(path: str, value):
+    temporary = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        pickle.dump(value, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def _read(path: str):
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+class ShardedSweep:
+    '''
+    Sweep of all combinations of grid `axes` {parameter name: values} (see `Scenario.parameter_names`) as variations of `scenario`,
+    split into shards of `shard_size` points - points are numbered in the order of `sweep.grid` and shard i holds points
+    [i * shard_size, (i + 1) * shard_size), so shards are the same on every machine and after a restart.
+
+    Every shard folds its points into a fresh copy of `reducers` (`sweep.default_reducers()` by default), `result` merges finished shards.
+    Opening an existing sweep directory (`scenario` and `axes` omitted) continues it.
+    '''
+
+    def __init__(self, root: str, scenario=None, axes: dict = None, shard_size: int = 10000, reducers: dict = None, queue_threshold: float = 0, chunksize: int = 5000):
+        self.root = root
+        path = os.path.join(root, 'sweep.pkl')
+        if scenario is None:
+            if not os.path.exists(path):
+                raise Exception(f'No sweep in `{root}`, give `scenario` and `axes` to start one...')
+            config = _read(path)
+        else:
+            if not isinstance(scenario, Scenario):
+                scenario = Scenario.from_dict(scenario)
+            axes = {name: np.asarray(values, dtype=float) for name, values in axes.items()}
+            unknown = set(axes) - set(scenario.parameter_names())
+            if unknown:
+                raise Exception(f'Unknown parameters {sorted(unknown)}...')
+            config = {
+                'scenario': scenario,
+                'axes': axes,
+                'shard_size': shard_size,
+                'reducers': reducers if reducers is not None else default_reducers(),
+                'queue_threshold': queue_threshold,
+                'chunksize': chunksize,
+            }
+            if os.path.exists(path):
+                existing = _read(path)
+                if existing['scenario'] != scenario or existing['shard_size'] != shard_size or list(existing['axes']) != list(axes) \
+                        or any(not np.array_equal(existing['axes'][name], axes[name]) for name in axes):
+                    raise Exception(f'`{root}` holds a different sweep, use another directory...')
+                config = existing
+            else:
+                os.makedirs(os.path.join(root, 'claims'), exist_ok=True)
+                os.makedirs(os.path.join(root, 'done'), exist_ok=True)
+                _write_atomic(path, config)
+
+        self.scenario = config['scenario']
+        self.axes = config['axes']
+        self.names = list(self.axes)
+        self.shape = tuple(len(values) for values in self.axes.values())
+        self.shard_size = config['shard_size']
+        self.reducers = config['reducers']
+        self.queue_threshold = config['queue_threshold']
+        self.chunksize = config['chunksize']
+        self.n_points = int(np.prod(self.shape, dtype=np.int64))
+        self.n_shards = -(-self.n_points // self.shard_size)
+
+    def _claim_path(self, shard: int) -> str:
+        return os.path.join(self.root, 'claims', f'shard-{shard:06d}')
+
+    def _done_path(self, shard: int) -> str:
+        return os.path.join(self.root, 'done', f'shard-{shard:06d}.pkl')
+
+    def points(self, shard: int) -> tuple:
+        '''
+        Numbers and values (point, parameter) of the points of `shard`.
+        '''
+        start = shard * self.shard_size
+        positions = np.arange(start, min(start + self.shard_size, self.n_points))
+        indices = np.unravel_index(positions, self.shape)
+        return positions, np.column_stack([values[index] for values, index in zip(self.axes.values(), indices)])
+
+    def finished(self) -> list:
+        return sorted(int(name[6:12]) for name in os.listdir(os.path.join(self.root, 'done')) if name.endswith('.pkl'))
+
+    def missing(self) -> list:
+        finished = set(self.finished())
+        return [shard for shard in range(self.n_shards) if shard not in finished]
+
+    def claim(self, shard: int, worker: str, claim_timeout: float) -> bool:
+        '''
+        Claims `shard` for `worker` - fails if the shard is finished or claimed by another worker less than `claim_timeout` seconds ago.
+        '''
+        if os.path.exists(self._done_path(shard)):
+            return False
+        path = self._claim_path(shard)
+        try:
+            descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) < claim_timeout:
+                    return False
+                # Stale claim of a crashed worker - taken over (processing a shard twice gives the same result)
+                os.replace(path, f'{path}.{worker}.stale')
+                os.remove(f'{path}.{worker}.stale')
+                descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError:
+                return False
+        with os.fdopen(descriptor, 'w') as file:
+            file.write(worker)
+        return True
+
+    def run_shard(self, shard: int) -> dict:
+        '''
+        Simulates the points of `shard` and records its reducers durably - returns them.
+        '''
+        started = time.time()
+        reducers = copy.deepcopy(self.reducers)
+        positions, values = self.points(shard)
+        for start in range(0, len(values), self.chunksize):
+            chunk = values[start:start + self.chunksize]
+            fold(reducers, self.names, int(positions[start]), chunk, _simulate_metrics(self.scenario, self.names, chunk, self.queue_threshold))
+            # Heartbeat - a claim that is still being refreshed is not taken over
+            os.utime(self._claim_path(shard))
+        _write_atomic(self._done_path(shard), {'reducers': reducers, 'count': len(values), 'seconds': time.time() - started})
+        return reducers
+
+    def work(self, worker: str = None, max_shards: int = None, claim_timeout: float = 600) -> int:
+        '''
+        Worker loop - claims and processes missing shards until none is left (or `max_shards` are done), returns the number of processed shards.
+        Run it on any number of processes or machines sharing the sweep directory.
+        '''
+        worker = worker or f'{socket.gethostname()}-{os.getpid()}'
+        processed = 0
+        for shard in self.missing():
+            if max_shards is not None and processed >= max_shards:
+                break
+            if self.claim(shard, worker, claim_timeout):
+                self.run_shard(shard)
+                processed += 1
+        return processed
+
+    def status(self) -> dict:
+        '''
+        Progress of the sweep - finished shards and points.
+        '''
+        finished = self.finished()
+        points = sum(min(self.shard_size, self.n_points - shard * self.shard_size) for shard in finished)
+        return {'shards': len(finished), 'n_shards': self.n_shards, 'points': points, 'n_points': self.n_points}
+
+    def run(self, workers: int = None, interval: float = 5, claim_timeout: float = 600, report=None) -> dict:
+        '''
+        Processes all missing shards on `workers` local processes (all cores by default) and reports progress every `interval` seconds
+        - finished shards, throughput (scenarios/s) and ETA - by `report` (printed by default). Returns `result()`.
+        Workers started on other machines (see `work`) share the queue.
+        '''
+        from concurrent.futures import ProcessPoolExecutor, wait
+
+        report = report or (lambda line: print(line, file=sys.stderr, flush=True))
+        workers = workers or os.cpu_count()
+        initial = self.status()['points']
+        started = time.time()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_work, self.root, None, claim_timeout) for _ in range(workers)]
+            while True:
+                done, pending = wait(futures, timeout=interval)
+                status = self.status()
+                rate = (status['points'] - initial) / max(time.time() - started, 1e-9)
+                eta = (status['n_points'] - status['points']) / rate if rate > 0 else float('nan')
+                report(f'{status["shards"]}/{status["n_shards"]} shards, {status["points"]}/{status["n_points"]} scenarios, {rate:,.0f} scenarios/s, ETA {eta:,.0f} s')
+                if not pending:
+                    break
+            for future in done:
+                future.result()
+        return self.result()
+
+    def result(self) -> dict:
+        '''
+        Merged results of finished shards - {reducer name: result} as in `sweep.sweep`, with `count` of simulated points
+        and `complete` (False while some shards are missing).
+        '''
+        reducers = copy.deepcopy(self.reducers)
+        count = 0
+        for shard in self.finished():
+            recorded = _read(self._done_path(shard))
+            for name, reducer in reducers.items():
+                reducer.merge(recorded['reducers'][name])
+            count += recorded['count']
+        if count == 0:
+            raise Exception('No shard is finished yet...')
+        return {**{name: reducer.result() for name, reducer in reducers.items()}, 'count': count, 'complete': count == self.n_points}
+
+
+def _work(root: str, worker: str, claim_timeout: float) -> int:
+    return ShardedSweep(root).work(worker, claim_timeout=claim_timeout)
+
@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class QuantileSketch:
+    '''
+    Mergeable quantile summary of many cells (e.g. every year x column of a table) with bounded memory.
+
+    Each cell keeps at most `size` sorted points of equal weight - incoming values are buffered and, once the buffer is full,
+    merged with the summary and compressed back to `size` points placed at evenly spaced ranks. All cells receive
+    the same number of values, so they share the weights and the compression is done for all cells at once.
+    The rank error is about `1 / size` per compression; cells with fewer than `size` values are exact.
+    '''
+
+    def __init__(self, shape: tuple, size: int = 2000):
+        self.shape = tuple(shape)
+        self.size = size
+        self.count = 0
+        self.values = np.empty((0, int(np.prod(self.shape, dtype=int))))
+        self.weight = 1.
+        self._buffer = []
+        self._buffered = 0
+
+    def update(self, values: np.ndarray):
+        '''
+        Adds values (sample, *shape) - e.g. a chunk of simulated scenarios.
+        '''
+        values = np.asarray(values, dtype=float).reshape(-1, self.values.shape[1])
+        self._buffer.append(values)
+        self._buffered += len(values)
+        self.count += len(values)
+        if self._buffered >= self.size:
+            self._flush()
+
+    def merge(self, other: 'QuantileSketch'):
+        '''
+        Merges another sketch of the same shape (e.g. computed by another process) into this one.
+        '''
+        if other.shape != self.shape:
+            raise Exception('Only sketches of the same shape can be merged...')
+        other._flush()
+        self._flush()
+        self._combine(other.values, other.weight)
+        self.count += other.count
+
+    def quantiles(self, q) -> np.ndarray:
+        '''
+        Quantiles `q` (in 0-1) of every cell - returns array (len(q), *shape).
+        '''
+        self._flush()
+        if self.count == 0:
+            raise Exception('Sketch is empty...')
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        # Points of equal weight - rank of a point is its position within the cell
+        positions = np.clip(q * len(self.values) - 0.5, 0, len(self.values) - 1)
+        lower = np.floor(positions).astype(int)
+        upper = np.minimum(lower + 1, len(self.values) - 1)
+        fraction = (positions - lower)[:, np.newaxis]
+        result = self.values[lower] * (1 - fraction) + self.values[upper] * fraction
+        return result.reshape((len(q),) + self.shape)
+
+    def _flush(self):
+        if self._buffered:
+            values = np.concatenate(self._buffer)
+            self._buffer, self._buffered = [], 0
+            self._combine(values, 1.)
+
+    def _combine(self, values: np.ndarray, weight: float):
+        '''
+        Merges sorted or unsorted points of equal `weight` with the summary and compresses the result to `size` points.
+        '''
+        n_points = len(self.values) + len(values)
+        total = len(self.values) * self.weight + len(values) * weight
+        points = np.concatenate([self.values, values])
+        weights = np.concatenate([np.full(len(self.values), self.weight), np.full(len(values), weight)])
+        order = np.argsort(points, axis=0, kind='stable')
+        points = np.take_along_axis(points, order, axis=0)
+
+        if n_points <= self.size and weight == self.weight:
+            self.values = points
+            return
+
+        # Cumulative weights per cell, shifted by cell so that all cells are searched at once in one flat monotonic array
+        n_cells = points.shape[1]
+        cumulative = weights[order].cumsum(axis=0) + np.arange(n_cells) * total
+        targets = (np.arange(self.size) + 0.5) * (total / self.size)
+        found = np.searchsorted(cumulative.T.ravel(), (targets[:, np.newaxis] + np.arange(n_cells) * total).T.ravel())
+        rows = np.minimum(found.reshape(n_cells, self.size).T - np.arange(n_cells) * n_points, n_points - 1)
+
+        self.values = np.take_along_axis(points, rows, axis=0)
+        self.weight = total / self.size
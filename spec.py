@@ -0,0 +1,116 @@
+import os
+import copy
+import json
+
+import pandas as pd
+import numpy as np
+
+# Table parameters of `simulate_social_housing` - written in specs as {row: {column: value}}
+TABLES = ['relapse_rates', 'intervention_shares', 'hhs_inflow', 'social_assistences', 'intervention_costs', 'startup_coefficients', 'mop_housing_share', 'risk_transitions']
+# Series parameters - written as {label: value}
+SERIES = ['years_of_support']
+
+
+def read_file(path: str) -> dict:
+    '''
+    Reads a JSON or TOML file into a dict.
+    '''
+    if path.endswith('.toml'):
+        import tomllib
+        with open(path, 'rb') as file:
+            return tomllib.load(file)
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def merge(base: dict, overrides: dict) -> dict:
+    '''
+    Nested dicts `base` updated by `overrides` - tables are overridden cell by cell.
+    '''
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _label(label):
+    # Keys of JSON/TOML tables are strings - years (e.g. rows of `startup_coefficients`) are converted back to numbers
+    return int(label) if isinstance(label, str) and label.lstrip('-').isdigit() else label
+
+
+def to_parameters(values: dict) -> dict:
+    '''
+    Converts plain values of a spec (numbers, strings and nested dicts) into parameters of `simulate_social_housing`.
+
+    `years` is the number of simulated years (or the list of them) and tables are given as {row: {column: value}}.
+    '''
+    parameters = {}
+    for key, value in values.items():
+        if key in TABLES:
+            table = pd.DataFrame.from_dict({_label(row): {_label(col): v for col, v in columns.items()} for row, columns in value.items()}, orient='index')
+            parameters[key] = table.sort_index() if key == 'startup_coefficients' else table
+        elif key in SERIES:
+            parameters[key] = pd.Series({_label(label): v for label, v in value.items()})
+        elif key == 'years':
+            parameters[key] = np.arange(value) if isinstance(value, int) else np.asarray(value)
+        else:
+            parameters[key] = value
+    return parameters
+
+
+def flat_overrides(overrides: dict) -> dict:
+    '''
+    Converts flat parameter names (as in `Scenario.parameter_names`, e.g. `relapse_rates.high.municipal` or `years_of_support.municipal`)
+    into nested overrides accepted by `merge`.
+    '''
+    nested = {}
+    for name, value in overrides.items():
+        if isinstance(value, float) and np.isnan(value):
+            continue
+        keys = name.split('.')
+        target = nested
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value.item() if isinstance(value, np.generic) else value
+    return nested
+
+
+def read_variants_table(path: str, sheet=None) -> dict:
+    '''
+    Reads variants from a CSV or Excel sheet - one row per variant (variant name in the first column), columns are flat parameter names
+    (see `flat_overrides`), empty cells keep the base value.
+    '''
+    if path.endswith('.csv'):
+        table = pd.read_csv(path, index_col=0)
+    else:
+        table = pd.read_excel(path, sheet_name=sheet or 0, index_col=0)
+    return {str(name): flat_overrides(row.to_dict()) for name, row in table.iterrows()}
+
+
+def load_spec(path: str) -> dict:
+    '''
+    Loads a scenario spec (JSON or TOML) - returns {variant name: parameters of `simulate_social_housing`}.
+
+    A spec has `base` parameters and `variants` {variant name: overrides of the base} (nested as the base, or flat parameter names),
+    optionally `variants_table` - path (relative to the spec) of a CSV/Excel sheet with further variants (see `read_variants_table`)
+    and `variants_sheet`. The title of a variant defaults to its name and must be unique (result tables are labelled by titles).
+    A spec without variants is a single variant `base`.
+    '''
+    spec = read_file(path)
+    base = spec.get('base', {})
+    variants = {name: flat_overrides(overrides) for name, overrides in spec.get('variants', {}).items()}
+    if 'variants_table' in spec:
+        table_path = os.path.join(os.path.dirname(os.path.abspath(path)), spec['variants_table'])
+        variants.update(read_variants_table(table_path, spec.get('variants_sheet')))
+    if not variants:
+        variants = {'base': {}}
+
+    parameters = {name: to_parameters(merge({'title': name, **base}, overrides)) for name, overrides in variants.items()}
+    titles = pd.Series({name: p['title'] for name, p in parameters.items()})
+    duplicated = titles[titles.duplicated(keep=False)]
+    if len(duplicated):
+        raise Exception(f'Variants {list(duplicated.index)} share titles {list(duplicated.unique())}, titles of variants must be unique...')
+    return parameters
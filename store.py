@@ -0,0 +1,260 @@
+import json
+import sqlite3
+
+import pandas as pd
+import numpy as np
+
+from scenario import Scenario
+
+# Output tables stored by default - any table of `simulate_social_housing` indexed by `rok` (and `cohort_age`) can be stored
+TABLES = ['costs', 'costs_discounted', 'hhs', 'interventions']
+OPERATORS = ['=', '!=', '<', '<=', '>', '>=', 'in', 'between']
+
+
+def _quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _flat(column) -> str:
+    # Columns of output tables (MultiIndex e.g. (hh_status, hh_risk)) are stored as `queue.high`, dots and backslashes
+    # inside labels are escaped by a backslash so that distinct columns never share a name (labels are kept in table meta)
+    if not isinstance(column, tuple):
+        return str(column)
+    return '.'.join(str(label).replace('\\', '\\\\').replace('.', '\\.') for label in column)
+
+
+def flat_parameters(scenario: Scenario) -> dict:
+    '''
+    Scalar inputs of `scenario` by flat parameter names (see `Scenario.parameter_names`) and `years_of_support.<intervention_type>`.
+    '''
+    names = scenario.parameter_names()
+    parameters = dict(zip(names, scenario.parameter_values(names).tolist()))
+    for it, years in zip(scenario.dimensions.intervention_types, scenario.arrays['years_of_support']):
+        parameters[f'years_of_support.{it}'] = int(years)
+    return parameters
+
+
+class ResultsStore:
+    '''
+    Persistent store of outputs of `simulate_social_housing` in a SQLite file `path`.
+
+    * table `scenarios` - one row per scenario: `id`, unique `name`, `title`, `key` (see `Scenario.key`), total discounted costs `npv`
+      and one indexed column per flat input parameter (see `flat_parameters`), e.g. `relapse_rates.high.municipal`
+    * one table per output (`TABLES` by default) keyed by (`scenario_id`, `rok`[, `cohort_age`]) with flattened columns, e.g. `queue.high`
+
+    Queries (`scenarios`, `read`, `iter_read`) filter scenarios by `where` {column of `scenarios`: condition} inside SQLite,
+    only matching rows are loaded. A condition is a value (equality) or a tuple (operator, value) with operators `OPERATORS`, e.g.
+
+        store.read('costs', where={'relapse_rates.high.municipal': ('<', 0.3), 'npv': ('<', 40e9)})
+    '''
+
+    def __init__(self, path: str, tables: list = None):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS scenarios (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, title TEXT, key TEXT, npv REAL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS scenarios_npv ON scenarios (npv)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS scenarios_key ON scenarios (key)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS output_tables (name TEXT PRIMARY KEY, meta TEXT NOT NULL)')
+        self.connection.commit()
+        self.tables = tables or TABLES
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _columns(self, table: str) -> list:
+        return [row[1] for row in self.connection.execute(f'PRAGMA table_info({_quote(table)})')]
+
+    def _meta(self) -> dict:
+        return {name: json.loads(meta) for name, meta in self.connection.execute('SELECT name, meta FROM output_tables')}
+
+    def parameter_columns(self) -> list:
+        '''
+        Names of parameter columns of the `scenarios` table.
+        '''
+        return [col for col in self._columns('scenarios') if col not in ['id', 'name', 'title', 'key', 'npv']]
+
+    def _ensure_parameters(self, names: list):
+        existing = set(self._columns('scenarios'))
+        for name in names:
+            if name not in existing:
+                self.connection.execute(f'ALTER TABLE scenarios ADD COLUMN {_quote(name)} REAL')
+                self.connection.execute(f'CREATE INDEX {_quote("scenarios_" + name)} ON scenarios ({_quote(name)})')
+
+    def _ensure_table(self, table: str, frame: pd.DataFrame):
+        meta = self._meta().get(table)
+        index_names = [name for name in frame.index.names if name != 'scenario']
+        columns = [_flat(col) for col in frame.columns]
+        if meta is None:
+            keys = ', '.join(f'{_quote(name)} INTEGER NOT NULL' for name in ['scenario_id'] + index_names)
+            values = ', '.join(f'{_quote(col)} REAL' for col in columns)
+            primary = ', '.join(map(_quote, ['scenario_id'] + index_names))
+            self.connection.execute(f'CREATE TABLE {_quote(table)} ({keys}, {values}, PRIMARY KEY ({primary})) WITHOUT ROWID')
+            meta = {'index': index_names, 'column_names': list(frame.columns.names), 'columns': columns, 'labels': {}}
+        elif meta['index'] != index_names:
+            raise Exception(f'Table `{table}` is stored with index {meta["index"]}, got {index_names}...')
+
+        for col, labels in zip(columns, frame.columns):
+            if col not in meta['columns']:
+                self.connection.execute(f'ALTER TABLE {_quote(table)} ADD COLUMN {_quote(col)} REAL')
+                meta['columns'].append(col)
+            if isinstance(labels, tuple):
+                meta['labels'][col] = list(map(str, labels))
+        self.connection.execute('INSERT OR REPLACE INTO output_tables VALUES (?, ?)', (table, json.dumps(meta)))
+
+    def _delete(self, ids: list):
+        marks = ', '.join('?' * len(ids))
+        for table in self._meta():
+            self.connection.execute(f'DELETE FROM {_quote(table)} WHERE scenario_id IN ({marks})', ids)
+        self.connection.execute(f'DELETE FROM scenarios WHERE id IN ({marks})', ids)
+
+    def _insert(self, names: list, scenarios: list, outputs: dict):
+        '''
+        Inserts scenarios `names` with batched `outputs` (tables indexed by (scenario, ...), see `simulate_social_housing_batch`).
+        '''
+        parameters = [flat_parameters(scenario) for scenario in scenarios]
+        parameter_names = list(dict.fromkeys(name for p in parameters for name in p))
+        self._ensure_parameters(parameter_names)
+
+        previous = [row[0] for name in names for row in self.connection.execute('SELECT id FROM scenarios WHERE name = ?', (name,))]
+        if previous:
+            self._delete(previous)
+
+        npv = outputs['costs_discounted'].groupby(level='scenario', sort=False).sum().sum(axis=1)
+        columns = ['name', 'title', 'key', 'npv'] + parameter_names
+        statement = f'INSERT INTO scenarios ({", ".join(map(_quote, columns))}) VALUES ({", ".join("?" * len(columns))})'
+        ids = {}
+        for name, scenario, values in zip(names, scenarios, parameters):
+            cursor = self.connection.execute(statement, [name, scenario.title, scenario.key, float(npv[name])] + [values.get(p) for p in parameter_names])
+            ids[name] = cursor.lastrowid
+
+        for table in self.tables:
+            frame = outputs[table]
+            self._ensure_table(table, frame)
+            index = frame.index.to_frame(index=False)
+            index['scenario'] = index['scenario'].map(ids)
+            keys = ['scenario_id'] + list(index.columns[1:])
+            columns = keys + [_flat(col) for col in frame.columns]
+            rows = [[int(v) for v in key] + values for key, values in zip(index.to_numpy(dtype=np.int64).tolist(), frame.to_numpy(dtype=float).tolist())]
+            self.connection.executemany(f'INSERT INTO {_quote(table)} ({", ".join(map(_quote, columns))}) VALUES ({", ".join("?" * len(columns))})', rows)
+
+    def add(self, name: str, parameters: dict, outputs: dict = None):
+        '''
+        Stores scenario `name` with `parameters` of `simulate_social_housing` and its `outputs` (simulated if not given).
+        A scenario stored before under the same name is replaced.
+        '''
+        scenario = Scenario.from_dict({'title': name, **parameters})
+        if outputs is None:
+            self._simulate_insert([str(name)], [scenario])
+            return
+        batched = {table: pd.concat({name: outputs[table]}, names=['scenario']) for table in set(self.tables) | {'costs_discounted'}}
+        with self.connection:
+            self._insert([name], [scenario], batched)
+
+    def _simulate_insert(self, names: list, scenarios: list):
+        '''
+        Simulates compiled `scenarios` as one batch (see `simulate_social_housing_batch`) and stores them as `names` at once.
+        '''
+        from batch import simulate_social_housing_batch
+
+        outputs = simulate_social_housing_batch(dict(zip(names, scenarios)))
+        # Age structure of each variant only up to its longest support (as in `simulate_social_housing`)
+        if 'cohorts' in self.tables:
+            support = pd.Series([int(s.arrays['years_of_support'].max()) for s in scenarios], index=names)
+            cohorts = outputs['cohorts']
+            outputs['cohorts'] = cohorts[cohorts.index.get_level_values('cohort_age') < support.reindex(cohorts.index.get_level_values('scenario')).to_numpy()]
+        with self.connection:
+            self._insert(names, scenarios, outputs)
+
+    def add_variants(self, variants, chunksize: int = 200):
+        '''
+        Simulates and stores `variants` ({name: parameters} or an iterable of (name, parameters)) - chunks of `chunksize` variants
+        are simulated as one batch (see `simulate_social_housing_batch`) and committed at once. All variants of a chunk must share `years`.
+        '''
+        items = iter(variants.items() if isinstance(variants, dict) else variants)
+        while True:
+            chunk = [item for _, item in zip(range(chunksize), items)]
+            if not chunk:
+                break
+            names = [str(name) for name, _ in chunk]
+            scenarios = [Scenario.from_dict({'title': name, **parameters}) for name, parameters in chunk]
+            self._simulate_insert(names, scenarios)
+
+    def _where(self, where: dict) -> tuple:
+        '''
+        SQL condition on table `scenarios` (aliased `s`) and its parameters.
+        '''
+        if not where:
+            return '1', []
+        columns = set(self._columns('scenarios'))
+        clauses, values = [], []
+        for column, condition in where.items():
+            if column not in columns:
+                raise Exception(f'Unknown column `{column}`, use `name`, `title`, `npv` or one of `parameter_columns()`...')
+            operator, value = condition if isinstance(condition, tuple) else ('=', condition)
+            if operator not in OPERATORS:
+                raise Exception(f'Unknown operator `{operator}`, use one of {OPERATORS}...')
+            if operator == 'in':
+                value = list(value)
+                clauses.append(f's.{_quote(column)} IN ({", ".join("?" * len(value))})')
+                values += value
+            elif operator == 'between':
+                clauses.append(f's.{_quote(column)} BETWEEN ? AND ?')
+                values += list(value)
+            else:
+                clauses.append(f's.{_quote(column)} {operator} ?')
+                values.append(value)
+        return ' AND '.join(clauses), values
+
+    def scenarios(self, where: dict = None, columns: list = None) -> pd.DataFrame:
+        '''
+        Stored scenarios matching `where` (all by default) indexed by name - `title`, `npv` and parameter `columns` (all by default).
+        '''
+        columns = ['name', 'title', 'key', 'npv'] + (self.parameter_columns() if columns is None else [c for c in columns if c not in ['name', 'title', 'key', 'npv']])
+        condition, values = self._where(where)
+        selected = ', '.join(f's.{_quote(col)}' for col in columns)
+        return pd.read_sql_query(f'SELECT {selected} FROM scenarios s WHERE {condition} ORDER BY s.id', self.connection, params=values).set_index('name')
+
+    def _labelled(self, frame: pd.DataFrame, meta: dict) -> pd.DataFrame:
+        frame = frame.set_index(['scenario'] + meta['index'])
+        if len(meta['column_names']) > 1:
+            frame.columns = pd.MultiIndex.from_tuples([tuple(meta['labels'][col]) for col in frame.columns], names=meta['column_names'])
+        else:
+            frame.columns.name = meta['column_names'][0]
+        return frame
+
+    def _query(self, table: str, where: dict) -> tuple:
+        meta = self._meta().get(table)
+        if meta is None:
+            raise Exception(f'Table `{table}` is not stored, stored tables are {list(self._meta())}...')
+        condition, values = self._where(where)
+        keys = ', '.join(f'o.{_quote(name)}' for name in meta['index'])
+        selected = ', '.join(f'o.{_quote(col)}' for col in meta['columns'])
+        query = (
+            f'SELECT s.name AS scenario, {keys}, {selected} FROM {_quote(table)} o JOIN scenarios s ON s.id = o.scenario_id '
+            f'WHERE {condition} ORDER BY o.scenario_id, {keys}'
+        )
+        return query, values, meta
+
+    def iter_read(self, table: str, where: dict = None, chunksize: int = 100000):
+        '''
+        Yields output `table` of scenarios matching `where` indexed by (scenario, rok[, cohort_age]) in chunks of `chunksize` rows.
+        '''
+        query, values, meta = self._query(table, where)
+        for frame in pd.read_sql_query(query, self.connection, params=values, chunksize=chunksize):
+            yield self._labelled(frame, meta)
+
+    def read(self, table: str, where: dict = None) -> pd.DataFrame:
+        '''
+        Output `table` (e.g. `costs`, `hhs` or `interventions`) of scenarios matching `where` indexed by (scenario, rok[, cohort_age]).
+        '''
+        query, values, meta = self._query(table, where)
+        return self._labelled(pd.read_sql_query(query, self.connection, params=values), meta)
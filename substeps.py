@@ -0,0 +1,180 @@
+import pandas as pd
+import numpy as np
+
+from scenario import Scenario, STARTUP_TYPES
+from constants import APARTMENT_TYPES
+from supply import simulate_apartment_inflow_arrays
+from batch import run_stacked, label_results
+import engine
+import costing
+
+# Named time steps - number of steps per year
+STEPS = {'year': 1, 'quarter': 4, 'month': 12}
+
+# Columns of `costs_units` that are stocks (households or apartments at a moment) - averaged over the steps of a year, other units are flows summed
+STOCK_UNITS = ['apartments_yearly_guaranteed', 'apartments_yearly_municipal', 'social_assistance', 'queue']
+
+
+def steps_per_year(steps) -> int:
+    '''
+    Number of steps per year of `steps` - a name of `STEPS` or a positive whole number.
+    '''
+    if isinstance(steps, str):
+        if steps not in STEPS:
+            raise Exception(f'Unknown time step `{steps}`, use one of {list(STEPS)} or a number of steps per year...')
+        return STEPS[steps]
+    if steps < 1 or steps % 1 != 0:
+        raise Exception('Number of steps per year must be a whole number (at least 1)...')
+    return int(steps)
+
+
+def step_coefficients(startup_coefficients: pd.DataFrame, n_years: int, k: int) -> pd.DataFrame:
+    '''
+    Startup coefficients expanded to steps (step x startup type) - `startup_coefficients` are indexed by times in years (0, 0.25, 0.5, ...),
+    each coefficient holds from its time until the next one within the same year. Years (and types) without a coefficient get 1,
+    so yearly coefficients apply to all steps of their year.
+    '''
+    positions = np.asarray(startup_coefficients.index, dtype=float) * k
+    if (np.abs(positions - np.rint(positions)) > 1e-9).any():
+        raise Exception(f'Startup coefficients can only be given at the start of steps (multiples of 1/{k} year)...')
+    table = startup_coefficients.fillna(1).set_axis(np.rint(positions).astype(int))
+    if not table.index.isin(range(n_years * k)).all():
+        raise Exception('`startup_coefficients` can only contain simulated years...')
+
+    steps = pd.RangeIndex(n_years * k)
+    return table.reindex(steps).groupby(steps // k).ffill().fillna(1)
+
+
+def to_step_shares(shares: np.ndarray, groups: np.ndarray, n_groups: int, k: int) -> np.ndarray:
+    '''
+    Converts yearly shares (..., share) into shares per step of 1/k year - shares of one group (`groups` of the last axis) are competing
+    exits of the same households, their total converts as a probability (1 - (1 - total) ** (1/k)) and is split in the original proportions.
+    '''
+    if k == 1:
+        return shares
+    totals = np.zeros(shares.shape[:-1] + (n_groups,))
+    np.add.at(totals, (..., groups), shares)
+    totals = np.minimum(totals, 1)[..., groups]
+    step_totals = 1 - (1 - totals) ** (1 / k)
+    return np.divide(shares * step_totals, totals, out=np.zeros_like(shares), where=totals > 0)
+
+
+def to_steps(scenario: Scenario, k: int, startup_coefficients: pd.DataFrame = None) -> tuple:
+    '''
+    Converts `scenario` into arrays of a simulation with `k` steps per year (as `batch.stack_scenarios`, stacked with one scenario):
+        * `years_of_support` and years of social assistance and of apartment costs are counted in steps
+        * yearly shares (interventions, risk transitions) convert to probabilities per step, relapse rates (per ended intervention) are kept
+        * inflow of households and of apartments is spread evenly over the steps of a year
+        * yearly prices are split among steps, one-off prices stay in the first step, discounting compounds per step
+
+    `startup_coefficients` (see `step_coefficients`) replace the startup coefficients of the scenario, e.g. to ramp up within a year.
+    With `k` = 1 and no `startup_coefficients` the arrays of the scenario are returned as they are.
+    '''
+    dimensions = scenario.dimensions
+    n_years = len(scenario.years)
+    n_steps = n_years * k
+    arrays = {key: np.array(value) for key, value in scenario.arrays.items()}
+    cost_arrays = {key: np.array(value) for key, value in scenario.cost_arrays.items()}
+
+    if startup_coefficients is not None:
+        unknown = [it for it in startup_coefficients.columns if it not in STARTUP_TYPES]
+        if unknown:
+            raise Exception(f'`startup_coefficients` can only contain {STARTUP_TYPES}...')
+        coefficients = step_coefficients(startup_coefficients, n_years, k)
+        supply_startup = coefficients.reindex(columns=APARTMENT_TYPES).fillna(1).to_numpy(dtype=float)
+        share_coefficients = engine.share_coefficients(coefficients, np.arange(n_steps), dimensions)
+    elif k > 1:
+        supply_startup = np.repeat(scenario.supply_startup, k, axis=0)
+        share_coefficients = np.repeat(scenario.share_coefficients, k, axis=0)
+
+    if startup_coefficients is not None or k > 1:
+        # Apartments entering the system in every year without startup, spread evenly over its steps (whole apartments in the stock as in `supply`)
+        inflow = simulate_apartment_inflow_arrays(startup=1., years=scenario.years, **scenario.supply)[0]
+        arrays['apartments'] = (np.repeat(inflow / k, k, axis=0) * supply_startup).cumsum(axis=0).astype(int)
+
+        shares = engine.expand_shares(scenario.shares, share_coefficients)
+        soft_types = arrays['soft_types']
+        arrays['shares'] = np.zeros_like(shares)
+        arrays['shares'][:, soft_types] = np.swapaxes(to_step_shares(np.swapaxes(shares[:, soft_types], 1, 2), np.zeros(len(soft_types), dtype=int), 1, k), 1, 2)
+
+    if k > 1:
+        arrays['yearly_growth'] = arrays['yearly_growth'] / k
+        arrays['years_of_support'] = arrays['years_of_support'] * k
+        arrays['transitions'] = to_step_shares(arrays['transitions'], dimensions.sources, len(dimensions.hh_risks), k)
+
+        cost_arrays['apartment_years'] = cost_arrays['apartment_years'] * k
+        cost_arrays['assistance_years'] = cost_arrays['assistance_years'] * k
+        yearly_units = [col in costing.UNIT_PRICES and costing.UNIT_PRICES[col][1][0] == 'yearly' for col in costing.COSTS]
+        cost_arrays['unit_price'] = np.where(yearly_units, cost_arrays['unit_price'] / k, cost_arrays['unit_price'])
+        cost_arrays['yearly_price'] = cost_arrays['yearly_price'] / k
+        cost_arrays['discount_rate'] = (1 + cost_arrays['discount_rate']) ** (1 / k) - 1
+
+    stacked = {key: value[np.newaxis] for key, value in arrays.items() if key != 'soft_types'}
+    stacked['soft_types'] = arrays['soft_types']
+    stacked['dimensions'] = dimensions
+    return np.arange(n_steps), stacked, {key: np.asarray(value)[np.newaxis] for key, value in cost_arrays.items()}
+
+
+def to_years(results: dict, k: int) -> dict:
+    '''
+    Aggregates results of a simulation with `k` steps per year (see `batch.run_stacked`) into years - flows (interventions, returnees, costs)
+    are summed, states (households, apartments, cohorts) are taken at the end of the year and stock units of costs (`STOCK_UNITS`,
+    `social_assistence_breakdown`) are averaged over the year, so that yearly costs are the units times yearly prices.
+    Cohort ages are counted in whole years.
+    '''
+    if k == 1:
+        return results
+
+    def by_year(values):
+        return values.reshape(values.shape[:1] + (-1, k) + values.shape[2:])
+
+    returnees = by_year(results['returnees'])
+    known = ~np.isnan(returnees).all(axis=2)
+    cohorts = results['cohorts'][:, k - 1::k]
+    n_ages = -(-cohorts.shape[2] // k)
+    cohorts = np.pad(cohorts, [(0, 0), (0, 0), (0, n_ages * k - cohorts.shape[2])] + [(0, 0)] * (cohorts.ndim - 3))
+    stocks = [costing.COST_UNITS.index(unit) for unit in STOCK_UNITS]
+    units = by_year(results['costs_units']).sum(axis=2)
+    units[..., stocks] = by_year(results['costs_units'][..., stocks]).mean(axis=2)
+
+    return {
+        'interventions': by_year(results['interventions']).sum(axis=2),
+        'hhs': results['hhs'][:, k - 1::k],
+        'returnees': np.where(known, np.nansum(returnees, axis=2), np.nan),
+        'apartments_assigned': results['apartments_assigned'][:, k - 1::k],
+        'apartments_available': results['apartments_available'][:, k - 1::k],
+        'cohorts': cohorts.reshape(cohorts.shape[:2] + (n_ages, k) + cohorts.shape[3:]).sum(axis=3),
+        'costs': by_year(results['costs']).sum(axis=2),
+        'costs_units': units,
+        'costs_discounted': by_year(results['costs_discounted']).sum(axis=2),
+        'social_assistence_breakdown': by_year(results['social_assistence_breakdown']).mean(axis=2),
+        'npv': results['npv'],
+    }
+
+
+def simulate_substeps(scenario, steps='month', startup_coefficients: pd.DataFrame = None, aggregate: bool = True) -> dict:
+    '''
+    Simulates `scenario` (`Scenario` or dict of `simulate_social_housing` parameters) with sub-annual time steps - `steps` is a name
+    of `STEPS` or a number of steps per year. Parameters are converted to steps by `to_steps` (`startup_coefficients` given at times
+    within years model ramps within a year, see `step_coefficients`) and all steps run in one pass of the array engine.
+
+    Returns the tables of `simulate_social_housing` and `npv` - aggregated into years `rok` (see `to_years`), or with `aggregate=False`
+    for every step, indexed by (rok, step) and with cohort ages in steps.
+    '''
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    k = steps_per_year(steps)
+
+    # Supports last several steps - households keep their statuses in steps before any intervention can end
+    results = run_stacked(*to_steps(scenario, k, startup_coefficients), hold_states=True)
+    titles = [scenario.title]
+    if aggregate:
+        return label_results(to_years(results, k), ids=None, years=scenario.years, base_year=scenario.base_year, titles=titles, dimensions=scenario.dimensions)
+
+    outputs = label_results(results, ids=None, years=np.arange(len(scenario.years) * k), base_year=0, titles=titles, dimensions=scenario.dimensions)
+    for name, table in outputs.items():
+        if isinstance(table, pd.DataFrame) and table.index.names[0] == 'rok':
+            step = table.index.get_level_values(0).to_numpy()
+            levels = [step // k + scenario.base_year, step % k] + [table.index.get_level_values(level) for level in range(1, table.index.nlevels)]
+            table.index = pd.MultiIndex.from_arrays(levels, names=['rok', 'step'] + table.index.names[1:])
+    return outputs
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
-import pdb
+
+from constants import APARTMENT_TYPES
 
 def simulate_guaranteed(
         guaranteed_yearly_apartments: int,
@@ -81,3 +82,72 @@ def simulate_apartment_stock(
     
     return apartments.sort_index(axis=1).astype(int)
 
+
+
+def startup_array(startup_coefficients: pd.DataFrame, years: np.ndarray) -> np.ndarray:
+    '''
+    Expands startup coefficients of apartments into (year, apartment_type) array - years without a coefficient get 1.
+    '''
+    return startup_coefficients.reindex(index=years, columns=APARTMENT_TYPES).fillna(1).to_numpy(dtype=float)
+
+def simulate_apartment_inflow_arrays(
+        guaranteed_yearly_apartments,
+        municipal_apartments_today,
+        municipal_yearly_new_apartments,
+        municipal_existing_availability_rate,
+        municipal_new_availability_rate,
+        startup,
+        years
+    ) -> np.ndarray:
+    '''
+    Apartments entering the social housing system in each year - np.ndarray (scenario, year, apartment_type), parameters as in `simulate_apartment_stock_arrays`.
+    '''
+    years = np.asarray(years)
+    guaranteed_yearly_apartments, municipal_apartments_today, municipal_yearly_new_apartments, municipal_existing_availability_rate, municipal_new_availability_rate = (
+        np.atleast_1d(parameter)[:, np.newaxis] for parameter in np.broadcast_arrays(
+            guaranteed_yearly_apartments,
+            municipal_apartments_today,
+            municipal_yearly_new_apartments,
+            municipal_existing_availability_rate,
+            municipal_new_availability_rate,
+        )
+    )
+    startup = np.broadcast_to(startup, (len(guaranteed_yearly_apartments), len(years), len(APARTMENT_TYPES)))
+    
+    # Guaranteed apartments - constant yearly inflow
+    guaranteed = np.broadcast_to(guaranteed_yearly_apartments, startup.shape[:2]) * startup[..., 0]
+    
+    # Municipal apartments - share of the existing stock (as of the previous year) and of the new apartments 
+    municipal_stock = municipal_apartments_today + municipal_yearly_new_apartments * (years - 1)
+    existing_stock = np.concatenate([municipal_stock[:, :1], municipal_stock[:, :-1]], axis=1) * municipal_existing_availability_rate
+    municipal = (existing_stock + municipal_yearly_new_apartments * municipal_new_availability_rate) * startup[..., 1]
+    
+    return np.stack([guaranteed, municipal], axis=2)
+
+
+def simulate_apartment_stock_arrays(
+        guaranteed_yearly_apartments,
+        municipal_apartments_today,
+        municipal_yearly_new_apartments,
+        municipal_existing_availability_rate,
+        municipal_new_availability_rate,
+        startup,
+        years
+    ) -> np.ndarray:
+    '''
+    Vectorized counterpart of `simulate_apartment_stock` for any number of scenarios at once.
+    
+    Parameters are scalars or arrays with one value per scenario, `startup` is an array broadcastable to (scenario, year, apartment_type) (see `startup_array`).
+    
+    Returns: np.ndarray (scenario, year, apartment_type) with the total number of apartments that ever entered the social housing system 
+    (apartment types ordered as in `APARTMENT_TYPES`), equal to `simulate_apartment_stock` of each scenario.
+    '''
+    return simulate_apartment_inflow_arrays(
+        guaranteed_yearly_apartments=guaranteed_yearly_apartments,
+        municipal_apartments_today=municipal_apartments_today,
+        municipal_yearly_new_apartments=municipal_yearly_new_apartments,
+        municipal_existing_availability_rate=municipal_existing_availability_rate,
+        municipal_new_availability_rate=municipal_new_availability_rate,
+        startup=startup,
+        years=years,
+    ).cumsum(axis=1).astype(int)
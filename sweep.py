@@ -0,0 +1,317 @@
+import os
+import itertools
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+import numpy as np
+
+from scenario import Scenario
+from sketch import QuantileSketch
+from batch import run_stacked
+import costing
+
+# Households in queue (all risk groups) - a unit of costs, independent of the categories of the scenario
+QUEUE = costing.COST_UNITS.index('queue')
+ENTRIES = [costing.COST_UNITS.index(f'apartments_entry_{at}') for at in costing.APARTMENT_TYPES]
+
+# Columns of the metrics every simulated point is reduced to (see `summarize`)
+METRICS = {
+    'npv': costing.COSTS + ['total'],
+    'peak_queue': ['households', 'rok'],
+    'final_queue': ['households'],
+    'queue_below': ['rok'],
+    'apartment_entries': costing.APARTMENT_TYPES + ['total'],
+}
+
+
+def summarize(scenario: Scenario, results: dict, queue_threshold: float = 0) -> dict:
+    '''
+    Reduces results of `batch.run_stacked` to metrics {metric: array (scenario, column)} (see `METRICS`):
+     * `npv` - total discounted costs by cost line and `total`
+     * `peak_queue` - the largest number of households in queue and the year (rok) it is reached
+     * `final_queue` - households in queue in the last year
+     * `queue_below` - the first year (rok) the queue falls below `queue_threshold` (nan if never)
+     * `apartment_entries` - households entering apartments over the whole horizon by apartment type and `total`
+    '''
+    rok = scenario.years + scenario.base_year
+    queue = results['costs_units'][:, :, QUEUE]
+    peak = queue.argmax(axis=1)
+    below = queue < queue_threshold
+    entries = results['costs_units'][:, :, ENTRIES].sum(axis=1)
+    return {
+        'npv': np.concatenate([results['npv'], results['npv'].sum(axis=1, keepdims=True)], axis=1),
+        'peak_queue': np.column_stack([queue.max(axis=1), rok[peak]]),
+        'final_queue': queue[:, -1:],
+        'queue_below': np.where(below.any(axis=1), rok[below.argmax(axis=1)], np.nan)[:, np.newaxis],
+        'apartment_entries': np.concatenate([entries, entries.sum(axis=1, keepdims=True)], axis=1),
+    }
+
+
+class Reducer(ABC):
+    '''
+    Online reduction of one metric (see `METRICS`) over all points of a sweep - `update` folds a chunk of points,
+    `merge` combines reducers of the same kind (e.g. from different shards) and `result` returns the labelled aggregate.
+    '''
+
+    def __init__(self, metric: str):
+        if metric not in METRICS:
+            raise Exception(f'Unknown metric `{metric}`, use one of {list(METRICS)}...')
+        self.metric = metric
+        self.columns = METRICS[metric]
+
+    @abstractmethod
+    def update(self, values: np.ndarray, points: pd.DataFrame):
+        pass
+
+    @abstractmethod
+    def merge(self, other: 'Reducer'):
+        pass
+
+    @abstractmethod
+    def result(self):
+        pass
+
+
+class Moments(Reducer):
+    '''
+    Count, mean, standard deviation and sum of every column (nan values are skipped) - merged by the parallel variance formula.
+    '''
+
+    def __init__(self, metric: str):
+        super().__init__(metric)
+        self.count = np.zeros(len(self.columns))
+        self.mean = np.zeros(len(self.columns))
+        self.m2 = np.zeros(len(self.columns))
+
+    def _combine(self, count, mean, m2):
+        total = self.count + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * count / total, 0)
+            self.m2 = np.where(total > 0, self.m2 + m2 + delta ** 2 * self.count * count / total, 0)
+        self.count = total
+
+    def update(self, values: np.ndarray, points: pd.DataFrame):
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, np.where(valid, values, 0).sum(axis=0) / count, 0)
+        m2 = np.where(valid, values - mean, 0) ** 2
+        self._combine(count, mean, m2.sum(axis=0))
+
+    def merge(self, other: 'Moments'):
+        self._combine(other.count, other.mean, other.m2)
+
+    def result(self) -> pd.DataFrame:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sd = np.sqrt(self.m2 / (self.count - 1))
+        return pd.DataFrame({'count': self.count, 'mean': self.mean, 'sd': sd, 'sum': self.mean * self.count}, index=self.columns)
+
+
+class Extremes(Reducer):
+    '''
+    Minimum and maximum of every column and the positions (in the sweep) of the points where they are reached.
+    '''
+
+    def __init__(self, metric: str):
+        super().__init__(metric)
+        self.min = np.full(len(self.columns), np.inf)
+        self.max = np.full(len(self.columns), -np.inf)
+        self.argmin = np.full(len(self.columns), -1)
+        self.argmax = np.full(len(self.columns), -1)
+
+    def _combine(self, low, high, argmin, argmax):
+        lower = low < self.min
+        higher = high > self.max
+        self.min, self.argmin = np.where(lower, low, self.min), np.where(lower, argmin, self.argmin)
+        self.max, self.argmax = np.where(higher, high, self.max), np.where(higher, argmax, self.argmax)
+
+    def update(self, values: np.ndarray, points: pd.DataFrame):
+        positions = points.index.to_numpy()
+        low = np.where(np.isnan(values), np.inf, values)
+        high = np.where(np.isnan(values), -np.inf, values)
+        self._combine(low.min(axis=0), high.max(axis=0), positions[low.argmin(axis=0)], positions[high.argmax(axis=0)])
+
+    def merge(self, other: 'Extremes'):
+        self._combine(other.min, other.max, other.argmin, other.argmax)
+
+    def result(self) -> pd.DataFrame:
+        return pd.DataFrame({'min': self.min, 'argmin': self.argmin, 'max': self.max, 'argmax': self.argmax}, index=self.columns)
+
+
+class Quantiles(Reducer):
+    '''
+    Quantiles `q` (in 0-1) of every column from a running sketch with `size` points (see `sketch.QuantileSketch`).
+    '''
+
+    def __init__(self, metric: str, q=(0.05, 0.25, 0.5, 0.75, 0.95), size: int = 2000):
+        super().__init__(metric)
+        self.q = list(q)
+        self.sketch = QuantileSketch((len(self.columns),), size)
+
+    def update(self, values: np.ndarray, points: pd.DataFrame):
+        self.sketch.update(values)
+
+    def merge(self, other: 'Quantiles'):
+        self.sketch.merge(other.sketch)
+
+    def result(self) -> pd.DataFrame:
+        return pd.DataFrame(self.sketch.quantiles(self.q), index=pd.Index(self.q, name='quantile'), columns=self.columns)
+
+
+class Counts(Reducer):
+    '''
+    Number of points by value of `column` - for discrete metrics, e.g. the year the queue falls below the threshold (nan = never).
+    '''
+
+    def __init__(self, metric: str, column: str = None):
+        super().__init__(metric)
+        self.column = column or self.columns[0]
+        self.counts = {}
+        self.missing = 0
+
+    def update(self, values: np.ndarray, points: pd.DataFrame):
+        values = values[:, self.columns.index(self.column)]
+        missing = np.isnan(values)
+        self.missing += int(missing.sum())
+        keys, counts = np.unique(values[~missing], return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def merge(self, other: 'Counts'):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.missing += other.missing
+
+    def result(self) -> pd.Series:
+        keys = sorted(self.counts)
+        return pd.Series([self.counts[key] for key in keys] + [self.missing], index=pd.Index(keys + [np.nan], name=self.column), name='count')
+
+
+class TopK(Reducer):
+    '''
+    The `k` points with the lowest (or `largest`) value of `column`, e.g. the cheapest settings by total NPV - with their parameters and metric values.
+    '''
+
+    def __init__(self, metric: str, k: int = 10, column: str = None, largest: bool = False):
+        super().__init__(metric)
+        self.k = k
+        self.column = column or self.columns[-1]
+        self.largest = largest
+        self.top = None
+
+    def _keep(self, frame: pd.DataFrame):
+        frame = frame if self.top is None else pd.concat([self.top, frame])
+        order = frame[self.column].to_numpy() * (-1 if self.largest else 1)
+        self.top = frame.iloc[np.argsort(np.nan_to_num(order, nan=np.inf), kind='stable')[:self.k]]
+
+    def update(self, values: np.ndarray, points: pd.DataFrame):
+        key = values[:, self.columns.index(self.column)] * (-1 if self.largest else 1)
+        candidates = np.argsort(np.nan_to_num(key, nan=np.inf), kind='stable')[:self.k]
+        self._keep(points.iloc[candidates].join(pd.DataFrame(values[candidates], index=points.index[candidates], columns=self.columns)))
+
+    def merge(self, other: 'TopK'):
+        if other.top is not None:
+            self._keep(other.top)
+
+    def result(self) -> pd.DataFrame:
+        return self.top.rename_axis('point')
+
+
+def default_reducers() -> dict:
+    '''
+    Reducers used by `sweep` unless others are given.
+    '''
+    return {
+        'npv': Moments('npv'),
+        'npv_range': Extremes('npv'),
+        'npv_quantiles': Quantiles('npv'),
+        'peak_queue': Quantiles('peak_queue'),
+        'queue_below': Counts('queue_below'),
+        'apartment_entries': Moments('apartment_entries'),
+        'cheapest': TopK('npv', k=10),
+    }
+
+
+def grid(axes: dict):
+    '''
+    Lazily yields all combinations of values of parameters `axes` {parameter name: values} as dicts {parameter name: value}.
+    '''
+    names = list(axes)
+    for values in itertools.product(*axes.values()):
+        yield dict(zip(names, values))
+
+
+def _chunks(points, names: list, chunksize: int):
+    start = 0
+    while True:
+        chunk = list(itertools.islice(points, chunksize))
+        if not chunk:
+            return
+        yield start, np.array([[point[name] for name in names] for point in chunk], dtype=float)
+        start += len(chunk)
+
+
+def _simulate_metrics(scenario: Scenario, names: list, values: np.ndarray, queue_threshold: float) -> dict:
+    '''
+    Simulates a chunk of points (point, parameter) and returns only their metrics - full results are dropped here.
+    '''
+    arrays, cost_arrays = scenario.expand(names, values)
+    return summarize(scenario, run_stacked(scenario.years, arrays, cost_arrays, cohorts=False), queue_threshold)
+
+
+def fold(reducers: dict, names: list, start: int, values: np.ndarray, metrics: dict):
+    '''
+    Folds metrics of a chunk of points `values` (point, parameter) numbered from `start` into `reducers`.
+    '''
+    frame = pd.DataFrame(values, index=pd.RangeIndex(start, start + len(values)), columns=names)
+    for reducer in reducers.values():
+        reducer.update(metrics[reducer.metric], frame)
+
+
+def sweep(scenario, points, reducers: dict = None, chunksize: int = 5000, queue_threshold: float = 0, max_workers: int = 1) -> dict:
+    '''
+    Streams `points` (an iterable of dicts {parameter name: value} - see `Scenario.parameter_names` - e.g. `grid(...)` or any generator)
+    through the model as variations of `scenario` and folds their metrics (see `summarize`) into `reducers` {name: reducer}
+    (`default_reducers()` by default), e.g. {'npv': Moments('npv'), 'cheapest': TopK('npv', k=20), 'queue_below': Counts('queue_below')}.
+
+    Points are simulated by the array engine in chunks of `chunksize` (on `max_workers` processes); the year-by-year tables of a chunk
+    are discarded as soon as its metrics are computed, so memory does not grow with the number of points.
+    Points are numbered by their position in `points` (used by `Extremes` and `TopK`).
+
+    Returns {reducer name: result} and the number of simulated points `count`.
+    '''
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    reducers = reducers if reducers is not None else default_reducers()
+    points = iter(points)
+    first = next(points, None)
+    if first is None:
+        raise Exception('No points to sweep...')
+    names = list(first)
+    unknown = set(names) - set(scenario.parameter_names())
+    if unknown:
+        raise Exception(f'Unknown parameters {sorted(unknown)}...')
+    chunks = _chunks(itertools.chain([first], points), names, chunksize)
+    count = 0
+
+    if max_workers == 1:
+        for start, values in chunks:
+            fold(reducers, names, start, values, _simulate_metrics(scenario, names, values, queue_threshold))
+            count += len(values)
+    else:
+        max_workers = max_workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            pending = {}
+            for start, values in chunks:
+                if len(pending) >= 2 * max_workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        fold(reducers, names, *pending.pop(future), future.result())
+                pending[pool.submit(_simulate_metrics, scenario, names, values, queue_threshold)] = (start, values)
+                count += len(values)
+            for future, (start, values) in pending.items():
+                fold(reducers, names, start, values, future.result())
+
+    return {**{name: reducer.result() for name, reducer in reducers.items()}, 'count': count}
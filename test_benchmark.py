@@ -0,0 +1,20 @@
+import pandas as pd
+
+import benchmark
+
+
+def test_reference_outputs_are_kept_per_scenario(variants):
+    first, second = variants['0: Bez zákona'], variants['1A: Mix opatření']
+    reference = benchmark._reference_outputs(first)
+    assert benchmark._reference_outputs({**first, 'title': 'jiný název'}) is reference
+    other = benchmark._reference_outputs(second)
+    assert not other['interventions'].equals(reference['interventions'])
+
+
+def test_run_appends_history(tmp_path):
+    history = str(tmp_path / 'benchmark_history.jsonl')
+    records = benchmark.run(['simulate_apartment_stock', 'calculate_costs'], years=[5], variants=[1], risks=[1, 3], repeat=1, history=history, report=lambda line: None)
+    assert len(records) == 4
+    measured = benchmark.load_history(history)
+    assert measured['seconds'].notna().sum() == 2
+    assert measured.loc[measured['risks'] == 1, 'skipped'].notna().all()
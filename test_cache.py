@@ -0,0 +1,61 @@
+import pandas as pd
+
+from scenario import Scenario
+from cache import SimulationCache, simulation_key
+
+
+def test_key_ignores_title_and_engine(variant):
+    key = simulation_key(variant)
+    assert simulation_key({**variant, 'title': 'jiný název', 'engine': 'pandas'}) == key
+    assert simulation_key({**variant, 'discount_rate': variant['discount_rate'] + 0.01}) != key
+
+
+def test_key_includes_sub_annual_steps(variants):
+    variant = variants['1A: Mix opatření']
+    key = simulation_key(variant)
+    assert simulation_key({**variant, 'steps': 'year'}) == key
+    quarterly = simulation_key({**variant, 'steps': 'quarter'})
+    assert quarterly not in [key, simulation_key({**variant, 'steps': 'month'})]
+    startup = variant['startup_coefficients'].copy()
+    startup.loc[0.5] = 0.75
+    assert simulation_key({**variant, 'steps': 'quarter', 'startup_coefficients': startup}) != quarterly
+
+
+def test_hits_return_copies(variants):
+    variant = variants['1A: Mix opatření']
+    cache = SimulationCache(maxsize=2)
+    outputs = cache.simulate(**variant)
+    outputs['hhs'].iloc[:, :] = 0
+    again = cache.simulate(**{**variant, 'title': 'kopie'})
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    assert again['title'] == 'kopie'
+    assert (again['hhs'].to_numpy() != 0).any()
+
+
+def test_disk_round_trip(variants, tmp_path):
+    variant = variants['1A: Mix opatření']
+    expected = SimulationCache(directory=str(tmp_path)).simulate(**variant)
+    cache = SimulationCache(directory=str(tmp_path))
+    outputs = cache.simulate(**variant)
+    assert cache.stats()['disk_hits'] == 1
+    for name, table in expected.items():
+        if isinstance(table, pd.DataFrame):
+            pd.testing.assert_frame_equal(outputs[name], table)
+
+
+def test_unreadable_file_is_a_miss(variants, tmp_path):
+    variant = variants['1A: Mix opatření']
+    key = simulation_key(variant)
+    (tmp_path / f'{key}.npz').write_bytes(b'not a npz file')
+    cache = SimulationCache(directory=str(tmp_path))
+    assert cache.get(key) is None
+    assert (tmp_path / f'{key}.npz').exists()
+
+
+def test_scenario_shares_key_with_parameters(variants):
+    variant = variants['1A: Mix opatření']
+    cache = SimulationCache()
+    cache.simulate(**variant)
+    outputs = cache.simulate(Scenario.from_dict(variant))
+    assert cache.stats()['hits'] == 1
+    assert 'npv' not in outputs and outputs['title'] == variant['title']
@@ -0,0 +1,38 @@
+import json
+
+import pandas as pd
+import pytest
+
+from spec import load_spec
+from cli import main
+
+
+def test_spec_reproduces_notebook_variants(variants):
+    loaded = load_spec('varianty.json')
+    assert list(loaded) == list(variants)
+    for name, parameters in variants.items():
+        assert set(loaded[name]) == set(parameters)
+        for key, value in parameters.items():
+            if isinstance(value, pd.DataFrame):
+                pd.testing.assert_frame_equal(loaded[name][key], value, check_like=True, check_dtype=False)
+            elif isinstance(value, pd.Series):
+                pd.testing.assert_series_equal(loaded[name][key].sort_index(), value.sort_index(), check_dtype=False)
+            else:
+                assert (loaded[name][key] == value).all() if key == 'years' else loaded[name][key] == value
+
+
+def test_duplicate_titles_are_rejected(tmp_path):
+    path = tmp_path / 'varianty.json'
+    path.write_text(json.dumps({'base': {'years': 3}, 'variants': {'A': {'title': 'Stejný'}, 'B': {'title': 'Stejný'}}}), encoding='utf-8')
+    with pytest.raises(Exception, match='titles of variants must be unique'):
+        load_spec(str(path))
+    assert main(['validate', str(path)]) == 1
+
+
+def test_run_writes_tables(tmp_path):
+    assert main(['validate', 'varianty.json']) == 0
+    assert main(['run', 'varianty.json', '--output', str(tmp_path), '--workers', '1']) == 0
+    npv = pd.read_csv(tmp_path / 'npv.csv', index_col=0)
+    assert list(npv.index) == list(load_spec('varianty.json'))
+    costs = pd.read_csv(tmp_path / 'costs.csv', index_col=0)
+    assert costs['variant'].nunique() == len(npv)
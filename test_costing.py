@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+import costing
+import main
+
+
+def test_vectorized_costs_match_pandas(variant):
+    outputs = main.simulate_social_housing(**variant)
+    parameters = {key: variant[key] for key in ['years_of_support', 'social_assistences', 'intervention_costs', 'discount_rate', 'mop_housing_share']}
+    # Costs are calculated on years counted from 0 (as in `simulate_social_housing`)
+    interventions, hhs = (outputs[table].set_axis(variant['years']) for table in ['interventions', 'hhs'])
+    expected = main.calculate_costs(interventions, hhs, **parameters)
+    *tables, npv = costing.calculate_costs(interventions, hhs, **parameters)
+    for table, expected_table in zip(tables, expected):
+        pd.testing.assert_frame_equal(table, expected_table, rtol=1e-12)
+    pd.testing.assert_series_equal(npv, expected[2].sum(), check_names=False, rtol=1e-12)
+
+
+def test_rolling_sum_matches_pandas():
+    values = np.random.default_rng(0).uniform(size=(2, 12, 3))
+    windows = np.array([[1, 3, 5], [2, 4, 20]])
+    result = costing.rolling_sum(values, windows)
+    for s in range(2):
+        for col in range(3):
+            expected = pd.Series(values[s, :, col]).rolling(windows[s, col], min_periods=1).sum()
+            np.testing.assert_allclose(result[s, :, col], expected, rtol=1e-12)
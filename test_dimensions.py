@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dimensions import DEFAULT, Dimensions, transition_shares
+from scenario import Scenario
+from main import simulate_social_housing
+
+TABLES = ['hhs', 'interventions', 'returnees', 'apartments_assigned', 'apartments_available', 'cohorts', 'costs', 'costs_discounted']
+
+
+def with_middle_risk(parameters: dict) -> dict:
+    '''
+    Parameters with a `middle` risk group between `low` and `high` - it gets a part of the inflow and apartments after the other groups.
+    '''
+    def add_row(table, row):
+        return pd.concat([table, pd.DataFrame([row], index=['middle'])])
+
+    hhs_inflow = add_row(parameters['hhs_inflow'], parameters['hhs_inflow'].mean())
+    mop_housing_share = parameters['mop_housing_share'].copy()
+    mop_housing_share['middle'] = mop_housing_share['high']
+    return {
+        **parameters,
+        'relapse_rates': add_row(parameters['relapse_rates'], parameters['relapse_rates'].mean()),
+        'intervention_shares': add_row(parameters['intervention_shares'], parameters['intervention_shares'].mean()),
+        'hhs_inflow': hhs_inflow,
+        'mop_housing_share': mop_housing_share,
+        'risk_transitions': {('low', 'middle'): 0.1, ('middle', 'high'): 0.2},
+        'apartment_priorities': [('guaranteed', 'low'), ('municipal', 'high'), ('guaranteed', 'high'), ('municipal', 'low'), ('municipal', 'middle')],
+    }
+
+
+def with_peer_support(parameters: dict) -> dict:
+    '''
+    Parameters with an additional soft intervention type `peer_support`.
+    '''
+    relapse_rates = parameters['relapse_rates'].copy()
+    relapse_rates['peer_support'] = relapse_rates['consulting']
+    intervention_shares = parameters['intervention_shares'].copy()
+    intervention_shares['peer_support'] = [0.05, 0.1]
+    return {
+        **parameters,
+        'relapse_rates': relapse_rates,
+        'intervention_shares': intervention_shares,
+        'years_of_support': pd.concat([parameters['years_of_support'], pd.Series({'peer_support': 2})]),
+    }
+
+
+def test_default_inputs_give_default_dimensions(variant):
+    transitions = transition_shares(variant['low_to_high_risk_share'])
+    assert Dimensions.from_inputs(variant['hhs_inflow'], variant['years_of_support'], transitions) == DEFAULT
+    as_table = Scenario.from_dict({**variant, 'low_to_high_risk_share': None, 'risk_transitions': {('low', 'high'): variant['low_to_high_risk_share']}})
+    assert as_table == Scenario.from_dict(variant)
+
+
+@pytest.mark.parametrize('change', [with_middle_risk, with_peer_support])
+def test_numpy_engine_matches_pandas_with_more_categories(variants, change):
+    parameters = change(variants['1A: Mix opatření'])
+    expected = simulate_social_housing(**parameters, engine='pandas')
+    outputs = simulate_social_housing(**parameters, engine='numpy')
+    for table in TABLES:
+        pd.testing.assert_frame_equal(outputs[table], expected[table], check_exact=True)
+
+
+def test_middle_risk_group_gets_households(variants):
+    outputs = simulate_social_housing(**with_middle_risk(variants['1A: Mix opatření']), engine='numpy')
+    assert set(outputs['hhs'].columns.get_level_values('hh_risk')) == {'low', 'high', 'middle'}
+    assert (outputs['interventions'].loc[:, ('self_help', 'middle')] > 0).all()
+    assert np.isclose(outputs['hhs'].xs('middle', axis=1, level='hh_risk').sum(axis=1).iloc[0], variants['1A: Mix opatření']['hhs_inflow']['current_level'].mean())
+
+
+@pytest.mark.parametrize('arguments, message', [
+    ({'transitions': [('low', 'low')]}, 'Risk transitions'),
+    ({'intervention_types': ['guaranteed', 'municipal', 'mop_payment', 'self_help']}, 'must include'),
+    ({'apartment_priorities': [('mop_payment', 'low')]}, 'Apartment priorities'),
+])
+def test_invalid_dimensions_rejected(arguments, message):
+    with pytest.raises(Exception, match=message):
+        Dimensions(**arguments)
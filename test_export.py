@@ -0,0 +1,26 @@
+import os
+
+import pandas as pd
+
+from main import simulate_social_housing
+from export import export_variants
+
+
+def test_export_round_trip(variants, tmp_path):
+    reader = export_variants(variants, str(tmp_path), tables=['hhs', 'costs'], chunksize=2, max_workers=1)
+    assert list(reader.variants().index) == list(variants)
+    for name, outputs in reader.iter_variants():
+        expected = simulate_social_housing(**variants[name])
+        assert outputs['title'] == name
+        pd.testing.assert_frame_equal(outputs['hhs'], expected['hhs'], check_names=False, check_column_type=False)
+        pd.testing.assert_frame_equal(outputs['costs'], expected['costs'], check_names=False, check_column_type=False, rtol=1e-12)
+
+
+def test_export_clears_previous_dataset(variants, tmp_path):
+    export_variants(variants, str(tmp_path), tables=['hhs', 'costs'], chunksize=1, max_workers=1, format='arrow')
+    names = list(variants)[:2]
+    reader = export_variants({name: variants[name] for name in names}, str(tmp_path), tables=['hhs'], max_workers=1, format='arrow')
+    assert list(reader.variants().index) == names
+    assert len(os.listdir(tmp_path / 'hhs')) == 1
+    assert os.listdir(tmp_path / 'costs') == []
+    assert reader.read('hhs')['variant'].unique().tolist() == names
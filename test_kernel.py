@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from scenario import Scenario
+from batch import stack_scenarios, run_stacked
+import kernel
+
+
+@pytest.mark.parametrize('jit', [False, True])
+def test_year_loops_match_pandas(variant, jit):
+    # Without Numba `jit=True` runs the kernel interpreted - the same code the compiler gets
+    assert kernel.check_parity([variant], jit=jit) == []
+
+
+def test_kernel_holds_states_as_numpy_loop(variants):
+    variant = variants['1A: Mix opatření']
+    variant['years_of_support'] = variant['years_of_support'].clip(lower=2)
+    stacked = stack_scenarios([Scenario.from_dict(variant)])
+    expected = run_stacked(*stacked, jit=False, hold_states=True)
+    outputs = run_stacked(*stacked, jit=True, hold_states=True)
+    for name, values in expected.items():
+        np.testing.assert_array_equal(outputs[name], values)
+    # No intervention ends in the second year - the queue is held instead of left empty
+    assert (outputs['hhs'][0, 1, Scenario.from_dict(variant).dimensions.queue] > 0).all()
+
+
+@pytest.mark.parametrize('jit', [False, True])
+def test_results_without_cohorts(variants, jit):
+    stacked = stack_scenarios([Scenario.from_dict(parameters) for parameters in variants.values()])
+    expected = run_stacked(*stacked, jit=jit)
+    outputs = run_stacked(*stacked, jit=jit, cohorts=False)
+    assert 'cohorts' not in outputs
+    for name, values in outputs.items():
+        np.testing.assert_array_equal(values, expected[name])
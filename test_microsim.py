@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from microsim import simulate_households
+from main import simulate_social_housing
+
+
+@pytest.fixture
+def parameters(variants) -> dict:
+    return variants['1A: Mix opatření']
+
+
+def test_same_seed_same_households(parameters):
+    first, second = simulate_households(parameters, seed=3), simulate_households(parameters, seed=3)
+    np.testing.assert_array_equal(first['households'], second['households'])
+    pd.testing.assert_frame_equal(first['hhs'], second['hhs'])
+    assert not np.array_equal(simulate_households(parameters, seed=4)['households'], first['households'])
+
+
+@pytest.mark.parametrize('apartment_order', ['random', 'fifo'])
+def test_households_are_conserved(parameters, apartment_order):
+    outputs = simulate_households(parameters, seed=0, apartment_order=apartment_order)
+    households = outputs['households']
+    # Every household drawn is in exactly one status at the end
+    assert outputs['hhs'].iloc[-1].sum() == len(households)
+    # Every wait ends by an intervention or is still ongoing
+    assert outputs['waiting_times']['completed'].sum() == outputs['interventions'].to_numpy().sum()
+    assert outputs['waiting_times']['ongoing'].sum() == outputs['hhs'].iloc[-1]['queue'].sum()
+    assert outputs['relapses'].sum() == len(households)
+    assert outputs['relapses'].mul(outputs['relapses'].index).sum() == np.nansum(outputs['returnees'].to_numpy())
+    assert (outputs['apartments_available'] >= 0).all().all()
+
+
+def test_close_to_expected_counts(parameters):
+    expected = simulate_social_housing(**parameters, engine='numpy')
+    outputs = simulate_households(parameters, seed=0)
+    np.testing.assert_allclose(outputs['hhs'].T.groupby(level='hh_status').sum().T, expected['hhs'].T.groupby(level='hh_status').sum().T, rtol=0.05, atol=200)
+
+
+def test_unknown_apartment_order_rejected(parameters):
+    with pytest.raises(Exception, match='Unknown apartment order'):
+        simulate_households(parameters, apartment_order='lifo')
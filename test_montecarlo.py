@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scenario import Scenario
+from sketch import QuantileSketch
+from montecarlo import simulate_monte_carlo, uniform
+from main import simulate_social_housing
+
+
+def test_expand_with_own_values_keeps_arrays(variant):
+    scenario = Scenario.from_dict(variant)
+    names = scenario.parameter_names()
+    arrays, cost_arrays = scenario.expand(names, scenario.parameter_values(names)[np.newaxis])
+    for key, value in scenario.arrays.items():
+        expected = value if key == 'soft_types' else value[np.newaxis]
+        np.testing.assert_allclose(arrays[key], expected, rtol=1e-12)
+    for key, value in scenario.cost_arrays.items():
+        np.testing.assert_array_equal(cost_arrays[key], value[np.newaxis])
+
+
+def test_expand_rejects_negative_yearly_growth(variants):
+    scenario = Scenario.from_dict(variants['1A: Mix opatření'])
+    with pytest.raises(Exception, match='must be within'):
+        scenario.expand(['hhs_inflow.low.yearly_growth'], [[-100.]])
+
+
+def test_zero_variance_bands_equal_deterministic_run(variants):
+    variant = variants['1A: Mix opatření']
+    expected = simulate_social_housing(**variant)
+    outputs = simulate_monte_carlo(variant, {'discount_rate': uniform(0.04, 0.04), 'low_to_high_risk_share': uniform(0.5, 0.5)}, 50, seed=1, chunksize=20)
+    for percentile in [5, 50, 95]:
+        pd.testing.assert_frame_equal(outputs['costs_discounted'].loc[percentile, expected['costs_discounted'].columns], expected['costs_discounted'],
+                                      check_names=False, rtol=1e-12)
+    np.testing.assert_allclose(outputs['npv'].loc[50, 'total'], expected['costs_discounted'].sum().sum(), rtol=1e-12)
+    assert len(outputs['samples']) == 50
+
+
+def test_sketch_merge():
+    values = np.random.default_rng(0).uniform(size=(5000, 2))
+    single = QuantileSketch((2,), size=500)
+    single.update(values)
+    left, right = QuantileSketch((2,), size=500), QuantileSketch((2,), size=500)
+    left.update(values[:3000])
+    right.update(values[3000:])
+    left.merge(right)
+    q = [0.1, 0.5, 0.9]
+    assert left.count == single.count == 5000
+    np.testing.assert_allclose(left.quantiles(q), single.quantiles(q), atol=0.01)
+    np.testing.assert_allclose(single.quantiles(q)[:, 0], q, atol=0.02)
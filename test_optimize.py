@@ -0,0 +1,36 @@
+import numpy as np
+
+from scenario import Scenario
+from batch import simulate_scenario
+from optimize import Evaluator, minimize_costs, solve_for
+
+
+def test_evaluator_cache_is_bounded(variants):
+    scenario = Scenario.from_dict(variants['1A: Mix opatření'])
+    evaluator = Evaluator(scenario, ['guaranteed_yearly_apartments'], max_workers=1, cache_size=3)
+    points = np.arange(5.)[:, np.newaxis] * 1000
+    summaries = evaluator(points)
+    assert len(evaluator.cache) == 3 and evaluator.misses == 5
+    np.testing.assert_array_equal(evaluator(points[-1:]), summaries[-1:])
+    assert evaluator.hits == 1
+    np.testing.assert_array_equal(evaluator(points[:1]), summaries[:1])
+    assert evaluator.misses == 6 and len(evaluator.cache) == 3
+
+
+def test_minimize_costs_without_generations(variants):
+    variant = variants['1A: Mix opatření']
+    result = minimize_costs(variant, {'guaranteed_yearly_apartments': (0, 4000)}, generations=0, population=5, seed=0, max_workers=1)
+    assert result['generations'] == 0
+    assert result['feasible']
+
+
+def test_solve_for_finds_smallest_feasible_value(variants):
+    variant = variants['1A: Mix opatření']
+    final_year = variant['years'][-1] + 2025
+    limit = simulate_scenario(Scenario.from_dict(variant))['hhs'].loc[final_year, 'queue'].sum()
+    value = solve_for(variant, 'guaranteed_yearly_apartments', (0, 4000), queue_limits={final_year: limit}, integer=True, max_workers=1)
+    assert value <= variant['guaranteed_yearly_apartments']
+
+    def queue(apartments):
+        return simulate_scenario(Scenario.from_dict({**variant, 'guaranteed_yearly_apartments': apartments}))['hhs'].loc[final_year, 'queue'].sum()
+    assert queue(value) <= limit < queue(value - 1)
@@ -0,0 +1,14 @@
+import pandas as pd
+
+from parallel import run_variants
+from batch import simulate_social_housing_batch
+
+
+def test_parallel_variants_match_batch(variants):
+    outputs = run_variants(variants, max_workers=2, chunksize=2)
+    expected = simulate_social_housing_batch(variants)
+    assert list(outputs) == list(variants)
+    for name, tables in outputs.items():
+        assert tables['title'] == name
+        for table in ['hhs', 'interventions', 'cohorts', 'costs', 'costs_discounted']:
+            pd.testing.assert_frame_equal(tables[table], expected[table].loc[name], check_exact=True)
@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+
+from main import simulate_social_housing
+from profiling import Profiler
+from cache import SimulationCache
+
+
+@pytest.mark.parametrize('engine', ['pandas', 'numpy'])
+def test_profile_does_not_change_outputs(variants, engine):
+    variant = variants['1A: Mix opatření']
+    expected = simulate_social_housing(**variant, engine=engine)
+    events = []
+    outputs = simulate_social_housing(**variant, engine=engine, profile=Profiler(memory=True, hooks=[events.append]))
+    assert 'profile' not in expected
+    for table in ['hhs', 'interventions', 'costs']:
+        pd.testing.assert_frame_equal(outputs[table], expected[table], check_exact=True)
+
+    profile = outputs['profile']
+    assert {'simulate_apartment_stock', 'generate_interventions', 'calculate_costs'} <= set(profile['stage'])
+    assert (profile['calls'] >= 1).all() and profile['peak_bytes'].notna().all()
+    assert len(events) == profile['calls'].sum()
+    if engine == 'pandas':
+        assert profile.loc[profile['stage'] == 'determine_hhs_queue', 'rok'].tolist() == list(variant['years'] + 2025)
+
+
+def test_profile_is_not_cached(variants):
+    variant = variants['1A: Mix opatření']
+    cache = SimulationCache()
+    assert 'profile' in cache.simulate(**variant, profile=True)
+    assert 'profile' not in cache.simulate(**variant)
+    assert 'profile' not in cache.simulate(**variant, profile=True)
+    assert cache.stats()['hits'] == 2
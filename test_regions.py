@@ -0,0 +1,28 @@
+import pandas as pd
+
+from scenario import Scenario
+from batch import simulate_scenario
+from regions import REGIONS, split_national, simulate_regions
+
+
+def test_national_outputs_sum_regions(variants):
+    scenario = Scenario.from_dict(variants['1A: Mix opatření'])
+    weights = pd.Series(range(1, len(REGIONS) + 1), index=REGIONS, dtype=float)
+    outputs = simulate_regions(scenario, split_national(scenario, weights))
+    regional = outputs['regions']
+    assert list(regional['npv'].index) == REGIONS
+    pd.testing.assert_frame_equal(outputs['hhs'], regional['hhs'].groupby(level='rok').sum(), check_names=False)
+    pd.testing.assert_series_equal(outputs['npv'], outputs['costs_discounted'].sum(), check_names=False)
+    # Regions do not bear national fixed costs
+    assert (regional['costs']['IT_system'] == 0).all()
+
+
+def test_one_region_equals_national_run(variants):
+    scenario = Scenario.from_dict(variants['1A: Mix opatření'])
+    outputs = simulate_regions(scenario, split_national(scenario, pd.Series({'Česko': 1.})))
+    expected = simulate_scenario(scenario)
+    for table in ['hhs', 'interventions']:
+        pd.testing.assert_frame_equal(outputs[table], expected[table], check_names=False, rtol=1e-12)
+    for table in ['costs', 'costs_discounted']:
+        pd.testing.assert_frame_equal(outputs[table], expected[table], check_names=False, rtol=1e-9)
+    pd.testing.assert_series_equal(outputs['npv'], expected['npv'], check_names=False, rtol=1e-9)
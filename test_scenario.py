@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from scenario import Scenario
+from main import simulate_social_housing
+from batch import simulate_scenario
+
+
+def test_equal_scenarios_ignore_title(variant):
+    scenario = Scenario.from_dict(variant)
+    renamed = Scenario.from_dict({**variant, 'title': 'jiný název'})
+    assert scenario == renamed and hash(scenario) == hash(renamed)
+    changed = Scenario.from_dict({**variant, 'discount_rate': variant['discount_rate'] + 0.01})
+    assert scenario != changed
+    assert not scenario.arrays['shares'].flags.writeable
+
+
+def test_simulate_scenario_matches_simulate_social_housing(variant):
+    outputs = simulate_scenario(Scenario.from_dict(variant))
+    expected = simulate_social_housing(**variant, engine='numpy')
+    for table in ['hhs', 'interventions', 'apartments_available']:
+        pd.testing.assert_frame_equal(outputs[table], expected[table], check_exact=True)
+    pd.testing.assert_series_equal(outputs['npv'], expected['costs_discounted'].sum(), check_names=False, rtol=1e-12)
+
+
+@pytest.mark.parametrize('change, message', [
+    (lambda p: p['intervention_shares'].loc['low'].__setitem__('self_help', 0.9), 'cannot sum above 100%'),
+    (lambda p: p['relapse_rates'].drop(columns='municipal', inplace=True), 'is missing labels'),
+    (lambda p: p['years_of_support'].__setitem__('municipal', 0), 'whole number of years'),
+    (lambda p: p['intervention_costs'].drop(columns='IT_system', inplace=True), 'missing price tags'),
+    (lambda p: p.__setitem__('municipal_new_availability_rate', 1.5), 'must be within'),
+])
+def test_invalid_parameters_are_rejected(variants, change, message):
+    parameters = variants['1A: Mix opatření']
+    change(parameters)
+    with pytest.raises(Exception, match=message):
+        Scenario.from_dict(parameters)
@@ -0,0 +1,22 @@
+import numpy as np
+
+from scenario import Scenario
+from sensitivity import default_bounds, morris, sobol
+
+
+def test_irrelevant_parameter_has_no_effect(variants):
+    scenario = Scenario.from_dict(variants['1A: Mix opatření'])
+    bounds = default_bounds(scenario, ['discount_rate', 'relapse_rates.high.municipal'])
+    effects = morris(scenario, bounds, n_trajectories=5, seed=0)
+    # Discounting does not change the simulated households
+    assert effects.loc['discount_rate', ('final_queue', 'mu_star')] == 0
+    assert effects.loc['relapse_rates.high.municipal', ('final_queue', 'mu_star')] > 0
+    assert effects.loc['discount_rate', ('npv', 'mu_star')] > 0
+
+
+def test_sobol_indices_of_one_relevant_parameter(variants):
+    scenario = Scenario.from_dict(variants['1A: Mix opatření'])
+    bounds = default_bounds(scenario, ['discount_rate', 'relapse_rates.high.municipal'])
+    indices = sobol(scenario, bounds, n_samples=2000, seed=0, n_bootstrap=10)
+    np.testing.assert_allclose(indices.loc['discount_rate', ('final_queue', 'ST')], 0, atol=1e-12)
+    np.testing.assert_allclose(indices.loc['relapse_rates.high.municipal', ('final_queue', ['S1', 'ST'])], 1, atol=0.1)
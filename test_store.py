@@ -0,0 +1,34 @@
+import pandas as pd
+
+from main import simulate_social_housing
+from store import ResultsStore
+
+
+def test_add_and_query(variants, tmp_path):
+    with ResultsStore(str(tmp_path / 'vysledky.db')) as store:
+        store.add_variants(variants)
+        stored = store.scenarios()
+        assert list(stored.index) == list(variants)
+        variant = variants['1A: Mix opatření']
+        expected = simulate_social_housing(**variant)
+        pd.testing.assert_frame_equal(store.read('hhs', where={'name': variant['title']}).loc[variant['title']], expected['hhs'],
+                                      check_names=False, check_column_type=False, check_index_type=False)
+
+        cheap = store.scenarios(where={'npv': ('<', stored['npv'].median())})
+        assert set(cheap.index) == set(stored.index[stored['npv'] < stored['npv'].median()])
+        assert store.read('costs', where={'municipal_new_availability_rate': 0.25}).index.get_level_values('scenario').unique().tolist() == [
+            name for name, parameters in variants.items() if parameters['municipal_new_availability_rate'] == 0.25]
+
+        # Re-adding a name replaces the scenario
+        store.add('1A: Mix opatření', variant)
+        assert len(store.scenarios()) == len(variants)
+
+
+def test_dotted_labels_are_kept(variants, tmp_path):
+    variant = variants['1A: Mix opatření']
+    outputs = simulate_social_housing(**variant)
+    hhs = outputs['hhs'].iloc[:, :2].copy()
+    hhs.columns = pd.MultiIndex.from_tuples([('queue', 'a.b'), ('queue.a', 'b')], names=hhs.columns.names)
+    with ResultsStore(str(tmp_path / 'vysledky.db'), tables=['hhs']) as store:
+        store.add('tečky', variant, {**outputs, 'hhs': hhs})
+        pd.testing.assert_frame_equal(store.read('hhs').loc['tečky'], hhs, check_names=False, check_index_type=False)
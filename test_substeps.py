@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from substeps import simulate_substeps, step_coefficients
+from main import simulate_social_housing
+
+TABLES = ['hhs', 'interventions', 'returnees', 'apartments_assigned', 'apartments_available', 'costs', 'costs_discounted']
+
+
+def test_one_step_per_year_matches_yearly_run(variant):
+    expected = simulate_social_housing(**variant, engine='numpy')
+    outputs = simulate_social_housing(**variant, steps=1)
+    for table in TABLES:
+        pd.testing.assert_frame_equal(outputs[table], expected[table], check_exact=True)
+
+
+def test_yearly_runs_keep_empty_years_before_supports_end(variants):
+    variant = variants['1A: Mix opatření']
+    variant['years_of_support'] = variant['years_of_support'].clip(lower=2)
+    expected = simulate_social_housing(**variant, engine='pandas')
+    outputs = simulate_social_housing(**variant, engine='numpy')
+    for table in TABLES:
+        pd.testing.assert_frame_equal(outputs[table], expected[table], check_exact=True)
+    # No intervention can end in the second year - the yearly model leaves it empty
+    assert (expected['hhs'].iloc[1]['queue'] == 0).all()
+
+    # Sub-annual steps hold the statuses of households until supports end
+    steps = simulate_substeps(variant, 'quarter', aggregate=False)
+    assert (steps['hhs']['queue'].sum(axis=1) > 0).all()
+
+
+def test_monthly_steps_conserve_households(variants):
+    variant = variants['1A: Mix opatření']
+    outputs = simulate_social_housing(**variant, steps='month')
+    inflow = variant['hhs_inflow']
+    entered = inflow['current_level'].sum() + inflow['yearly_growth'].sum() * (len(variant['years']) - 1)
+    np.testing.assert_allclose(outputs['hhs'].iloc[-1].sum(), entered, rtol=1e-9)
+
+
+def test_startup_within_years_must_start_steps(variants):
+    startup = variants['1A: Mix opatření']['startup_coefficients'].copy()
+    startup.loc[0.3] = 0.5
+    with pytest.raises(Exception, match='start of steps'):
+        step_coefficients(startup, 15, 4)
@@ -0,0 +1,21 @@
+import numpy as np
+
+from supply import simulate_apartment_stock, simulate_apartment_stock_arrays, startup_array
+
+PARAMETERS = ['guaranteed_yearly_apartments', 'municipal_apartments_today', 'municipal_yearly_new_apartments',
+              'municipal_existing_availability_rate', 'municipal_new_availability_rate']
+
+
+def test_stock_arrays_match_stock_of_each_scenario(variants):
+    variants = list(variants.values())
+    years = variants[0]['years']
+    stocks = simulate_apartment_stock_arrays(
+        **{name: np.array([v[name] for v in variants]) for name in PARAMETERS},
+        startup=np.stack([startup_array(v['startup_coefficients'], years) for v in variants]),
+        years=years,
+    )
+    for stock, v in zip(stocks, variants):
+        expected = simulate_apartment_stock(
+            **{name: v[name] for name in PARAMETERS}, startup_coefficients=v['startup_coefficients'][['guaranteed', 'municipal']], years=years
+        )
+        np.testing.assert_array_equal(stock, expected[['guaranteed', 'municipal']].to_numpy())
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sweep import Reducer, Moments, Extremes, Counts, TopK, sweep, grid
+from shards import ShardedSweep
+
+
+def test_merged_reducers_equal_one_pass():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(300, 2))
+    values[::7, 0] = np.nan
+    points = pd.DataFrame({'discount_rate': rng.random(300)})
+    make = [lambda: Moments('peak_queue'), lambda: Extremes('peak_queue'), lambda: Counts('queue_below'), lambda: TopK('peak_queue', k=5, column='households')]
+    for reducer in make:
+        single, merged = reducer(), reducer()
+        counts = np.round(values[:, :1]) if isinstance(single, Counts) else values
+        single.update(counts, points)
+        parts = []
+        for rows in [slice(0, 100), slice(100, 120), slice(120, 300)]:
+            part = reducer()
+            part.update(counts[rows], points.iloc[rows])
+            parts.append(part)
+        # (a + b) + c - the order of merging does not matter
+        parts[1].merge(parts[2])
+        merged.merge(parts[0])
+        merged.merge(parts[1])
+        expected, result = single.result(), merged.result()
+        if isinstance(expected, pd.Series):
+            pd.testing.assert_series_equal(result, expected)
+        else:
+            pd.testing.assert_frame_equal(result, expected, rtol=1e-12)
+
+
+def test_reducer_is_abstract():
+    with pytest.raises(TypeError):
+        Reducer('npv')
+
+
+def test_sweep_counts_points(variants):
+    result = sweep(variants['1A: Mix opatření'], grid({'guaranteed_yearly_apartments': [0, 2000, 4000], 'discount_rate': [0.03, 0.04]}), chunksize=4)
+    assert result['count'] == 6
+    assert result['npv'].loc['total', 'count'] == 6
+    assert result['cheapest'].index.tolist()[0] in range(6)
+
+
+def test_sharded_sweep_resumes_and_equals_sweep(variants, tmp_path):
+    variant = variants['1A: Mix opatření']
+    axes = {'guaranteed_yearly_apartments': [0, 2000, 4000], 'discount_rate': [0.03, 0.04]}
+    sharded = ShardedSweep(str(tmp_path), variant, axes, shard_size=4, chunksize=3)
+    assert sharded.work('a', max_shards=1) == 1
+    assert not sharded.result()['complete']
+    # An interrupted sweep is continued by opening its directory - a fresh claim of another worker is respected, a stale one taken over
+    assert sharded.claim(1, 'b', claim_timeout=600)
+    assert ShardedSweep(str(tmp_path)).work('c') == 0
+    assert ShardedSweep(str(tmp_path)).work('c', claim_timeout=0) == 1
+
+    result = sharded.result()
+    expected = sweep(variant, grid(axes), chunksize=3)
+    assert result['complete'] and result['count'] == expected['count'] == 6
+    for name in ['npv', 'npv_range', 'npv_quantiles', 'cheapest']:
+        pd.testing.assert_frame_equal(result[name], expected[name], rtol=1e-12)
+    pd.testing.assert_series_equal(result['queue_below'], expected['queue_below'])